@@ -0,0 +1,525 @@
+from collections import deque
+import csv
+from functools import partial
+import io
+import json
+import shutil
+import tempfile
+import time
+
+from eventlet import GreenPool, sleep
+
+from nameko_salesforce import constants
+
+
+JOB_COMPLETE_STATES = frozenset(('JobComplete', 'Failed', 'Aborted'))
+""" States of Bulk API 2.0 jobs which are done processing
+"""
+
+
+SPOOL_MAX_SIZE = 1024 * 1024
+""" Bytes of CSV data to upload held in memory before spooling it to disk
+"""
+
+
+class BulkError(Exception):
+    """ Raised when Bulk API 2.0 jobs fail, are aborted or time out
+
+    :attr:`jobs` holds all jobs of the call.
+
+    """
+
+    def __init__(self, message, jobs):
+        self.jobs = jobs
+        super().__init__(message)
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def write_csv_chunks(
+    records, fields=None,
+    max_bytes=constants.DEFAULT_BULK_JOB_MAX_BYTES,
+    max_records=constants.DEFAULT_BULK_JOB_MAX_RECORDS
+):
+    """ Yield ``records`` as temporary files of CSV documents of limited
+    size
+
+    Each document has a header row of ``fields``, or of the keys of the
+    first record if not given, followed by at most ``max_records`` rows
+    and ``max_bytes`` bytes. Documents are spooled to disk beyond
+    :data:`SPOOL_MAX_SIZE` bytes, so memory use does not grow with their
+    size. Each file is yielded rewound, and closed when the next one is
+    requested.
+
+    """
+    records = iter(records)
+    try:
+        record = next(records)
+    except StopIteration:
+        return
+    if fields is None:
+        fields = list(record)
+
+    def format_row(record):
+        row = io.StringIO()
+        csv.writer(row, lineterminator='\n').writerow(
+            [format_value(record.get(field)) for field in fields])
+        return row.getvalue().encode('utf-8')
+
+    header = format_row({field: field for field in fields})
+
+    def start_chunk():
+        chunk = tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE)
+        chunk.write(header)
+        return chunk
+
+    chunk, size, count = start_chunk(), len(header), 0
+    try:
+        while record is not None:
+            row = format_row(record)
+            if count and (
+                count >= max_records or size + len(row) > max_bytes
+            ):
+                chunk.seek(0)
+                yield chunk
+                chunk.close()
+                chunk, size, count = start_chunk(), len(header), 0
+            chunk.write(row)
+            size += len(row)
+            count += 1
+            record = next(records, None)
+        chunk.seek(0)
+        yield chunk
+    finally:
+        chunk.close()
+
+
+def download(response, output):
+    """ Write the body of a streamed ``response`` to ``output`` and rewind it
+    """
+    try:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            output.write(chunk)
+    finally:
+        response.close()
+    output.seek(0)
+
+
+def read_csv_page(page):
+    """ Yield rows of a CSV ``page`` file as dicts
+    """
+    return csv.DictReader(io.TextIOWrapper(page, encoding='utf-8', newline=''))
+
+
+class Job(object):
+    """ A Bulk API 2.0 job
+    """
+
+    kind = None
+
+    def __init__(self, bulk, job_id, sobject=None):
+        self.bulk = bulk
+        self.id = job_id
+        self.sobject = sobject
+
+        self.info = {}
+        """ Job information as last fetched from Salesforce
+        """
+
+    def __repr__(self):
+        return '<{} {} state={}>'.format(
+            type(self).__name__, self.id, self.state)
+
+    @property
+    def state(self):
+        return self.info.get('state')
+
+    @property
+    def done(self):
+        return self.state in JOB_COMPLETE_STATES
+
+    def _path(self, path=''):
+        return 'jobs/{}/{}/{}'.format(self.kind, self.id, path)
+
+    def abort(self):
+        self._set_state('Aborted')
+
+    def _set_state(self, state):
+        self.info = self.bulk.request(
+            'PATCH', self._path(), 'bulk2_update_job', self.sobject,
+            json={'state': state}).json()
+
+    def refresh(self):
+        self.info = self.bulk.request(
+            'GET', self._path(), 'bulk2_get_job', self.sobject).json()
+        return self.info
+
+
+class IngestJob(Job):
+    """ A Bulk API 2.0 ingest job
+    """
+
+    kind = 'ingest'
+
+    def upload(self, data):
+        """ Upload CSV ``data``, as bytes or a binary file
+        """
+        self.bulk.request(
+            'PUT', self._path('batches'), 'bulk2_upload', self.sobject,
+            data=data, headers={'Content-Type': 'text/csv'})
+
+    def close(self):
+        self._set_state('UploadComplete')
+        self.bulk.invalidate_query_cache(self.sobject)
+
+    def refresh(self):
+        info = super().refresh()
+        if self.done:
+            # records were loaded while the job was processed
+            self.bulk.invalidate_query_cache(self.sobject)
+        return info
+
+    def _results(self, path):
+        response = self.bulk.request(
+            'GET', self._path(path), 'bulk2_get_results', self.sobject,
+            stream=True)
+        with tempfile.TemporaryFile() as page:
+            download(response, page)
+            yield from read_csv_page(page)
+
+    def successful_results(self):
+        """ Yield processed records with their ``sf__Id`` and ``sf__Created``
+        """
+        return self._results('successfulResults/')
+
+    def failed_results(self):
+        """ Yield failed records with their ``sf__Id`` and ``sf__Error``
+        """
+        return self._results('failedResults/')
+
+    def unprocessed_records(self):
+        return self._results('unprocessedrecords/')
+
+
+class QueryJob(Job):
+    """ A Bulk API 2.0 query job
+    """
+
+    kind = 'query'
+
+    def get_results(self, locator=None, max_records=None):
+        """ Return the streamed response of a page of results
+
+        The ``Sforce-Locator`` header of the response holds the locator
+        of the next page, and is ``null`` on the last page.
+
+        """
+        params = {}
+        if locator is not None:
+            params['locator'] = locator
+        if max_records is not None:
+            params['maxRecords'] = max_records
+        return self.bulk.request(
+            'GET', self._path('results'), 'bulk2_get_results',
+            params=params, stream=True)
+
+    def iter_pages(
+        self, max_records=None,
+        concurrency=constants.DEFAULT_BULK_QUERY_CONCURRENCY
+    ):
+        """ Yield temporary files holding the CSV pages of results, in order
+
+        Up to ``concurrency`` pages are downloaded at a time: the request
+        for the next page is made as soon as the headers of the previous
+        one, holding its locator, are received. Pages are spooled to disk,
+        so memory use does not grow with their size. Each file is closed
+        when the next one is requested.
+
+        """
+        pool = GreenPool(concurrency)
+        pending = deque()
+        locator = None
+        try:
+            while True:
+                response = self.get_results(locator, max_records)
+                locator = response.headers.get('Sforce-Locator')
+                last = locator in (None, 'null')
+                page = tempfile.TemporaryFile()
+                pending.append((page, pool.spawn(download, response, page)))
+                while pending and (last or len(pending) >= concurrency):
+                    page, thread = pending.popleft()
+                    try:
+                        thread.wait()
+                        yield page
+                    finally:
+                        page.close()
+                if last:
+                    return
+        finally:
+            for page, thread in pending:
+                thread.kill()
+                page.close()
+
+
+class BulkClient(object):
+    """ Bulk API 2.0 client making its calls through a
+    :class:`~nameko_salesforce.api.client.ClientProxy`
+
+    Calls are made with the retries, limits and metrics of the proxy,
+    and job status is polled with eventlet friendly sleeps. Ingest jobs
+    require API version 41.0 or later, and query jobs 47.0 or later.
+
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def request(self, method, path, operation, sobject=None, **kwargs):
+        """ Make a request to ``path`` and return the response
+        """
+        def get_method_ref(client):
+            data = kwargs.get('data')
+            if hasattr(data, 'seek'):
+                data.seek(0)  # send the whole file again on retries
+            return partial(
+                client._call_salesforce, method, client.base_url + path,
+                name=path)
+
+        call = self.client.proxy_method(
+            get_method_ref, operation, sobject=sobject)
+        return call(**kwargs)
+
+    def invalidate_query_cache(self, sobject):
+        self.client.invalidate_query_cache(sobject)
+
+    def create_ingest_job(
+        self, sobject, operation, external_id_field=None,
+        line_ending='LF'
+    ):
+        data = {
+            'object': sobject,
+            'operation': operation,
+            'contentType': 'CSV',
+            'lineEnding': line_ending,
+        }
+        if external_id_field is not None:
+            data['externalIdFieldName'] = external_id_field
+        info = self.request(
+            'POST', 'jobs/ingest/', 'bulk2_create_job', sobject,
+            json=data).json()
+        job = IngestJob(self, info['id'], sobject)
+        job.info = info
+        return job
+
+    def ingest(
+        self, sobject, operation, records, external_id_field=None,
+        fields=None, max_bytes=constants.DEFAULT_BULK_JOB_MAX_BYTES,
+        max_records=constants.DEFAULT_BULK_JOB_MAX_RECORDS,
+        poll_interval=constants.DEFAULT_BULK_POLL_INTERVAL, timeout=None
+    ):
+        """ Load ``records`` with Bulk API 2.0 ingest jobs
+
+        Records are uploaded as CSV, one job per chunk of ``max_bytes``
+        and ``max_records``, while only spooling one chunk to a temporary
+        file at a time, see :func:`write_csv_chunks`.
+        Uploaded jobs are processed by Salesforce while further chunks
+        are uploaded. Returns the jobs once all of them are done.
+
+        :param sobject:
+            sObject type of the records.
+
+        :param operation:
+            One of ``insert``, ``update``, ``upsert``, ``delete`` or
+            ``hardDelete``.
+
+        :param records:
+            Iterable of dicts of field values.
+
+        :param external_id_field:
+            External ID field matching records to upsert.
+
+        :param fields:
+            Fields to load, defaults to the keys of the first record.
+
+        :param timeout:
+            Seconds to wait for jobs to be done, or ``None``.
+
+        :raises BulkError:
+            If a job failed, was aborted or is not done in time. Records
+            failing to load do not make jobs fail, see
+            :meth:`IngestJob.failed_results`.
+
+        """
+        jobs = []
+        for data in write_csv_chunks(
+            records, fields=fields, max_bytes=max_bytes,
+            max_records=max_records
+        ):
+            job = self.create_ingest_job(
+                sobject, operation, external_id_field=external_id_field)
+            jobs.append(job)
+            try:
+                job.upload(data)
+            except Exception:
+                job.abort()
+                raise
+            job.close()
+
+        self.wait(jobs, poll_interval=poll_interval, timeout=timeout)
+        return jobs
+
+    def wait(
+        self, jobs, poll_interval=constants.DEFAULT_BULK_POLL_INTERVAL,
+        timeout=None
+    ):
+        """ Poll ``jobs`` until all of them are done
+
+        :raises BulkError:
+            If a job failed, was aborted or is not done in time.
+
+        """
+        started_at = time.monotonic()
+        while True:
+            for job in jobs:
+                if not job.done:
+                    job.refresh()
+            if all(job.done for job in jobs):
+                break
+            if (
+                timeout is not None and
+                time.monotonic() - started_at + poll_interval > timeout
+            ):
+                raise BulkError(
+                    'Jobs not done after {} seconds'.format(timeout), jobs)
+            sleep(poll_interval)
+
+        failed = [job for job in jobs if job.state != 'JobComplete']
+        if failed:
+            raise BulkError(
+                '{} of {} jobs did not complete: {}'.format(
+                    len(failed), len(jobs), '; '.join(
+                        '{} {}: {}'.format(
+                            job.id, job.state, job.info.get('errorMessage'))
+                        for job in failed)),
+                jobs)
+
+    def iter_results(self, jobs, kind='successful'):
+        """ Yield results of ``kind`` of all ``jobs``
+
+        :param kind:
+            One of ``successful``, ``failed`` or ``unprocessed``.
+
+        """
+        get_results = {
+            'successful': IngestJob.successful_results,
+            'failed': IngestJob.failed_results,
+            'unprocessed': IngestJob.unprocessed_records,
+        }[kind]
+        for job in jobs:
+            yield from get_results(job)
+
+    def create_query_job(self, soql, include_deleted=False):
+        data = {
+            'operation': 'queryAll' if include_deleted else 'query',
+            'query': soql,
+            'contentType': 'CSV',
+            'lineEnding': 'LF',
+        }
+        info = self.request(
+            'POST', 'jobs/query/', 'bulk2_create_job', json=data).json()
+        job = QueryJob(self, info['id'])
+        job.info = info
+        return job
+
+    def run_query(
+        self, soql, include_deleted=False,
+        poll_interval=constants.DEFAULT_BULK_POLL_INTERVAL, timeout=None
+    ):
+        """ Create a query job and return it once results are ready
+
+        :raises BulkError:
+            If the job failed, was aborted or is not done in time.
+
+        """
+        job = self.create_query_job(soql, include_deleted=include_deleted)
+        self.wait([job], poll_interval=poll_interval, timeout=timeout)
+        return job
+
+    def query(
+        self, soql, include_deleted=False, max_records=None,
+        concurrency=constants.DEFAULT_BULK_QUERY_CONCURRENCY,
+        poll_interval=constants.DEFAULT_BULK_POLL_INTERVAL, timeout=None
+    ):
+        """ Run ``soql`` as a Bulk API 2.0 query job and yield its records
+
+        Records are yielded as dicts of field values, all of them
+        strings. Pages of results are downloaded ahead of the records
+        being consumed, see :meth:`QueryJob.iter_pages`.
+
+        """
+        job = self.run_query(
+            soql, include_deleted=include_deleted,
+            poll_interval=poll_interval, timeout=timeout)
+        for page in job.iter_pages(
+            max_records=max_records, concurrency=concurrency
+        ):
+            yield from read_csv_page(page)
+
+    def export(
+        self, soql, output, format='csv', include_deleted=False,
+        max_records=None,
+        concurrency=constants.DEFAULT_BULK_QUERY_CONCURRENCY,
+        poll_interval=constants.DEFAULT_BULK_POLL_INTERVAL, timeout=None
+    ):
+        """ Run ``soql`` as a Bulk API 2.0 query job and write its records
+        to ``output``
+
+        Results are copied page by page, so memory use stays constant
+        however many records there are. Returns the :class:`QueryJob`,
+        whose ``numberRecordsProcessed`` info is the number of records.
+
+        :param output:
+            Path or binary file object to write to.
+
+        :param format:
+            ``csv``, or ``ndjson`` for a JSON object per line.
+
+        :param max_records:
+            Records per page of results, defaults to as many as
+            Salesforce sends.
+
+        :param concurrency:
+            Pages to download at a time.
+
+        """
+        if format not in ('csv', 'ndjson'):
+            raise ValueError('Unknown format {}'.format(format))
+
+        if isinstance(output, str):
+            with open(output, 'wb') as file:
+                return self.export(
+                    soql, file, format=format,
+                    include_deleted=include_deleted, max_records=max_records,
+                    concurrency=concurrency, poll_interval=poll_interval,
+                    timeout=timeout)
+
+        job = self.run_query(
+            soql, include_deleted=include_deleted,
+            poll_interval=poll_interval, timeout=timeout)
+        for index, page in enumerate(job.iter_pages(
+            max_records=max_records, concurrency=concurrency
+        )):
+            if format == 'csv':
+                if index:
+                    page.readline()  # skip the header of later pages
+                shutil.copyfileobj(page, output)
+            else:
+                for record in read_csv_page(page):
+                    output.write(json.dumps(record).encode('utf-8') + b'\n')
+        return job
@@ -0,0 +1,137 @@
+import time
+
+import requests
+import simple_salesforce
+
+from nameko_salesforce import constants
+
+
+class CircuitOpen(Exception):
+    """ Raised instead of calling Salesforce while a circuit is open
+    """
+
+
+def is_failure(exc):
+    """ Return whether ``exc`` signals that Salesforce is failing
+    """
+    if isinstance(exc, simple_salesforce.SalesforceError):
+        # not set on authentication failures
+        status = getattr(exc, 'status', None)
+        return status is not None and status >= 500
+    return isinstance(exc, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    ))
+
+
+def get_circuit_breakers(config):
+    """ Return :class:`CircuitBreakers` if enabled in Salesforce config
+    """
+    if not config.get('CIRCUIT_BREAKER_ENABLED', False):
+        return None
+    return CircuitBreakers(
+        failure_threshold=config.get(
+            'CIRCUIT_BREAKER_FAILURE_THRESHOLD',
+            constants.DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD),
+        reset_timeout=config.get(
+            'CIRCUIT_BREAKER_RESET_TIMEOUT',
+            constants.DEFAULT_CIRCUIT_BREAKER_RESET_TIMEOUT),
+        per_sobject=config.get('CIRCUIT_BREAKER_PER_SOBJECT', False),
+    )
+
+
+class CircuitBreaker(object):
+    """ Fails calls fast while Salesforce keeps failing
+
+    The circuit opens after ``failure_threshold`` consecutive calls fail
+    to connect, time out or get a server error. While open, calls raise
+    :class:`CircuitOpen` without being made. After ``reset_timeout``
+    seconds the circuit is half open and lets a single call through to
+    probe for recovery: it closes if the probe succeeds and opens again
+    otherwise. If the probe does not report back, another one is let
+    through after ``reset_timeout`` seconds.
+
+    """
+
+    def __init__(
+        self, name,
+        failure_threshold=constants.DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=constants.DEFAULT_CIRCUIT_BREAKER_RESET_TIMEOUT
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_closed(self):
+        return self.opened_at is None
+
+    def allow(self):
+        """ Raise :class:`CircuitOpen` unless a call may be made
+        """
+        if self.opened_at is None:
+            return
+        now = time.monotonic()
+        if now - self.opened_at >= self.reset_timeout:
+            self.opened_at = now  # hold other calls back during the probe
+            return
+        raise CircuitOpen(
+            'Circuit of {} is open after {} failures'.format(
+                self.name, self.failures))
+
+    def record(self, exc=None):
+        """ Record the outcome of a call that raised ``exc``, if anything
+
+        Exceptions which tell nothing about the health of Salesforce,
+        e.g. interrupted calls, are not recorded.
+
+        """
+        if exc is None or (
+            isinstance(exc, simple_salesforce.SalesforceError) and
+            not is_failure(exc)
+        ):
+            self.failures = 0
+            self.opened_at = None
+        elif is_failure(exc):
+            self.failures += 1
+            if (
+                self.opened_at is not None or
+                self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.monotonic()
+
+
+class CircuitBreakers(object):
+    """ Circuit breakers per Salesforce instance host
+
+    With ``per_sobject`` set, calls to sObjects of each type get their
+    own circuit breaker, so that failures of one sObject do not fail
+    calls to others.
+
+    """
+
+    def __init__(
+        self,
+        failure_threshold=constants.DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=constants.DEFAULT_CIRCUIT_BREAKER_RESET_TIMEOUT,
+        per_sobject=False
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.per_sobject = per_sobject
+        self.breakers = {}
+
+    def get(self, host, sobject=None):
+        name = host
+        if self.per_sobject and sobject:
+            name = '{}/{}'.format(name, sobject)
+        try:
+            return self.breakers[name]
+        except KeyError:
+            breaker = self.breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout)
+            return breaker
@@ -1,16 +1,163 @@
 from contextlib import contextmanager
+from functools import partial
+import socket
+import time
 
+import eventlet
+from eventlet import sleep
+from eventlet.queue import Queue
+from eventlet.semaphore import Semaphore
 import requests
 import simple_salesforce
-from nameko.utils.retry import retry
+from simple_salesforce.login import SalesforceLogin
+from urllib3.connection import HTTPConnection
 from urllib3.util.retry import Retry
 
 from nameko_salesforce import constants
+from nameko_salesforce.constants import Priority
+from nameko_salesforce.api.circuit_breaker import CircuitOpen
+from nameko_salesforce.api.concurrency import is_overload
+from nameko_salesforce.api import sobject_collections
+from nameko_salesforce.api.bulk import BulkClient
+from nameko_salesforce.api.composite import Composite
+from nameko_salesforce.api.query_cache import WRITE_OPERATIONS
+from nameko_salesforce.api.quota import ApiQuota
+from nameko_salesforce.api.retries import RetryPolicy
+from nameko_salesforce.metrics import Metrics
+from nameko_salesforce.session_refresh import refresh_session_periodically
 
 
-CONNECT_RETRIES = 5
-READ_RETRIES = 3
 REDIRECT_RETRIES = 5
+SESSION_EXPIRED_RETRIES = 2
+
+
+class ClientPoolExhausted(Exception):
+    """ Raised when no client could be checked out of a bounded pool
+    within the checkout timeout
+    """
+
+
+class DeadlineExceeded(Exception):
+    """ Raised when a call does not complete before the caller's deadline
+    """
+
+
+class Session(requests.Session):
+    """ Requests session applying a default timeout to all requests
+
+    The timeout is passed to requests as is, so it is either a number of
+    seconds or a ``(connect timeout, read timeout)`` tuple.
+
+    Keeps the response of the last request as :attr:`last_response`, since
+    `simple_salesforce` does not expose response headers of failed calls,
+    and whether its body was read, unless streamed, as
+    :attr:`last_response_read`.
+
+    """
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+        self.last_response = None
+        self.last_response_read = False
+        self.hooks['response'].append(self._set_last_response)
+
+    def request(self, *args, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        self.last_response = None
+        self.last_response_read = False
+        response = super().request(*args, **kwargs)
+        self.last_response_read = not kwargs.get('stream')
+        return response
+
+    def _set_last_response(self, response, *args, **kwargs):
+        self.last_response = response
+
+
+class HTTPAdapter(requests.adapters.HTTPAdapter):
+    """ Transport adapter with optional TCP keep-alive probes
+
+    Probes keep idle pooled connections alive behind NATs and load
+    balancers dropping silent connections, and detect dead ones.
+
+    """
+
+    def __init__(self, tcp_keepalive=None, **kwargs):
+        self.tcp_keepalive = tcp_keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.tcp_keepalive is not None:
+            kwargs['socket_options'] = self.get_socket_options()
+        super().init_poolmanager(*args, **kwargs)
+
+    def get_socket_options(self):
+        options = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        for name in ('TCP_KEEPIDLE', 'TCP_KEEPINTVL'):
+            if hasattr(socket, name):  # not available on all platforms
+                options.append(
+                    (socket.IPPROTO_TCP, getattr(socket, name),
+                     self.tcp_keepalive))
+        return options
+
+
+def create_http_adapter(
+    pool_connections=requests.adapters.DEFAULT_POOLSIZE,
+    pool_maxsize=requests.adapters.DEFAULT_POOLSIZE,
+    pool_block=requests.adapters.DEFAULT_POOLBLOCK,
+    tcp_keepalive=None
+):
+    """ Return an :class:`HTTPAdapter` to share by pooled clients
+
+    The adapter follows redirects but leaves retrying failed requests to
+    the :class:`~nameko_salesforce.api.retries.RetryPolicy` of the pool,
+    so that retries do not multiply and timeouts bound each attempt.
+
+    :param pool_connections:
+        Number of per host connection pools to cache.
+
+    :param pool_maxsize:
+        Maximum number of connections to keep open per host.
+
+    :param pool_block:
+        Whether to wait for a free connection instead of opening a new one
+        to be discarded afterwards when ``pool_maxsize`` is reached.
+
+    :param tcp_keepalive:
+        Seconds of idle time before sending TCP keep-alive probes and
+        between the probes. Probes are disabled if ``None``.
+
+    """
+    return HTTPAdapter(
+        tcp_keepalive=tcp_keepalive,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        max_retries=Retry(
+            connect=0,
+            read=False,  # raise read timeouts as such
+            other=0,
+            redirect=REDIRECT_RETRIES
+        )
+    )
+
+
+def get_response_size(response, read=False):
+    """ Return the body size of ``response`` without consuming a stream
+
+    Without a ``Content-Length`` header, the size is only known if the
+    body was ``read`` already.
+
+    """
+    length = response.headers.get('Content-Length')
+    if length is not None:
+        return int(length)
+    if read:
+        return len(response.content)
+    return None
 
 
 def get_client(*args, **kwargs):
@@ -31,36 +178,148 @@ class MethodProxy(object):
 
     Fetches and then invokes a method from a client that is checked out of
     a pool. If the method raises a `SalesforceExpiredSession` the client is
-    discarded from the pool and the method is retried on a new client.
-    If `ConnectionError` is raised, the client will be discarded, but the
-    method not automatically retried.
+    discarded from the pool, the pool's session is renewed and the method
+    is retried on a new client, up to ``SESSION_EXPIRED_RETRIES`` times.
+    If `ConnectionError` is raised, the client will be discarded.
+
+    Other failures are retried as decided by the
+    :class:`~nameko_salesforce.api.retries.RetryPolicy` of the pool, which
+    takes the name of the invoked method, ``operation``, into account.
+    The client is returned to the pool while waiting for the retry.
 
     `Salesforce` clients support querying directly with the client
     and via a "resource" attribute, so the method may be on the client
     or a resource within it. The method to invoke is fetched by calling
     :attr:`self.get_method_ref`.
 
+    Requests made by the method use ``timeout`` if set, or the default
+    timeout of the pool otherwise. If ``deadline`` is set, the whole call,
+    including waiting for a client and retries, is interrupted with
+    :class:`DeadlineExceeded` once the deadline passes.
+
+    Calls are held back or rejected by the
+    :class:`~nameko_salesforce.api.quota.ApiQuota` of the pool depending
+    on their ``priority``, and each response updates the API usage. If
+    the pool has a :class:`~nameko_salesforce.rate_limit.RateLimiter`,
+    each attempt waits for it before checking out a client.
+
+    If the pool has
+    :class:`~nameko_salesforce.api.circuit_breaker.CircuitBreakers`, each
+    attempt raises :class:`~nameko_salesforce.api.circuit_breaker.CircuitOpen`
+    instead of calling Salesforce while the circuit of the instance host,
+    or of the sObject type, is open.
+
+    Each attempt is reported to the metrics hook of the pool, labelled
+    by ``sobject``, the sObject type the method belongs to if any, and
+    by ``operation``:
+
+    ``salesforce_request_duration_seconds``
+        Histogram of attempt durations, also labelled by response
+        ``status``.
+    ``salesforce_response_size_bytes``
+        Histogram of response body sizes.
+    ``salesforce_request_errors_total``
+        Counter of failed attempts, also labelled by ``error`` type.
+
     """
 
-    def __init__(self, pool, get_method_ref):
+    def __init__(
+        self, pool, get_method_ref, operation=None, timeout=None,
+        deadline=None, sobject=None, priority=None
+    ):
         self.pool = pool
         self.get_method_ref = get_method_ref
+        self.operation = operation
+        self.timeout = timeout
+        self.deadline = deadline
+        self.sobject = sobject
+        self.priority = priority or Priority.normal
 
-    @retry(
-        max_attempts=None,
-        for_exceptions=simple_salesforce.SalesforceExpiredSession)
     def __call__(self, *args, **kwargs):
+        if self.deadline is None:
+            return self._call(*args, **kwargs)
 
-        with self.pool.get() as client:
-            try:
-                method = self.get_method_ref(client)
-                return method(*args, **kwargs)
-            except (
-                simple_salesforce.SalesforceExpiredSession,
-                requests.exceptions.ConnectionError
-            ):
-                self.pool.discard(client)
-                raise
+        remaining = self.deadline - time.time()
+        exc = DeadlineExceeded('Deadline of the call has passed')
+        if remaining <= 0:
+            raise exc
+        with eventlet.Timeout(remaining, exc):
+            return self._call(*args, **kwargs)
+
+    def _call(self, *args, **kwargs):
+        delay = self.pool.api_quota.get_delay(self.priority)
+        if delay:
+            sleep(delay)
+
+        attempt = 0
+        session_expired_retries = SESSION_EXPIRED_RETRIES
+        while True:
+            breaker = self.pool.check_circuit(self.sobject)
+            if self.pool.rate_limiter is not None:
+                self.pool.rate_limiter.acquire()
+            with self.pool.get() as client:
+                if breaker is None:
+                    # the circuit of the instance is known once logged in
+                    breaker = self.pool.check_circuit(self.sobject)
+                if self.timeout is not None:
+                    client.session.timeout = self.timeout
+                else:
+                    client.session.timeout = self.pool.timeout
+                started_at = time.monotonic()
+                try:
+                    method = self.get_method_ref(client)
+                    result = method(*args, **kwargs)
+                except simple_salesforce.SalesforceExpiredSession as exc:
+                    self._record(client, started_at, breaker, exc)
+                    self.pool.discard(client, reason='session_expired')
+                    self.pool.renew_session(client.session_generation)
+                    if not session_expired_retries:
+                        raise
+                    session_expired_retries -= 1
+                    continue
+                except Exception as exc:
+                    self._record(client, started_at, breaker, exc)
+                    if isinstance(exc, requests.exceptions.ConnectionError):
+                        self.pool.discard(client, reason='connection_error')
+                    attempt += 1
+                    delay = self.pool.retry_policy.get_delay(
+                        attempt, exc, self.operation,
+                        response=client.session.last_response)
+                    if delay is None:
+                        raise
+                else:
+                    self._record(client, started_at, breaker)
+                    return result
+            sleep(delay)
+
+    def _record(self, client, started_at, breaker, exc=None):
+        metrics = self.pool.metrics
+        duration = time.monotonic() - started_at
+        labels = {'sobject': self.sobject or '', 'operation': self.operation}
+        response = client.session.last_response
+        self.pool.update_api_quota(response)
+        self.pool.observe_call(
+            duration, exc, operation=(self.sobject, self.operation))
+        if breaker is not None:
+            breaker.record(exc)
+        if self.sobject and self.operation in WRITE_OPERATIONS:
+            self.pool.invalidate_query_cache(self.sobject)
+        if response is not None:
+            status = str(response.status_code)
+            size = get_response_size(
+                response, read=client.session.last_response_read)
+            if size is not None:
+                metrics.observe(
+                    'salesforce_response_size_bytes', size, **labels)
+        else:
+            status = ''
+        metrics.observe(
+            'salesforce_request_duration_seconds', duration, status=status,
+            **labels)
+        if exc is not None:
+            metrics.increment(
+                'salesforce_request_errors_total',
+                error=type(exc).__name__, **labels)
 
 
 class ClientAttributeProxy(MethodProxy):
@@ -74,11 +333,23 @@ class ClientAttributeProxy(MethodProxy):
     Otherwise, if the attribute is a method it can be invoked directly via
     the `__call__` method inherited from :class:`MethodProxy`.
 
+    Resource attributes, named after sObject types, also write records in
+    batches through the sObject Collections API with :meth:`create_many`,
+    :meth:`update_many`, :meth:`upsert_many` and :meth:`delete_many`,
+    and read them with :meth:`fetch_many`.
+    Records are sent in chunks of up to
+    :data:`~nameko_salesforce.api.sobject_collections.MAX_RECORDS`, up to
+    ``concurrency`` chunks at a time, each with the retries of a single
+    call. They return a result per record, in the order of the records,
+    as ``{'id': ..., 'success': ..., 'errors': [...]}`` dicts. With
+    ``all_or_none`` set, a failing record rolls back its whole chunk.
+
     """
 
-    def __init__(self, attr_name, *args):
+    def __init__(self, attr_name, *args, **kwargs):
         self.attr_name = attr_name
-        super().__init__(*args)
+        kwargs.setdefault('operation', attr_name)
+        super().__init__(*args, **kwargs)
 
     def __getattr__(self, name):
 
@@ -86,7 +357,131 @@ class ClientAttributeProxy(MethodProxy):
             attr = getattr(client, self.attr_name)
             return getattr(attr, name)
 
-        return MethodProxy(self.pool, get_method_ref)
+        return MethodProxy(
+            self.pool, get_method_ref, operation=name,
+            timeout=self.timeout, deadline=self.deadline,
+            sobject=self.attr_name, priority=self.priority)
+
+    def create_many(self, records, all_or_none=False, concurrency=1):
+        """ Create ``records``
+        """
+        return self._call_collections(
+            'create_many', records, concurrency,
+            lambda chunk: (
+                'composite/sobjects', None, 'POST',
+                sobject_collections.make_body(
+                    self.attr_name, chunk, all_or_none)))
+
+    def update_many(self, records, all_or_none=False, concurrency=1):
+        """ Update ``records``, which must contain their ``Id``
+        """
+        return self._call_collections(
+            'update_many', records, concurrency,
+            lambda chunk: (
+                'composite/sobjects', None, 'PATCH',
+                sobject_collections.make_body(
+                    self.attr_name, chunk, all_or_none)))
+
+    def upsert_many(
+        self, external_id_field, records, all_or_none=False, concurrency=1
+    ):
+        """ Upsert ``records`` matched on their ``external_id_field``
+        """
+        path = 'composite/sobjects/{}/{}'.format(
+            self.attr_name, external_id_field)
+        return self._call_collections(
+            'upsert_many', records, concurrency,
+            lambda chunk: (
+                path, None, 'PATCH',
+                sobject_collections.make_body(
+                    self.attr_name, chunk, all_or_none)))
+
+    def delete_many(self, ids, all_or_none=False, concurrency=1):
+        """ Delete records of ``ids``
+        """
+        return self._call_collections(
+            'delete_many', ids, concurrency,
+            lambda chunk: (
+                'composite/sobjects',
+                sobject_collections.make_delete_params(chunk, all_or_none),
+                'DELETE', None))
+
+    def fetch_many(self, ids, fields, concurrency=1):
+        """ Return records of ``ids`` with ``fields`` as a dict keyed by ID
+
+        Duplicate IDs are fetched once, and IDs of records not found are
+        left out. IDs are sent in chunks of up to
+        :data:`~nameko_salesforce.api.sobject_collections.MAX_RETRIEVE_IDS`.
+
+        """
+        ids = list(dict.fromkeys(ids))
+        path = 'composite/sobjects/{}'.format(self.attr_name)
+        results = self._call_collections(
+            'fetch_many', ids, concurrency,
+            lambda chunk: (
+                path, None, 'POST',
+                sobject_collections.make_retrieve_body(chunk, fields)),
+            chunk_size=sobject_collections.MAX_RETRIEVE_IDS)
+        return {
+            record_id: record
+            for record_id, record in zip(ids, results)
+            if record is not None
+        }
+
+    def _call_collections(
+        self, operation, items, concurrency, make_request,
+        chunk_size=sobject_collections.MAX_RECORDS
+    ):
+
+        method = MethodProxy(
+            self.pool, lambda client: client.restful, operation=operation,
+            timeout=self.timeout, deadline=self.deadline,
+            sobject=self.attr_name, priority=self.priority)
+
+        def call(chunk):
+            path, params, http_method, body = make_request(chunk)
+            return method(path, params=params, method=http_method, json=body)
+
+        results = []
+        pool = eventlet.GreenPool(concurrency)
+        chunks = sobject_collections.chunk(items, size=chunk_size)
+        for chunk_results in pool.imap(call, chunks):
+            results.extend(chunk_results)
+        return results
+
+
+def iter_ahead(iterable, size):
+    """ Yield items of ``iterable``, consuming up to ``size`` items ahead
+    in a background greenthread
+
+    Exceptions raised by ``iterable`` are raised once the items before
+    them are yielded. The greenthread is killed when the generator is
+    closed.
+
+    """
+    # the producer holds one item while waiting to put it in the queue
+    queue = Queue(size - 1)
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put((item, None))
+        except Exception as exc:
+            queue.put((None, exc))
+        else:
+            queue.put((None, StopIteration()))
+
+    producer = eventlet.spawn(produce)
+    try:
+        while True:
+            item, exc = queue.get()
+            if isinstance(exc, StopIteration):
+                return
+            if exc is not None:
+                raise exc
+            yield item
+    finally:
+        producer.kill()
 
 
 class ClientProxy(object):
@@ -98,10 +493,18 @@ class ClientProxy(object):
     In combination with :class:`MethodProxy`, methods are invoked on
     a client that is first checked out of a pool.
 
+    If the pool has a
+    :class:`~nameko_salesforce.api.query_cache.QueryCache`, results of
+    :meth:`query` and :meth:`query_all` are read through it. Writes to
+    sObjects through the proxy invalidate cached queries of their type.
+
     """
 
-    def __init__(self, pool):
+    def __init__(self, pool, timeout=None, deadline=None, priority=None):
         self.pool = pool
+        self.timeout = timeout
+        self.deadline = deadline
+        self.priority = priority
 
     def __getattr__(self, name):
 
@@ -109,9 +512,132 @@ class ClientProxy(object):
             return getattr(client, name)
 
         return ClientAttributeProxy(
-            name, self.pool, get_method_ref
+            name, self.pool, get_method_ref,
+            timeout=self.timeout, deadline=self.deadline,
+            priority=self.priority
         )
 
+    def with_timeout(self, timeout):
+        """ Return a copy of the proxy making requests with ``timeout``
+
+        :param timeout:
+            Number of seconds or a ``(connect timeout, read timeout)``
+            tuple overriding the default timeout of the pool.
+
+        """
+        return self._replace(timeout=timeout)
+
+    def with_deadline(self, deadline):
+        """ Return a copy of the proxy interrupting calls at ``deadline``
+
+        :param deadline:
+            Unix timestamp by which calls must complete, or ``None``.
+
+        """
+        return self._replace(deadline=deadline)
+
+    def with_priority(self, priority):
+        """ Return a copy of the proxy making calls of ``priority``
+
+        :param priority:
+            A :class:`~nameko_salesforce.constants.Priority` or its value.
+
+        """
+        return self._replace(priority=Priority(priority))
+
+    def query(self, soql, include_deleted=False, **kwargs):
+        return self._query(
+            'query', soql, include_deleted=include_deleted, **kwargs)
+
+    def query_all(self, soql, include_deleted=False, **kwargs):
+        return self._query(
+            'query_all', soql, include_deleted=include_deleted, **kwargs)
+
+    def _query(self, operation, soql, include_deleted=False, **kwargs):
+        call = partial(
+            self.__getattr__(operation), soql,
+            include_deleted=include_deleted, **kwargs)
+        cache = self.pool.query_cache
+        if cache is None or kwargs:
+            return call()
+        key = (operation, soql, include_deleted)
+        return cache.get_or_call(key, soql, call)
+
+    def fetch_many(self, sobject_type, ids, fields, concurrency=1):
+        """ Return records of ``sobject_type`` by ID, see
+        :meth:`ClientAttributeProxy.fetch_many`
+        """
+        return getattr(self, sobject_type).fetch_many(
+            ids, fields, concurrency=concurrency)
+
+    def iter_query(self, soql, prefetch=1, include_deleted=False):
+        """ Yield records of ``soql`` lazily, page by page
+
+        While records of a page are consumed, up to ``prefetch`` following
+        pages are fetched in a background greenthread, overlapping network
+        latency with processing while holding about ``prefetch + 1`` pages
+        in memory. With ``prefetch`` set to 0 pages are fetched on demand.
+
+        """
+        pages = self._iter_pages(soql, include_deleted=include_deleted)
+        if prefetch > 0:
+            pages = iter_ahead(pages, prefetch)
+        for page in pages:
+            yield from page['records']
+
+    def _iter_pages(self, soql, include_deleted=False):
+        page = self.query(soql, include_deleted=include_deleted)
+        yield page
+        while not page['done']:
+            page = self.query_more(
+                page['nextRecordsUrl'], identifier_is_url=True,
+                include_deleted=include_deleted)
+            yield page
+
+    def composite(self, all_or_none=False):
+        """ Return a :class:`~nameko_salesforce.api.composite.Composite`
+        request builder sending its subrequests in a single round trip
+        """
+        send = self.proxy_method(lambda client: client.restful, 'composite')
+        return Composite(
+            send, self.pool.api_version, all_or_none=all_or_none,
+            invalidate_query_cache=self.invalidate_query_cache)
+
+    @property
+    def bulk2(self):
+        """ A :class:`~nameko_salesforce.api.bulk.BulkClient` for the
+        Bulk API 2.0
+        """
+        return BulkClient(self)
+
+    def invalidate_query_cache(self, sobject_type):
+        """ Drop cached results of queries selecting from ``sobject_type``
+        """
+        self.pool.invalidate_query_cache(sobject_type)
+
+    def proxy_method(self, get_method_ref, operation, sobject=None):
+        """ Return a :class:`MethodProxy` with the settings of the proxy
+
+        :param get_method_ref:
+            Callable returning the method to call given a checked out
+            client.
+
+        :param operation:
+            Name of the operation, for retries and metrics.
+
+        """
+        return MethodProxy(
+            self.pool, get_method_ref, operation=operation,
+            timeout=self.timeout, deadline=self.deadline, sobject=sobject,
+            priority=self.priority)
+
+    def _replace(self, **attrs):
+        # avoid `copy` which would look up its hooks via `__getattr__`
+        proxy = object.__new__(type(self))
+        proxy.__dict__.update(self.__dict__)
+        proxy.__dict__.update(attrs)
+        return proxy
+
 
 class ClientPool(object):
     """ A pool of :class:`~simple_salesforce.Salesforce` clients.
@@ -119,58 +645,447 @@ class ClientPool(object):
     Allows callers to discard clients that are checked out of the pool,
     for example if they discover that the client's session has expired.
 
+    All clients share a single session obtained by one login. Clients are
+    created from the session ID and instance of that session, so growing
+    the pool does not cost any further logins.
+
+    Each login starts a new session generation. Once a session expires,
+    the first caller to report it logs in again while concurrent callers
+    wait for that login and then reuse the new session. Free clients of
+    older generations are dropped on checkout.
+
+    If a :class:`~nameko_salesforce.session_store.SessionStore` is given,
+    the session is also shared with other service instances through it.
+
+    :meth:`prewarm` logs in and fills the pool with ``min_size`` clients
+    up front, so that first requests do not have to wait for a login.
+
+    If ``session_refresh_after`` is set, :meth:`run_session_refresh` renews
+    the session once it gets that many seconds old, ahead of its timeout,
+    so that requests do not have to wait for a login.
+
+    If ``max_size`` is set, no more than ``max_size`` clients are checked
+    out at any time. Callers wait for a client to be returned to the pool
+    and :class:`ClientPoolExhausted` is raised if none is available within
+    ``checkout_timeout`` seconds.
+
+    If a ``concurrency_limiter`` is given, checkouts also wait for its
+    adaptive limit, see
+    :class:`~nameko_salesforce.api.concurrency.ConcurrencyLimiter`. Calls
+    report their latency and overload errors to it.
+
+    Query results are cached by ``query_cache`` if given, see
+    :class:`~nameko_salesforce.api.query_cache.QueryCache`.
+
+    Failed calls are retried as decided by ``retry_policy``, see
+    :class:`~nameko_salesforce.api.retries.RetryPolicy`.
+
+    Requests time out after ``timeout``, either a number of seconds or
+    a ``(connect timeout, read timeout)`` tuple, unless overridden by the
+    caller.
+
+    All clients send their requests through a single ``http_adapter`` so
+    that connections to the Salesforce instance are kept alive and reused
+    by all of them. See :func:`create_http_adapter`.
+
+    Free clients idle for more than ``idle_timeout`` seconds or older than
+    ``max_lifetime`` seconds are dropped instead of being checked out.
+    :meth:`run_reaper` drops them in the background and shrinks the pool
+    back to ``min_size``. It also closes the connections of the
+    ``http_adapter`` once the pool has been idle for ``idle_timeout``
+    seconds, or they have been open for ``max_lifetime`` seconds.
+
+    The pool reports the following to the ``metrics`` hook, see
+    :class:`~nameko_salesforce.metrics.Metrics`:
+
+    ``salesforce_pool_checkouts_total``
+        Counter of clients checked out of the pool.
+    ``salesforce_pool_checkout_timeouts_total``
+        Counter of checkouts failing with :class:`ClientPoolExhausted`.
+    ``salesforce_pool_checkout_wait_seconds``
+        Histogram of time spent waiting for a client, including creating it.
+    ``salesforce_pool_clients_created_total``
+        Counter of clients created.
+    ``salesforce_pool_clients_discarded_total``
+        Counter of clients dropped from the pool, labelled by ``reason``.
+    ``salesforce_pool_logins_total``
+        Counter of logins.
+    ``salesforce_pool_busy_clients`` and ``salesforce_pool_free_clients``
+        Gauges of clients checked out and waiting in the pool.
+    ``salesforce_api_requests_used`` and ``salesforce_api_requests_limit``
+        Gauges of the org's API usage as last reported by Salesforce.
+    ``salesforce_pool_concurrency_limit``
+        Gauge of the current limit of the ``concurrency_limiter``.
+    ``salesforce_circuit_breaker_rejections_total``
+        Counter of calls failed fast by ``circuit_breakers``, labelled by
+        ``circuit``.
+
     """
 
     def __init__(
         self, username, password, security_token,
-        sandbox=False, api_version=None
+        sandbox=False, api_version=None, min_size=0, max_size=None,
+        checkout_timeout=constants.DEFAULT_POOL_CHECKOUT_TIMEOUT,
+        session_store=None, session_refresh_after=None,
+        idle_timeout=None, max_lifetime=None,
+        reap_interval=constants.DEFAULT_POOL_REAP_INTERVAL,
+        http_adapter=None,
+        timeout=(
+            constants.DEFAULT_CONNECT_TIMEOUT, constants.DEFAULT_READ_TIMEOUT),
+        retry_policy=None, metrics=None, api_quota=None, rate_limiter=None,
+        concurrency_limiter=None, circuit_breakers=None, query_cache=None
     ):
         self.username = username
         self.password = password
         self.security_token = security_token
         self.sandbox = sandbox
         self.api_version = api_version or constants.DEFAULT_API_VERSION
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.reap_interval = reap_interval
+        self.http_adapter = http_adapter or create_http_adapter()
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or Metrics()
+        self.api_quota = api_quota or ApiQuota()
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.circuit_breakers = circuit_breakers
+        self.query_cache = query_cache
+        self.session_store = session_store
+        self.session_refresh_after = session_refresh_after
+        self.session_id = None
+        self.instance = None
+        self.session_generation = 0
+        self.session_obtained_at = None
+        self.login_lock = Semaphore()
         self.free = set()
         self.busy = set()
+        self.last_used_at = self.connections_opened_at = time.monotonic()
+        if max_size is not None:
+            self.semaphore = Semaphore(max_size)
+        else:
+            self.semaphore = None
 
     @contextmanager
     def get(self):
+        started_at = time.monotonic()
+        self._acquire()
         try:
+            client = self._pop_free()
+            self.busy.add(client)
+            self.metrics.increment('salesforce_pool_checkouts_total')
+            self.metrics.observe(
+                'salesforce_pool_checkout_wait_seconds',
+                time.monotonic() - started_at)
+            self._set_size_gauges()
+            try:
+                yield client
+            finally:
+                self.last_used_at = time.monotonic()
+                try:
+                    self.busy.remove(client)
+                    client.returned_at = self.last_used_at
+                    self.free.add(client)
+                except KeyError:
+                    pass  # client was discarded
+                self._set_size_gauges()
+        finally:
+            self._release()
+
+    def _pop_free(self):
+        while self.free:
             client = self.free.pop()
-        except KeyError:
-            client = self.create()
+            reason = self._get_expiry_reason(client, time.monotonic())
+            if reason is None:
+                return client
+            self._count_discarded(reason)
+        return self.create()
+
+    def _get_expiry_reason(self, client, now):
+        if client.session_generation != self.session_generation:
+            return 'stale_session'
+        if (
+            self.max_lifetime is not None and
+            now - client.created_at > self.max_lifetime
+        ):
+            return 'max_lifetime'
+        if (
+            self.idle_timeout is not None and
+            now - client.returned_at > self.idle_timeout
+        ):
+            return 'idle'
+        return None
+
+    def update_api_quota(self, response):
+        self.api_quota.update(response)
+        if self.api_quota.limit:
+            self.metrics.set_gauge(
+                'salesforce_api_requests_used', self.api_quota.used)
+            self.metrics.set_gauge(
+                'salesforce_api_requests_limit', self.api_quota.limit)
+
+    def _count_discarded(self, reason):
+        self.metrics.increment(
+            'salesforce_pool_clients_discarded_total', reason=reason)
+
+    def _set_size_gauges(self):
+        self.metrics.set_gauge('salesforce_pool_busy_clients', len(self.busy))
+        self.metrics.set_gauge('salesforce_pool_free_clients', len(self.free))
+
+    def _acquire(self):
+        limiter = self.concurrency_limiter
+        if limiter is not None and not limiter.acquire(self.checkout_timeout):
+            self.metrics.increment('salesforce_pool_checkout_timeouts_total')
+            raise ClientPoolExhausted(
+                'Concurrency limit of {} reached for {} seconds'.format(
+                    limiter.limit, self.checkout_timeout))
+        if self.semaphore is None:
+            return
+        if not self.semaphore.acquire(timeout=self.checkout_timeout):
+            if limiter is not None:
+                limiter.release()
+            self.metrics.increment('salesforce_pool_checkout_timeouts_total')
+            raise ClientPoolExhausted(
+                'No client available in the pool of size {} after waiting '
+                '{} seconds'.format(self.max_size, self.checkout_timeout))
+
+    def _release(self):
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.release()
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+    def check_circuit(self, sobject=None):
+        """ Return the circuit breaker of a call if it may be made
+
+        Checked before waiting for the rate limiter or a client, so that
+        calls to an open circuit fail fast. Before the first login, only
+        the circuit of logins is checked.
+
+        :raises ~nameko_salesforce.api.circuit_breaker.CircuitOpen:
+            If the circuit is open.
 
-        self.busy.add(client)
+        """
+        if self.circuit_breakers is None:
+            return None
+        if self.instance is None:
+            self._allow(self._get_login_circuit())
+            return None
+        breaker = self.circuit_breakers.get(self.instance, sobject)
+        self._allow(breaker)
+        return breaker
+
+    def _allow(self, breaker):
         try:
-            yield client
-        finally:
-            try:
-                self.busy.remove(client)
-                self.free.add(client)
-            except KeyError:
-                pass  # client was discarded
+            breaker.allow()
+        except CircuitOpen:
+            self.metrics.increment(
+                'salesforce_circuit_breaker_rejections_total',
+                circuit=breaker.name)
+            raise
+
+    @property
+    def login_host(self):
+        return '{}.salesforce.com'.format('test' if self.sandbox else 'login')
+
+    def _get_login_circuit(self):
+        """ Return the circuit breaker recording logins
+
+        Logins count towards the circuit of the instance once known, and
+        towards a circuit of the login host before.
+
+        """
+        return self.circuit_breakers.get(self.instance or self.login_host)
+
+    def invalidate_query_cache(self, sobject_type):
+        """ Drop cached results of queries selecting from ``sobject_type``
+        """
+        if self.query_cache is not None:
+            self.query_cache.invalidate(sobject_type)
+
+    def observe_call(self, latency, exc=None, operation=None):
+        """ Report the outcome of a call to the concurrency limiter
+        """
+        if self.concurrency_limiter is None:
+            return
+        self.concurrency_limiter.observe(
+            latency, overload=is_overload(exc), operation=operation)
+        self.metrics.set_gauge(
+            'salesforce_pool_concurrency_limit',
+            self.concurrency_limiter.limit)
+
+    def _create_session(self):
+        session = Session(timeout=self.timeout)
+        session.mount('http://', self.http_adapter)
+        session.mount('https://', self.http_adapter)
+        return session
 
     def create(self):
-        session = requests.Session()
-        retry_adapter = requests.adapters.HTTPAdapter(
-            max_retries=Retry(
-                connect=CONNECT_RETRIES,
-                read=READ_RETRIES,
-                redirect=REDIRECT_RETRIES
-            )
-        )
-        session.mount('http://', retry_adapter)
-        session.mount('https://', retry_adapter)
+        session = self._create_session()
+
+        session_id, instance, generation = self.get_session()
 
         client = simple_salesforce.Salesforce(
-            username=self.username,
-            password=self.password,
-            security_token=self.security_token,
+            session_id=session_id,
+            instance=instance,
             sandbox=self.sandbox,
             version=self.api_version,
             session=session
         )
+        client.session_generation = generation
+        client.created_at = client.returned_at = time.monotonic()
+        self.metrics.increment('salesforce_pool_clients_created_total')
         return client
 
-    def discard(self, client):
+    def prewarm(self):
+        """ Log in and add clients to the pool until it has ``min_size``
+        """
+        self.get_session()
+        self._fill()
+
+    def _fill(self):
+        size = self.min_size
+        if self.max_size is not None:
+            size = min(size, self.max_size)
+        while len(self.free) + len(self.busy) < size:
+            self.free.add(self.create())
+        self._set_size_gauges()
+
+    def discard(self, client, reason='discarded'):
         self.busy.discard(client)
+        self._count_discarded(reason)
+
+    def reap(self):
+        """ Drop idle and expired free clients and connections
+
+        Replaces clients with new ones if the pool shrinks below
+        ``min_size`` and there is a session to create them from.
+
+        """
+        now = time.monotonic()
+        for client in list(self.free):
+            reason = self._get_expiry_reason(client, now)
+            if reason is not None:
+                self.free.discard(client)
+                self._count_discarded(reason)
+        if self.session_id is not None:
+            self._fill()
+        self._set_size_gauges()
+        self._reap_connections(now)
+
+    def _reap_connections(self, now):
+        idle = (
+            self.idle_timeout is not None and not self.busy and
+            now - self.last_used_at > self.idle_timeout
+        )
+        expired = (
+            self.max_lifetime is not None and
+            now - self.connections_opened_at > self.max_lifetime
+        )
+        if idle or expired:
+            # connections in use are closed once released
+            self.http_adapter.poolmanager.clear()
+            self.connections_opened_at = now
+
+    def run_reaper(self):
+        """ Keep reaping free clients every ``reap_interval`` seconds
+
+        Runs forever, spawn it in a background thread.
+
+        """
+        while True:
+            sleep(self.reap_interval)
+            self.reap()
+
+    def close(self):
+        """ Drop all free clients and close connections of the pool
+        """
+        self.free.clear()
+        self._set_size_gauges()
+        self.http_adapter.close()
+
+    def login(self):
+        if self.session_store is not None:
+            session_id, instance = self.session_store.login(
+                self._login, expired_session_id=self.session_id)
+        else:
+            session_id, instance = self._login()
+        self.session_id = session_id
+        self.instance = instance
+        self.session_generation += 1
+        self.session_obtained_at = time.monotonic()
+        self.metrics.increment('salesforce_pool_logins_total')
+
+    def _login(self):
+        session = self._create_session()
+        try:
+            result = SalesforceLogin(
+                session=session,
+                username=self.username,
+                password=self.password,
+                security_token=self.security_token,
+                sandbox=self.sandbox,
+                sf_version=self.api_version,
+            )
+        except Exception as exc:
+            self._record_login(exc, session.last_response)
+            raise
+        self._record_login()
+        return result
+
+    def _record_login(self, exc=None, response=None):
+        if self.circuit_breakers is None:
+            return
+        if response is not None and isinstance(
+            exc, simple_salesforce.SalesforceAuthenticationFailed
+        ):
+            # authentication failures do not tell the status of the response
+            exc = simple_salesforce.SalesforceGeneralError(
+                response.url, response.status_code, 'login', response.content)
+        self._get_login_circuit().record(exc)
+
+    def get_session(self):
+        """ Return session ID, instance and generation of the session
+        shared by all pooled clients
+
+        Logs in if there is no valid session. Concurrent callers wait for
+        a login in progress instead of logging in again.
+
+        """
+        with self.login_lock:
+            if self.session_id is None:
+                self.login()
+        return self.session_id, self.instance, self.session_generation
+
+    def renew_session(self, generation):
+        """ Replace the session of the given generation with a new one
+
+        Only the first caller reporting an expired generation logs in.
+        Callers reporting the same generation later, or concurrently, wait
+        for that login and return without logging in again.
+
+        """
+        with self.login_lock:
+            if self.session_generation == generation:
+                self.login()
+
+    def get_session_age(self):
+        if self.session_obtained_at is not None:
+            return time.monotonic() - self.session_obtained_at
+
+    def refresh_session(self):
+        self.renew_session(self.session_generation)
+
+    def run_session_refresh(self):
+        """ Keep renewing the session ahead of its timeout
+
+        Runs forever, spawn it in a background thread.
+
+        """
+        refresh_session_periodically(
+            self.refresh_session, self.get_session_age,
+            self.session_refresh_after)
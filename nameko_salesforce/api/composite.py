@@ -0,0 +1,324 @@
+import re
+from urllib.parse import urlencode
+
+
+MAX_SUBREQUESTS = 25
+""" Maximum number of subrequests per Composite API request
+"""
+
+
+REFERENCE_PATTERN = re.compile(r'@\{(\w+)((?:\.\w+|\[\d+\])+)\}')
+
+PATH_PATTERN = re.compile(r'\.(\w+)|\[(\d+)\]')
+
+SOBJECT_URL_PATTERN = re.compile(r'/sobjects/(\w+)/')
+
+
+class CompositeError(Exception):
+    """ Raised when subrequests of a composite request failed
+
+    :attr:`references` holds all references of the request, with their
+    results, and :attr:`failed` those whose subrequest failed.
+
+    """
+
+    def __init__(self, references):
+        self.references = references
+        self.failed = [
+            reference for reference in references if not reference.success]
+        super().__init__(
+            '{} of {} subrequests failed: {}'.format(
+                len(self.failed), len(references),
+                '; '.join(
+                    '{}: {}'.format(reference.reference_id, reference.body)
+                    for reference in self.failed)))
+
+
+class Reference(object):
+    """ Reference to the result of a subrequest of a composite request
+
+    Before the request is sent, :attr:`id` can be used in the body of
+    later subrequests to refer to the ID of the record of this one.
+
+    """
+
+    def __init__(self, reference_id):
+        self.reference_id = reference_id
+
+        self.status = None
+        """ HTTP status code of the subrequest once sent
+        """
+
+        self.body = None
+        """ Response body of the subrequest once sent
+        """
+
+    def __repr__(self):
+        return '<Reference {} status={}>'.format(
+            self.reference_id, self.status)
+
+    @property
+    def id(self):
+        return self.field('id')
+
+    def field(self, name):
+        """ Return a reference to field ``name`` of the subrequest result
+        """
+        return '@{{{}.{}}}'.format(self.reference_id, name)
+
+    @property
+    def sent(self):
+        return self.status is not None
+
+    @property
+    def success(self):
+        return self.sent and self.status < 400
+
+    @property
+    def record_id(self):
+        """ ID of the created record once sent
+        """
+        if isinstance(self.body, dict):
+            return self.body.get('id')
+
+
+class CompositeRequest(object):
+    """ Subrequests to send with the Composite API
+
+    Subrequests are sent in order in chunks of up to
+    :data:`MAX_SUBREQUESTS`. References to results of subrequests sent
+    in earlier chunks, e.g. ``@{ref1.id}`` or ``@{ref1.records[0].Id}``,
+    are replaced with their values before sending.
+
+    """
+
+    def __init__(self, api_version):
+        self.api_version = api_version
+        self.subrequests = []
+        self.references = {}
+
+    def __len__(self):
+        return len(self.subrequests)
+
+    def url(self, path):
+        return '/services/data/v{}/{}'.format(self.api_version, path)
+
+    def sobject_url(self, sobject_type, record_id=None):
+        url = self.url('sobjects/{}/'.format(sobject_type))
+        if record_id is not None:
+            url += record_id
+        return url
+
+    def add(self, method, url, body=None, reference_id=None):
+        """ Add a subrequest and return a :class:`Reference` to its result
+        """
+        if reference_id is None:
+            reference_id = 'ref{}'.format(len(self.subrequests) + 1)
+        if reference_id in self.references:
+            raise ValueError(
+                'Duplicate reference ID {}'.format(reference_id))
+        subrequest = {
+            'method': method,
+            'url': url,
+            'referenceId': reference_id,
+        }
+        if body is not None:
+            subrequest['body'] = body
+        self.subrequests.append(subrequest)
+        reference = self.references[reference_id] = Reference(reference_id)
+        return reference
+
+    def get_written_sobject_types(self, subrequests):
+        """ Return the sObject types ``subrequests`` write to
+        """
+        sobject_types = set()
+        for subrequest in subrequests:
+            match = SOBJECT_URL_PATTERN.search(subrequest['url'])
+            if match is not None and subrequest['method'] != 'GET':
+                sobject_types.add(match.group(1))
+        return sobject_types
+
+    def chunks(self):
+        for start in range(0, len(self.subrequests), MAX_SUBREQUESTS):
+            yield self.subrequests[start:start + MAX_SUBREQUESTS]
+
+    def make_body(self, subrequests, all_or_none=False):
+        """ Return the request body of ``subrequests``
+
+        Resolves references to subrequests already sent.
+
+        """
+        return {
+            'allOrNone': all_or_none,
+            'compositeRequest': [
+                self._resolve(subrequest) for subrequest in subrequests],
+        }
+
+    def _resolve(self, value):
+        if isinstance(value, str):
+            return REFERENCE_PATTERN.sub(self._resolve_match, value)
+        if isinstance(value, dict):
+            return {key: self._resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(item) for item in value]
+        return value
+
+    def _resolve_match(self, match):
+        reference = self.references.get(match.group(1))
+        if reference is None or not reference.sent:
+            return match.group(0)
+        value = reference.body
+        for field, index in PATH_PATTERN.findall(match.group(2)):
+            try:
+                value = value[field] if field else value[int(index)]
+            except (IndexError, KeyError, TypeError):
+                return match.group(0)
+        return str(value)
+
+    def set_results(self, response):
+        """ Store results of a Composite API ``response`` on references
+        """
+        for result in response['compositeResponse']:
+            reference = self.references[result['referenceId']]
+            reference.status = result['httpStatusCode']
+            reference.body = result['body']
+
+    def get_references(self):
+        """ Return references of all subrequests, in order
+
+        :raises CompositeError:
+            If any subrequest failed.
+
+        """
+        references = [
+            self.references[subrequest['referenceId']]
+            for subrequest in self.subrequests
+        ]
+        if not all(reference.success for reference in references):
+            raise CompositeError(references)
+        return references
+
+
+class Composite(object):
+    """ Builder of a Composite API request
+
+    Subrequests are added by calling methods named after the
+    :class:`~simple_salesforce.Salesforce` client methods they stand for,
+    e.g. ``composite.query(soql)`` or ``composite.Contact.update(id,
+    data)``. Each returns a :class:`Reference` to its result, which may be
+    referred to by later subrequests, e.g. with :attr:`Reference.id` or
+    :meth:`Reference.field`. All subrequests are then sent in a single
+    round trip by :meth:`execute`.
+
+    Subrequests are sent in chunks of up to :data:`MAX_SUBREQUESTS`, and
+    no further chunks are sent once a subrequest fails. With
+    ``all_or_none`` set, a failing subrequest rolls back all others, so
+    the request may only hold up to :data:`MAX_SUBREQUESTS` subrequests
+    for them to be sent at once.
+
+    ``invalidate_query_cache`` is called with each sObject type written
+    to once its subrequests are sent.
+
+    """
+
+    def __init__(
+        self, send, api_version, all_or_none=False,
+        invalidate_query_cache=None
+    ):
+        self.send = send
+        self.all_or_none = all_or_none
+        self.invalidate_query_cache = invalidate_query_cache
+        self.request = CompositeRequest(api_version)
+
+    def __len__(self):
+        return len(self.request)
+
+    def __getattr__(self, name):
+        return CompositeResource(self, name)
+
+    def add(self, method, url, body=None, reference_id=None):
+        """ Add a subrequest to ``url``, relative to the instance
+
+        :raises ValueError:
+            If ``all_or_none`` is set and the request already holds
+            :data:`MAX_SUBREQUESTS` subrequests.
+
+        """
+        if self.all_or_none and len(self.request) >= MAX_SUBREQUESTS:
+            raise ValueError(
+                'All or none composite requests hold up to {} '
+                'subrequests'.format(MAX_SUBREQUESTS))
+        return self.request.add(
+            method, url, body=body, reference_id=reference_id)
+
+    def query(self, soql, reference_id=None):
+        return self.add(
+            'GET', self.request.url('query/?' + urlencode({'q': soql})),
+            reference_id=reference_id)
+
+    def query_all(self, soql, reference_id=None):
+        return self.add(
+            'GET', self.request.url('queryAll/?' + urlencode({'q': soql})),
+            reference_id=reference_id)
+
+    def execute(self):
+        """ Send all subrequests and return references to their results
+
+        :raises CompositeError:
+            If any subrequest failed.
+
+        """
+        request = self.request
+        for subrequests in request.chunks():
+            try:
+                response = self.send(
+                    'composite', method='POST',
+                    json=request.make_body(
+                        subrequests, all_or_none=self.all_or_none))
+            finally:
+                self._invalidate(
+                    request.get_written_sobject_types(subrequests))
+            request.set_results(response)
+            if not all(
+                request.references[subrequest['referenceId']].success
+                for subrequest in subrequests
+            ):
+                break  # later subrequests may refer to failed ones
+        return request.get_references()
+
+    def _invalidate(self, sobject_types):
+        if self.invalidate_query_cache is not None:
+            for sobject_type in sobject_types:
+                self.invalidate_query_cache(sobject_type)
+
+
+class CompositeResource(object):
+    """ Subrequests to an sObject resource of a :class:`Composite` request
+    """
+
+    def __init__(self, composite, sobject_type):
+        self.composite = composite
+        self.sobject_type = sobject_type
+
+    def _add(self, method, record_id=None, body=None, reference_id=None):
+        return self.composite.add(
+            method,
+            self.composite.request.sobject_url(self.sobject_type, record_id),
+            body=body, reference_id=reference_id)
+
+    def get(self, record_id, reference_id=None):
+        return self._add('GET', record_id, reference_id=reference_id)
+
+    def create(self, data, reference_id=None):
+        return self._add('POST', body=data, reference_id=reference_id)
+
+    def update(self, record_id, data, reference_id=None):
+        return self._add(
+            'PATCH', record_id, body=data, reference_id=reference_id)
+
+    def upsert(self, record_id, data, reference_id=None):
+        return self._add(
+            'PATCH', record_id, body=data, reference_id=reference_id)
+
+    def delete(self, record_id, reference_id=None):
+        return self._add('DELETE', record_id, reference_id=reference_id)
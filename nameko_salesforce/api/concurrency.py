@@ -0,0 +1,168 @@
+from collections import deque
+
+import eventlet
+from eventlet.event import Event
+import requests
+import simple_salesforce
+
+from nameko_salesforce import constants
+from nameko_salesforce.api.retries import (
+    get_error_codes,
+    IDEMPOTENT_RETRY_STATUSES,
+    RETRY_STATUSES,
+)
+
+
+OVERLOAD_ERROR_CODES = frozenset((
+    'REQUEST_LIMIT_EXCEEDED',
+    'SERVER_UNAVAILABLE',
+))
+""" Salesforce error codes signalling it cannot keep up with requests
+"""
+
+
+def is_overload(exc):
+    """ Return whether ``exc`` signals that Salesforce is overloaded
+    """
+    if isinstance(exc, simple_salesforce.SalesforceError):
+        return bool(
+            exc.status in RETRY_STATUSES or
+            exc.status in IDEMPOTENT_RETRY_STATUSES or
+            get_error_codes(exc) & OVERLOAD_ERROR_CODES
+        )
+    return isinstance(exc, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    ))
+
+
+def get_concurrency_limiter(config):
+    """ Return a :class:`ConcurrencyLimiter` if enabled in Salesforce config
+    """
+    if not config.get('CONCURRENCY_LIMIT_ENABLED', False):
+        return None
+    return ConcurrencyLimiter(
+        initial_limit=config.get(
+            'CONCURRENCY_LIMIT_INITIAL',
+            constants.DEFAULT_CONCURRENCY_LIMIT_INITIAL),
+        min_limit=config.get('CONCURRENCY_LIMIT_MIN', 1),
+        max_limit=config.get(
+            'CONCURRENCY_LIMIT_MAX',
+            config.get('POOL_MAX_SIZE') or
+            constants.DEFAULT_CONCURRENCY_LIMIT_MAX),
+        latency_tolerance=config.get('CONCURRENCY_LIMIT_LATENCY_TOLERANCE', 2),
+    )
+
+
+class ConcurrencyLimiter(object):
+    """ Adaptive limit of concurrent calls to Salesforce
+
+    Follows additive increase, multiplicative decrease: the limit grows by
+    one for every ``limit`` calls completing in good health while the
+    limit is in use, and is multiplied by ``backoff_ratio`` when a call
+    fails with an overload error or when smoothed latency rises above
+    ``latency_tolerance`` times the baseline latency. The baseline follows
+    the lowest latencies seen, drifting up by ``baseline_smoothing`` to
+    adapt to lasting changes, while latency is smoothed by ``smoothing``.
+    Both are kept per operation, so that slow operations are not compared
+    with fast ones.
+
+    Callers over the limit wait for a call to complete.
+
+    """
+
+    def __init__(
+        self,
+        initial_limit=constants.DEFAULT_CONCURRENCY_LIMIT_INITIAL,
+        min_limit=1,
+        max_limit=constants.DEFAULT_CONCURRENCY_LIMIT_MAX,
+        backoff_ratio=0.5,
+        latency_tolerance=2,
+        smoothing=0.2,
+        baseline_smoothing=0.01,
+    ):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_smoothing = baseline_smoothing
+
+        self.in_flight = 0
+        self.successes = 0
+        self.latency = {}
+        self.baseline_latency = {}
+        self.waiters = deque()
+
+    def acquire(self, timeout=None):
+        """ Wait for a free slot and return whether one was acquired
+        """
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            return True
+        waiter = Event()
+        self.waiters.append(waiter)
+        with eventlet.Timeout(timeout, False):
+            waiter.wait()
+        if waiter.ready():
+            return True  # slot was handed over by `release`
+        self.waiters.remove(waiter)
+        return False
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self.waiters and self.in_flight < self.limit:
+            self.in_flight += 1
+            self.waiters.popleft().send()
+
+    def observe(self, latency, overload=False, operation=None):
+        """ Adapt the limit to the outcome of a completed call
+
+        :param latency:
+            Duration of the call in seconds.
+
+        :param overload:
+            Whether the call failed because Salesforce is overloaded.
+
+        :param operation:
+            Hashable key of the kind of call, whose latency is compared
+            with that of calls of the same kind only.
+
+        """
+        if overload:
+            self._decrease()
+            return
+
+        smoothed = self.latency.get(operation)
+        if smoothed is None:
+            smoothed = self.latency[operation] = latency
+            baseline = self.baseline_latency[operation] = latency
+        else:
+            smoothed += (latency - smoothed) * self.smoothing
+            self.latency[operation] = smoothed
+            baseline = self.baseline_latency[operation]
+            if latency < baseline:
+                baseline = latency
+            else:
+                baseline += (latency - baseline) * self.baseline_smoothing
+            self.baseline_latency[operation] = baseline
+
+        if smoothed > baseline * self.latency_tolerance:
+            self._decrease()
+        elif self.in_flight >= self.limit:
+            self.successes += 1
+            if self.successes >= self.limit:
+                self.successes = 0
+                self.limit = min(self.limit + 1, self.max_limit)
+                self._wake_waiters()
+
+    def _decrease(self):
+        self.successes = 0
+        self.limit = max(
+            int(self.limit * self.backoff_ratio), self.min_limit)
+        # start over measuring latency at the new limit
+        self.latency = dict(self.baseline_latency)
@@ -1,11 +1,81 @@
+import logging
+
 from nameko.exceptions import ConfigurationError
 from nameko.extensions import DependencyProvider
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
 
 from nameko_salesforce import constants
-from nameko_salesforce.api.client import get_client
+from nameko_salesforce.api.circuit_breaker import get_circuit_breakers
+from nameko_salesforce.api.client import create_http_adapter, get_client
+from nameko_salesforce.api.concurrency import get_concurrency_limiter
+from nameko_salesforce.api.memo import Memo
+from nameko_salesforce.api.query_cache import get_query_cache
+from nameko_salesforce.api.quota import ApiQuota
+from nameko_salesforce.api.retries import (
+    RETRY_ERROR_CODES,
+    IDEMPOTENT_RETRY_STATUSES,
+    RETRY_STATUSES,
+    RetryPolicy,
+)
+from nameko_salesforce.api.unit_of_work import UnitOfWork
+from nameko_salesforce.rate_limit import get_rate_limiter
+from nameko_salesforce.session_refresh import get_session_refresh_after
+from nameko_salesforce.session_store import get_session_store
+
+
+logger = logging.getLogger(__name__)
 
 
 class SalesforceAPI(DependencyProvider):
+    """ Dependency provider of a pooled Salesforce REST API client
+
+    If ``POOL_MIN_SIZE`` is set, the pool is filled on container start,
+    unless ``POOL_LAZY`` is set to postpone the login until the first
+    request.
+
+    Metrics of the client pool are reported to ``metrics``, an instance
+    of :class:`~nameko_salesforce.metrics.Metrics`.
+
+    If the worker context data contains a deadline under
+    :data:`~nameko_salesforce.constants.DEADLINE_CONTEXT_KEY`, calls made
+    by the worker are interrupted once it passes. Likewise a
+    :class:`~nameko_salesforce.constants.Priority` value under
+    :data:`~nameko_salesforce.constants.PRIORITY_CONTEXT_KEY` sets the
+    priority of calls made by the worker as API quota runs out.
+
+    With ``unit_of_work`` set, workers get a
+    :class:`~nameko_salesforce.api.unit_of_work.UnitOfWork` buffering
+    their writes, which are sent as a single Composite API request once
+    the worker completes successfully and discarded if it fails. Writes
+    failing at that point are logged; call
+    :meth:`~nameko_salesforce.api.unit_of_work.UnitOfWork.flush` from the
+    worker to handle failures there. Unless ``all_or_none`` is unset,
+    a failing write rolls back all writes of the worker, which may then
+    buffer no more than
+    :data:`~nameko_salesforce.api.composite.MAX_SUBREQUESTS` writes.
+
+    With ``memoize`` set, workers get a
+    :class:`~nameko_salesforce.api.memo.Memo` returning the result of the
+    first of identical read calls they make, dropped once the worker is
+    torn down.
+
+    With ``QUERY_CACHE_ENABLED`` set, query results are cached, see
+    :class:`~nameko_salesforce.api.query_cache.QueryCache`. Workers of
+    :func:`~nameko_salesforce.streaming.handle_sobject_notification`
+    entrypoints of the service invalidate cached queries of their sObject
+    type before they run.
+
+    """
+
+    def __init__(
+        self, metrics=None, unit_of_work=False, all_or_none=True,
+        memoize=False
+    ):
+        self.metrics = metrics
+        self.unit_of_work = unit_of_work
+        self.all_or_none = all_or_none
+        self.memoize = memoize
+        self.units_of_work = {}
 
     def setup(self):
 
@@ -27,10 +97,110 @@ class SalesforceAPI(DependencyProvider):
             ) from exc
 
         api_version = config.get('API_VERSION', constants.DEFAULT_API_VERSION)
+        pool_min_size = config.get('POOL_MIN_SIZE', 0)
+        pool_max_size = config.get('POOL_MAX_SIZE')
+        pool_checkout_timeout = config.get(
+            'POOL_CHECKOUT_TIMEOUT', constants.DEFAULT_POOL_CHECKOUT_TIMEOUT)
+
+        http_adapter = create_http_adapter(
+            pool_connections=config.get(
+                'HTTP_POOL_CONNECTIONS', DEFAULT_POOLSIZE),
+            pool_maxsize=config.get(
+                'HTTP_POOL_MAXSIZE', pool_max_size or DEFAULT_POOLSIZE),
+            pool_block=config.get('HTTP_POOL_BLOCK', DEFAULT_POOLBLOCK),
+            tcp_keepalive=config.get('HTTP_TCP_KEEPALIVE'),
+        )
+
+        retry_policy = RetryPolicy(
+            max_attempts=config.get(
+                'RETRY_MAX_ATTEMPTS', constants.DEFAULT_RETRY_MAX_ATTEMPTS),
+            backoff=config.get(
+                'RETRY_BACKOFF', constants.DEFAULT_RETRY_BACKOFF),
+            max_backoff=config.get(
+                'RETRY_MAX_BACKOFF', constants.DEFAULT_RETRY_MAX_BACKOFF),
+            error_codes=config.get('RETRY_ERROR_CODES', RETRY_ERROR_CODES),
+            statuses=config.get('RETRY_STATUSES', RETRY_STATUSES),
+            idempotent_statuses=config.get(
+                'RETRY_IDEMPOTENT_STATUSES', IDEMPOTENT_RETRY_STATUSES),
+        )
 
         self.client = get_client(
             username, password, security_token,
-            sandbox=sandbox, api_version=api_version)
+            sandbox=sandbox, api_version=api_version,
+            min_size=pool_min_size, max_size=pool_max_size,
+            checkout_timeout=pool_checkout_timeout,
+            session_store=get_session_store(config),
+            session_refresh_after=get_session_refresh_after(config),
+            idle_timeout=config.get('POOL_IDLE_TIMEOUT'),
+            max_lifetime=config.get('POOL_MAX_LIFETIME'),
+            reap_interval=config.get(
+                'POOL_REAP_INTERVAL', constants.DEFAULT_POOL_REAP_INTERVAL),
+            http_adapter=http_adapter,
+            timeout=(
+                config.get(
+                    'CONNECT_TIMEOUT', constants.DEFAULT_CONNECT_TIMEOUT),
+                config.get('READ_TIMEOUT', constants.DEFAULT_READ_TIMEOUT),
+            ),
+            retry_policy=retry_policy,
+            metrics=self.metrics,
+            api_quota=ApiQuota(
+                soft_limit=config.get('API_QUOTA_SOFT_LIMIT'),
+                hard_limit=config.get('API_QUOTA_HARD_LIMIT'),
+                max_delay=config.get(
+                    'API_QUOTA_MAX_DELAY',
+                    constants.DEFAULT_API_QUOTA_MAX_DELAY),
+            ),
+            rate_limiter=get_rate_limiter(
+                config, self.container.service_name),
+            concurrency_limiter=get_concurrency_limiter(config),
+            circuit_breakers=get_circuit_breakers(config),
+            query_cache=get_query_cache(config))
+        self.lazy = config.get('POOL_LAZY', False)
+
+    def start(self):
+        pool = self.client.pool
+        if pool.min_size and not self.lazy:
+            pool.prewarm()
+        if pool.session_refresh_after is not None:
+            self.container.spawn_managed_thread(pool.run_session_refresh)
+        if pool.idle_timeout is not None or pool.max_lifetime is not None:
+            self.container.spawn_managed_thread(pool.run_reaper)
+
+    def stop(self):
+        self.client.pool.close()
+
+    def worker_setup(self, worker_ctx):
+        sobject_type = getattr(worker_ctx.entrypoint, 'sobject_type', None)
+        if sobject_type is not None:
+            self.client.pool.invalidate_query_cache(sobject_type)
 
     def get_dependency(self, worker_ctx):
-        return self.client
+        client = self.client
+        deadline = worker_ctx.data.get(constants.DEADLINE_CONTEXT_KEY)
+        if deadline is not None:
+            client = client.with_deadline(deadline)
+        priority = worker_ctx.data.get(constants.PRIORITY_CONTEXT_KEY)
+        if priority is not None:
+            client = client.with_priority(priority)
+        if self.memoize:
+            client = Memo(client)
+        if not self.unit_of_work:
+            return client
+        unit_of_work = UnitOfWork(client, all_or_none=self.all_or_none)
+        self.units_of_work[worker_ctx] = unit_of_work
+        return unit_of_work
+
+    def worker_result(self, worker_ctx, result=None, exc_info=None):
+        unit_of_work = self.units_of_work.get(worker_ctx)
+        if unit_of_work is not None and exc_info is not None:
+            unit_of_work.discard()
+
+    def worker_teardown(self, worker_ctx):
+        unit_of_work = self.units_of_work.pop(worker_ctx, None)
+        if unit_of_work is None:
+            return
+        try:
+            unit_of_work.flush()
+        except Exception:
+            logger.exception(
+                'Failed to flush Salesforce writes of %s', worker_ctx)
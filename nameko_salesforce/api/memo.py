@@ -0,0 +1,150 @@
+import copy
+
+from nameko_salesforce.api.bulk import BulkClient
+from nameko_salesforce.api.client import MethodProxy
+from nameko_salesforce.api.query_cache import WRITE_OPERATIONS
+
+
+MEMOIZED_OPERATIONS = frozenset((
+    'describe',
+    'fetch_many',
+    'get',
+    'get_by_custom_id',
+    'metadata',
+    'query',
+    'query_all',
+))
+""" Client and sObject methods whose results are memoized
+"""
+
+
+REQUEST_OPERATIONS = {
+    'apexecute': 1,
+    'restful': 2,
+}
+""" Client methods making requests of any HTTP method, with the position
+of their ``method`` argument
+"""
+
+
+def freeze(value):
+    """ Return ``value`` with lists, sets and dicts made hashable
+    """
+    if isinstance(value, dict):
+        return tuple(sorted(
+            (key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(item) for item in value)
+    return value
+
+
+def is_write(operation, args, kwargs):
+    """ Return whether a call of ``operation`` may write records
+    """
+    if operation in WRITE_OPERATIONS:
+        return True
+    position = REQUEST_OPERATIONS.get(operation)
+    if position is None:
+        return False
+    if len(args) > position:
+        method = args[position]
+    else:
+        method = kwargs.get('method', 'GET')
+    return method.upper() != 'GET'
+
+
+class Memo(object):
+    """ Worker scoped proxy to a :class:`~.client.ClientProxy` memoizing
+    identical read calls
+
+    Calls of :data:`MEMOIZED_OPERATIONS`, e.g. ``salesforce.query(soql)``
+    or ``salesforce.Account.get(id)``, return the result of the first
+    identical call, copied so that callers may modify it. Writes, e.g.
+    ``salesforce.Contact.update(id, data)``, requests of other methods
+    than GET through ``restful`` or ``apexecute``, composite requests
+    and Bulk API 2.0 ingest jobs drop all results, so the worker reads its
+    own writes. Copies of the client with other request options, e.g.
+    ``salesforce.with_timeout(5)``, share the results. All other
+    attributes are those of the client.
+
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.results = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if isinstance(attr, MethodProxy) or name in MEMOIZED_OPERATIONS:
+            return MemoizedAttributeProxy(self, (name,))
+        return attr
+
+    def with_timeout(self, timeout):
+        return self._replace(self.client.with_timeout(timeout))
+
+    def with_deadline(self, deadline):
+        return self._replace(self.client.with_deadline(deadline))
+
+    def with_priority(self, priority):
+        return self._replace(self.client.with_priority(priority))
+
+    def _replace(self, client):
+        memo = Memo(client)
+        memo.results = self.results
+        return memo
+
+    def clear(self):
+        self.results.clear()
+
+    def invalidate_query_cache(self, sobject_type):
+        self.clear()
+        self.client.invalidate_query_cache(sobject_type)
+
+    def composite(self, all_or_none=False):
+        composite = self.client.composite(all_or_none=all_or_none)
+        composite.invalidate_query_cache = self.invalidate_query_cache
+        return composite
+
+    @property
+    def bulk2(self):
+        return BulkClient(self)
+
+    def call(self, path, args, kwargs):
+        """ Call the client attribute at ``path``, memoizing reads
+        """
+        method = self.client
+        for name in path:
+            method = getattr(method, name)
+
+        operation = path[-1]
+        if is_write(operation, args, kwargs):
+            self.clear()
+        if operation not in MEMOIZED_OPERATIONS:
+            return method(*args, **kwargs)
+
+        try:
+            key = freeze((path, args, kwargs))
+            return copy.deepcopy(self.results[key])
+        except KeyError:
+            pass
+        except TypeError:
+            return method(*args, **kwargs)  # arguments are not hashable
+        result = self.results[key] = method(*args, **kwargs)
+        return copy.deepcopy(result)
+
+
+class MemoizedAttributeProxy(object):
+    """ Proxy to a client method or sObject resource of a :class:`Memo`
+    """
+
+    def __init__(self, memo, path):
+        self.memo = memo
+        self.path = path
+
+    def __getattr__(self, name):
+        return MemoizedAttributeProxy(self.memo, self.path + (name,))
+
+    def __call__(self, *args, **kwargs):
+        return self.memo.call(self.path, args, kwargs)
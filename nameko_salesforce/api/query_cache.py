@@ -0,0 +1,103 @@
+from collections import defaultdict
+import copy
+import re
+import time
+
+from cachetools import TTLCache
+
+from nameko_salesforce import constants
+
+
+FROM_PATTERN = re.compile(r'\bFROM\s+(\w+)', re.IGNORECASE)
+
+
+WRITE_OPERATIONS = frozenset((
+    'create',
+    'create_many',
+    'delete',
+    'delete_many',
+    'update',
+    'update_many',
+    'upsert',
+    'upsert_many',
+))
+""" sObject methods invalidating cached queries of their sObject type
+"""
+
+
+def get_tags(soql):
+    """ Return the sObject types ``soql`` selects from, lowercased
+
+    Includes types of subqueries, or rather their relationship names.
+
+    """
+    return frozenset(name.lower() for name in FROM_PATTERN.findall(soql))
+
+
+def get_query_cache(config):
+    """ Return a :class:`QueryCache` if enabled in Salesforce config
+    """
+    if not config.get('QUERY_CACHE_ENABLED', False):
+        return None
+    return QueryCache(
+        max_size=config.get(
+            'QUERY_CACHE_MAX_SIZE', constants.DEFAULT_QUERY_CACHE_MAX_SIZE),
+        ttl=config.get('QUERY_CACHE_TTL', constants.DEFAULT_QUERY_CACHE_TTL),
+    )
+
+
+class QueryCache(object):
+    """ Read-through cache of query results
+
+    Results are kept for ``ttl`` seconds, and the least recently used are
+    evicted beyond ``max_size`` results. Each result is tagged with the
+    sObject types its query selects from, and :meth:`invalidate` drops
+    results tagged with a type. Results of queries in flight while their
+    tags are invalidated are not cached, and neither are results with
+    more records to fetch, as their cursor expires.
+
+    Results are copied on the way out, so callers may modify them.
+
+    """
+
+    def __init__(
+        self, max_size=constants.DEFAULT_QUERY_CACHE_MAX_SIZE,
+        ttl=constants.DEFAULT_QUERY_CACHE_TTL, timer=time.monotonic
+    ):
+        self.results = TTLCache(max_size, ttl, timer=timer)
+        self.tags = defaultdict(set)
+        self.generations = defaultdict(int)
+
+    def get_or_call(self, key, soql, call):
+        """ Return the cached result of ``key``, or cache that of ``call``
+        """
+        try:
+            return copy.deepcopy(self.results[key])
+        except KeyError:
+            pass
+
+        tags = get_tags(soql)
+        generations = [self.generations[tag] for tag in tags]
+        result = call()
+        if (
+            result.get('done', True) and
+            generations == [self.generations[tag] for tag in tags]
+        ):
+            self._set(key, tags, result)
+        return copy.deepcopy(result)
+
+    def _set(self, key, tags, result):
+        self.results[key] = result
+        for tag in tags:
+            keys = self.tags[tag]
+            keys.add(key)
+            if len(keys) > self.results.maxsize:
+                keys.intersection_update(list(self.results))
+
+    def invalidate(self, sobject_type):
+        """ Drop results of queries selecting from ``sobject_type``
+        """
+        tag = sobject_type.lower()
+        self.generations[tag] += 1
+        for key in self.tags.pop(tag, ()):
+            self.results.pop(key, None)
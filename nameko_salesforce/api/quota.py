@@ -0,0 +1,97 @@
+import re
+
+from nameko_salesforce import constants
+from nameko_salesforce.constants import Priority
+
+
+API_USAGE_PATTERN = re.compile(r'(?<![\w-])api-usage=(\d+)/(\d+)')
+
+
+class ApiQuotaExceeded(Exception):
+    """ Low priority call rejected as API quota is nearly exhausted
+    """
+
+
+def get_api_usage(response):
+    """ Return ``(used, limit)`` API requests from ``Sforce-Limit-Info``
+
+    Returns ``None`` if the response has no such header.
+
+    """
+    if response is None:
+        return None
+    limit_info = response.headers.get('Sforce-Limit-Info')
+    if not limit_info:
+        return None
+    match = API_USAGE_PATTERN.search(limit_info)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class ApiQuota(object):
+    """ Tracks usage of the org's API request allocation
+
+    Usage is updated from the ``Sforce-Limit-Info`` header Salesforce
+    sends with every REST response.
+
+    Calls of :attr:`~nameko_salesforce.constants.Priority.low` priority
+    are slowed down once usage passes ``soft_limit``, by a delay growing
+    up to ``max_delay`` as usage nears ``hard_limit``, and rejected with
+    :class:`ApiQuotaExceeded` once usage passes ``hard_limit``. Limits are
+    fractions of the allocation, e.g. ``0.8``. Calls of
+    :attr:`~nameko_salesforce.constants.Priority.normal` priority are
+    never held back.
+
+    """
+
+    def __init__(
+        self, soft_limit=None, hard_limit=None,
+        max_delay=constants.DEFAULT_API_QUOTA_MAX_DELAY
+    ):
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.max_delay = max_delay
+
+        self.used = None
+        """ API requests used as last reported by Salesforce
+        """
+
+        self.limit = None
+        """ API request allocation as last reported by Salesforce
+        """
+
+    @property
+    def usage(self):
+        """ Used fraction of the API request allocation or ``None``
+        """
+        if not self.limit:
+            return None
+        return self.used / self.limit
+
+    def update(self, response):
+        api_usage = get_api_usage(response)
+        if api_usage is not None:
+            self.used, self.limit = api_usage
+
+    def get_delay(self, priority=Priority.normal):
+        """ Return seconds to hold a call of ``priority`` back for
+
+        :raises ApiQuotaExceeded:
+            If the call must not be made.
+
+        """
+        usage = self.usage
+        if Priority(priority) != Priority.low or usage is None:
+            return 0
+        if self.hard_limit is not None and usage >= self.hard_limit:
+            raise ApiQuotaExceeded(
+                'API usage {}/{} exceeds hard limit of {}'.format(
+                    self.used, self.limit, self.hard_limit))
+        if self.soft_limit is None or usage < self.soft_limit:
+            return 0
+        if self.hard_limit is None or self.hard_limit <= self.soft_limit:
+            return self.max_delay
+        return self.max_delay * min(
+            (usage - self.soft_limit) / (self.hard_limit - self.soft_limit),
+            1)
@@ -0,0 +1,175 @@
+from email.utils import parsedate_to_datetime
+import random
+import time
+
+import requests
+import simple_salesforce
+from urllib3.exceptions import NewConnectionError
+
+from nameko_salesforce import constants
+
+
+RETRY_ERROR_CODES = frozenset((
+    'REQUEST_LIMIT_EXCEEDED',
+    'SERVER_UNAVAILABLE',
+    'UNABLE_TO_LOCK_ROW',
+))
+""" Salesforce error codes of requests rejected without being processed
+"""
+
+
+RETRY_STATUSES = frozenset((503,))
+""" HTTP statuses of requests rejected without being processed
+"""
+
+
+IDEMPOTENT_RETRY_STATUSES = frozenset((502, 504))
+""" HTTP statuses of requests which may or may not have been processed
+"""
+
+
+IDEMPOTENT_OPERATIONS = frozenset((
+    'bulk2_get_job',
+    'bulk2_get_results',
+    'describe',
+    'describe_layout',
+    'deleted',
+    'fetch_many',
+    'get',
+    'get_by_custom_id',
+    'limits',
+    'metadata',
+    'query',
+    'query_all',
+    'query_more',
+    'quick_search',
+    'search',
+    'update',
+    'update_many',
+    'updated',
+    'upsert',
+    'upsert_many',
+))
+""" Client and sObject methods safe to repeat if their outcome is unknown
+"""
+
+
+def get_error_codes(exc):
+    """ Return error codes of a Salesforce error response
+    """
+    content = getattr(exc, 'content', None)
+    if not isinstance(content, list):
+        return set()
+    return {
+        error.get('errorCode') for error in content
+        if isinstance(error, dict)
+    }
+
+
+def is_connect_failure(exc):
+    """ Return whether ``exc`` failed to connect, before sending anything
+    """
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(exc, requests.exceptions.ConnectionError):
+        return False
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def get_retry_after(response):
+    """ Return seconds to wait as requested by ``Retry-After`` or ``None``
+    """
+    if response is None:
+        return None
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0)
+
+
+class RetryPolicy(object):
+    """ Decides whether and when to retry failed Salesforce calls
+
+    Requests Salesforce rejected without processing them, that is those
+    failing with one of ``error_codes`` or ``statuses`` or failing to
+    connect, are retried for any operation. Requests failing with one of
+    ``idempotent_statuses``, other connection errors or timing out may or
+    may not have been processed, so they are only retried for idempotent
+    operations.
+
+    Retries wait for an exponential backoff with full jitter, so that
+    callers failing at the same time do not retry at the same time again.
+    A ``Retry-After`` response header takes precedence over the backoff,
+    and calls asked to wait longer than ``max_backoff`` are not retried.
+
+    """
+
+    def __init__(
+        self,
+        max_attempts=constants.DEFAULT_RETRY_MAX_ATTEMPTS,
+        backoff=constants.DEFAULT_RETRY_BACKOFF,
+        max_backoff=constants.DEFAULT_RETRY_MAX_BACKOFF,
+        error_codes=RETRY_ERROR_CODES,
+        statuses=RETRY_STATUSES,
+        idempotent_statuses=IDEMPOTENT_RETRY_STATUSES,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.error_codes = frozenset(error_codes)
+        self.statuses = frozenset(statuses)
+        self.idempotent_statuses = frozenset(idempotent_statuses)
+
+    def is_retriable(self, exc, operation):
+        if isinstance(exc, simple_salesforce.SalesforceError):
+            if exc.status in self.idempotent_statuses:
+                return operation in IDEMPOTENT_OPERATIONS
+            return bool(
+                exc.status in self.statuses or
+                get_error_codes(exc) & self.error_codes
+            )
+        if is_connect_failure(exc):
+            return True
+        if isinstance(exc, (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        )):
+            return operation in IDEMPOTENT_OPERATIONS
+        return False
+
+    def get_delay(self, attempt, exc, operation, response=None):
+        """ Return seconds to wait before retrying or ``None`` to give up
+
+        :param attempt:
+            Number of the failed attempt, starting at 1.
+
+        :param exc:
+            Exception raised by the failed attempt.
+
+        :param operation:
+            Name of the invoked client or sObject method.
+
+        :param response:
+            Response of the failed attempt if any was received.
+
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if not self.is_retriable(exc, operation):
+            return None
+        retry_after = get_retry_after(response)
+        if retry_after is not None:
+            if retry_after > self.max_backoff:
+                return None
+            return retry_after
+        backoff = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return random.uniform(0, backoff)
@@ -0,0 +1,47 @@
+MAX_RECORDS = 200
+""" Maximum number of records per sObject Collections request
+"""
+
+
+MAX_RETRIEVE_IDS = 2000
+""" Maximum number of IDs per sObject Collections retrieve request
+"""
+
+
+def chunk(items, size=MAX_RECORDS):
+    """ Split ``items`` into lists of at most ``size`` items
+    """
+    items = list(items)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def make_records(sobject_type, records):
+    """ Return ``records`` typed as sObject Collections expects them
+    """
+    typed_records = []
+    for record in records:
+        record = dict(record)
+        record.setdefault('attributes', {'type': sobject_type})
+        typed_records.append(record)
+    return typed_records
+
+
+def make_body(sobject_type, records, all_or_none):
+    return {
+        'allOrNone': all_or_none,
+        'records': make_records(sobject_type, records),
+    }
+
+
+def make_delete_params(ids, all_or_none):
+    return {
+        'ids': ','.join(ids),
+        'allOrNone': 'true' if all_or_none else 'false',
+    }
+
+
+def make_retrieve_body(ids, fields):
+    return {
+        'ids': ids,
+        'fields': list(fields),
+    }
@@ -0,0 +1,116 @@
+class UnitOfWork(object):
+    """ Worker scoped proxy to a :class:`~.client.ClientProxy` buffering
+    writes
+
+    Calls to ``create``, ``update``, ``upsert`` and ``delete`` of sObject
+    resources, e.g. ``salesforce.Contact.create(data)``, are not made
+    straight away. They return a :class:`~.composite.Reference` instead,
+    whose :attr:`~.composite.Reference.id` can be used in the data of
+    later writes to refer to the record, and which holds the result of
+    the write once :meth:`flush` sends all buffered writes as a single
+    Composite API request. All other calls go through to the client.
+
+    With ``all_or_none`` set, a failing write rolls back all buffered
+    writes, and buffering more than
+    :data:`~.composite.MAX_SUBREQUESTS` writes between flushes raises
+    ``ValueError``. Otherwise writes are sent in as many requests as
+    needed, up to the first failing one.
+
+    Copies with other request options, e.g. ``salesforce.with_timeout(5)``,
+    buffer their writes in the unit of work too, see
+    :class:`UnitOfWorkView`.
+
+    """
+
+    def __init__(self, client, all_or_none=True):
+        self.client = client
+        self.all_or_none = all_or_none
+        self.composite = client.composite(all_or_none=all_or_none)
+
+    def __getattr__(self, name):
+        return BufferedResourceProxy(self, name)
+
+    def with_timeout(self, timeout):
+        return UnitOfWorkView(self, self.client.with_timeout(timeout))
+
+    def with_deadline(self, deadline):
+        return UnitOfWorkView(self, self.client.with_deadline(deadline))
+
+    def with_priority(self, priority):
+        return UnitOfWorkView(self, self.client.with_priority(priority))
+
+    def discard(self):
+        """ Drop buffered writes without sending them
+        """
+        self.composite = self.client.composite(all_or_none=self.all_or_none)
+
+    def flush(self):
+        """ Send buffered writes and return their references
+
+        :raises ~nameko_salesforce.api.composite.CompositeError:
+            If any write failed.
+
+        """
+        composite = self.composite
+        self.discard()
+        if not composite:
+            return []
+        return composite.execute()
+
+
+class UnitOfWorkView(UnitOfWork):
+    """ Copy of a :class:`UnitOfWork` making its calls with other request
+    options, and sharing its buffered writes
+
+    Buffered writes are sent with the request options of the unit of
+    work they were buffered in.
+
+    """
+
+    def __init__(self, unit_of_work, client):
+        self.unit_of_work = unit_of_work
+        self.client = client
+
+    @property
+    def all_or_none(self):
+        return self.unit_of_work.all_or_none
+
+    @property
+    def composite(self):
+        return self.unit_of_work.composite
+
+    def discard(self):
+        self.unit_of_work.discard()
+
+    def flush(self):
+        return self.unit_of_work.flush()
+
+
+class BufferedResourceProxy(object):
+    """ Proxy to a client attribute buffering writes if it is an sObject
+    """
+
+    def __init__(self, unit_of_work, name):
+        self.unit_of_work = unit_of_work
+        self.name = name
+
+    def __getattr__(self, name):
+        return getattr(getattr(self.unit_of_work.client, self.name), name)
+
+    def __call__(self, *args, **kwargs):
+        return getattr(self.unit_of_work.client, self.name)(*args, **kwargs)
+
+    def _resource(self):
+        return getattr(self.unit_of_work.composite, self.name)
+
+    def create(self, data):
+        return self._resource().create(data)
+
+    def update(self, record_id, data):
+        return self._resource().update(record_id, data)
+
+    def upsert(self, record_id, data):
+        return self._resource().upsert(record_id, data)
+
+    def delete(self, record_id):
+        return self._resource().delete(record_id)
@@ -10,12 +10,100 @@ DEFAULT_API_VERSION = '37.0'
 DEFAULT_REPLAY_STORAGE_TTL = 60 * 60 * 12
 
 
+DEFAULT_CONNECT_TIMEOUT = 10
+
+
+DEFAULT_READ_TIMEOUT = 120
+
+
+DEFAULT_RETRY_MAX_ATTEMPTS = 3
+
+
+DEFAULT_RETRY_BACKOFF = 0.5
+
+
+DEFAULT_RETRY_MAX_BACKOFF = 30
+
+
+DEFAULT_POOL_CHECKOUT_TIMEOUT = 30
+
+
+DEFAULT_POOL_REAP_INTERVAL = 60
+
+
+DEFAULT_SESSION_STORE_TTL = 60 * 60
+
+
+DEFAULT_SESSION_TIMEOUT = 60 * 60 * 2
+
+
+DEFAULT_SESSION_REFRESH_MARGIN = 60 * 5
+
+
+DEFAULT_SESSION_STORE_LOCK_TIMEOUT = 30
+
+
+DEFAULT_API_QUOTA_MAX_DELAY = 5
+
+
+DEFAULT_RATE_LIMIT_MEMBER_TTL = 60
+
+
+DEFAULT_CONCURRENCY_LIMIT_INITIAL = 10
+
+
+DEFAULT_CONCURRENCY_LIMIT_MAX = 100
+
+
+DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5
+
+
+DEFAULT_CIRCUIT_BREAKER_RESET_TIMEOUT = 30
+
+
+DEFAULT_BULK_JOB_MAX_BYTES = 100 * 1024 * 1024
+
+
+DEFAULT_BULK_JOB_MAX_RECORDS = 10000000
+
+
+DEFAULT_BULK_POLL_INTERVAL = 5
+
+
+DEFAULT_BULK_QUERY_CONCURRENCY = 4
+
+
+DEFAULT_QUERY_CACHE_MAX_SIZE = 1000
+
+
+DEFAULT_QUERY_CACHE_TTL = 60
+
+
 CLIENT_ID_CONTEXT_KEY = 'client_id'
 
 
 REPLAY_ID_CONTEXT_KEY = 'replay_id'
 
 
+DEADLINE_CONTEXT_KEY = 'salesforce_deadline'
+
+
+PRIORITY_CONTEXT_KEY = 'salesforce_priority'
+
+
+class Priority(Enum):
+    """ Priority of Salesforce API calls as API quota runs out
+    """
+
+    normal = 'normal'
+    """ Calls always made, e.g. serving interactive requests
+    """
+
+    low = 'low'
+    """ Calls slowed down and then rejected as API quota runs out
+    """
+
+
 class NotifyForFields(Enum):
     """ Specifies how the records are evaluated against the PushTopic query
     """
@@ -0,0 +1,155 @@
+from collections import defaultdict
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+
+
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216,
+)
+
+
+DEFAULT_HISTOGRAM_BUCKETS = {
+    'salesforce_response_size_bytes': SIZE_BUCKETS,
+}
+
+
+class Metrics(object):
+    """ Hook receiving metrics of Salesforce clients
+
+    Does nothing with them. Subclass and override the methods to forward
+    metrics to a monitoring system of choice, or use
+    :class:`PrometheusMetrics`.
+
+    Metrics are identified by ``name`` and by optional ``labels`` passed
+    as keyword arguments.
+
+    """
+
+    def increment(self, name, value=1, **labels):
+        """ Increment a counter
+        """
+
+    def set_gauge(self, name, value, **labels):
+        """ Set current value of a gauge
+        """
+
+    def observe(self, name, value, **labels):
+        """ Record a value in a histogram
+        """
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class PrometheusMetrics(Metrics):
+    """ Metrics hook keeping metrics in memory
+
+    Metrics are exported by :meth:`export` in the Prometheus text
+    exposition format, e.g. to be served by a service HTTP entrypoint.
+
+    Histograms use ``buckets`` unless ``histogram_buckets`` maps their
+    name to different ones.
+
+    """
+
+    def __init__(
+        self, buckets=DEFAULT_BUCKETS,
+        histogram_buckets=DEFAULT_HISTOGRAM_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self.histogram_buckets = {
+            name: tuple(sorted(name_buckets))
+            for name, name_buckets in histogram_buckets.items()
+        }
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.histograms = {}
+
+    def _key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        self.counters[self._key(name, labels)] += value
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        try:
+            histogram = self.histograms[key]
+        except KeyError:
+            histogram = self.histograms[key] = Histogram(
+                self.histogram_buckets.get(name, self.buckets))
+        histogram.observe(value)
+
+    def export(self):
+        """ Return all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        lines.extend(self._export_samples(self.counters, 'counter'))
+        lines.extend(self._export_samples(self.gauges, 'gauge'))
+        for name, items in self._group(self.histograms):
+            lines.append('# TYPE {} histogram'.format(name))
+            for labels, histogram in items:
+                bounds = [format_value(bound) for bound in histogram.buckets]
+                for bound, count in zip(bounds, histogram.counts):
+                    lines.append(format_sample(
+                        name + '_bucket', labels + (('le', bound),), count))
+                lines.append(format_sample(
+                    name + '_bucket', labels + (('le', '+Inf'),),
+                    histogram.count))
+                lines.append(
+                    format_sample(name + '_sum', labels, histogram.sum))
+                lines.append(
+                    format_sample(name + '_count', labels, histogram.count))
+        return ''.join(line + '\n' for line in lines)
+
+    def _export_samples(self, samples, metric_type):
+        for name, items in self._group(samples):
+            yield '# TYPE {} {}'.format(name, metric_type)
+            for labels, value in items:
+                yield format_sample(name, labels, value)
+
+    def _group(self, samples):
+        grouped = defaultdict(list)
+        for (name, labels), value in sorted(
+            samples.items(), key=lambda item: item[0]
+        ):
+            grouped[name].append((labels, value))
+        return sorted(grouped.items())
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def format_sample(name, labels, value):
+    if labels:
+        name = '{}{{{}}}'.format(name, ','.join(
+            '{}="{}"'.format(
+                label,
+                str(label_value)
+                .replace('\\', '\\\\').replace('"', '\\"')
+                .replace('\n', '\\n'))
+            for label, label_value in labels
+        ))
+    return '{} {}'.format(name, format_value(value))
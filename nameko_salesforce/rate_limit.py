@@ -0,0 +1,160 @@
+import logging
+
+from eventlet import sleep
+from nameko.exceptions import ConfigurationError
+import redis
+
+from nameko_salesforce import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+TOKEN_BUCKET_SCRIPT = """
+-- needed to write after reading TIME before Redis 5
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+
+local bucket_key, weights_key, members_key = KEYS[1], KEYS[2], KEYS[3]
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local service = ARGV[3]
+local weight = tonumber(ARGV[4])
+local member_ttl = tonumber(ARGV[5])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+-- register this service and forget services not seen for a while
+redis.call('HSET', weights_key, service, weight)
+redis.call('ZADD', members_key, now, service)
+local expired = redis.call(
+    'ZRANGEBYSCORE', members_key, '-inf', now - member_ttl)
+for _, member in ipairs(expired) do
+    redis.call('HDEL', weights_key, member)
+end
+redis.call('ZREMRANGEBYSCORE', members_key, '-inf', now - member_ttl)
+redis.call('EXPIRE', weights_key, member_ttl)
+redis.call('EXPIRE', members_key, member_ttl)
+
+local total_weight = 0
+for _, member_weight in ipairs(redis.call('HVALS', weights_key)) do
+    total_weight = total_weight + tonumber(member_weight)
+end
+local share = weight / total_weight
+local service_rate = rate * share
+local service_burst = math.max(burst * share, 1)
+
+local bucket = redis.call('HMGET', bucket_key, 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or service_burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(
+    tokens + math.max(now - updated_at, 0) * service_rate, service_burst)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / service_rate
+end
+redis.call('HSET', bucket_key, 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', bucket_key, math.ceil(service_burst / service_rate) + 1)
+
+-- integer replies would truncate fractions of a second
+return tostring(wait)
+"""
+
+
+def get_rate_limiter(config, service_name):
+    """ Return a :class:`RateLimiter` if enabled in Salesforce config
+    """
+    if not config.get('RATE_LIMIT_ENABLED', False):
+        return None
+    try:
+        redis_uri = config['RATE_LIMIT_REDIS_URI']
+        rate = config['RATE_LIMIT_RATE']
+    except KeyError as exc:
+        raise ConfigurationError(
+            '`{}` must have `{}` defined if `RATE_LIMIT_ENABLED` is set '
+            'to `True`'.format(constants.CONFIG_KEY, exc.args[0])
+        )
+    return RateLimiter(
+        redis.StrictRedis.from_url(redis_uri),
+        config['USERNAME'],
+        service_name,
+        rate,
+        burst=config.get('RATE_LIMIT_BURST', rate),
+        weight=config.get('RATE_LIMIT_WEIGHT', 1),
+    )
+
+
+class RateLimiter(object):
+    """ Redis token bucket limiting the rate of calls across services
+
+    All instances of all services authenticating as the same user share
+    ``rate`` calls per second and bursts of up to ``burst`` calls. The
+    rate is split between services in proportion to their ``weight``,
+    counting only services that made a call within the last
+    ``member_ttl`` seconds. Instances of the same service share its part.
+
+    If Redis cannot be reached, calls are let through rather than failed.
+
+    """
+
+    def __init__(
+        self, storage, username, service_name, rate, burst=None, weight=1,
+        member_ttl=constants.DEFAULT_RATE_LIMIT_MEMBER_TTL
+    ):
+        self.storage = storage
+        """ Redis client instance
+        """
+
+        self.username = username
+        """ Salesforce API username whose calls are limited
+        """
+
+        self.service_name = service_name
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.weight = weight
+        self.member_ttl = member_ttl
+        self.script = storage.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _format_bucket_key(self):
+        return 'salesforce:rate_limit:{}:{}'.format(
+            self.username, self.service_name)
+
+    def _format_weights_key(self):
+        return 'salesforce:rate_limit_weights:{}'.format(self.username)
+
+    def _format_members_key(self):
+        return 'salesforce:rate_limit_members:{}'.format(self.username)
+
+    def take(self):
+        """ Take a token and return ``0`` or return seconds until one is due
+        """
+        try:
+            wait = self.script(
+                keys=[
+                    self._format_bucket_key(),
+                    self._format_weights_key(),
+                    self._format_members_key(),
+                ],
+                args=[
+                    self.rate, self.burst, self.service_name, self.weight,
+                    self.member_ttl,
+                ])
+        except redis.RedisError:
+            logger.warning('Failed to take rate limit token', exc_info=True)
+            return 0
+        return float(wait)
+
+    def acquire(self):
+        """ Block until a call is allowed
+        """
+        while True:
+            wait = self.take()
+            if not wait:
+                return
+            sleep(wait)
@@ -0,0 +1,57 @@
+import logging
+
+import eventlet
+
+from nameko_salesforce import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+RETRY_DELAY = 10
+
+
+def get_session_refresh_after(config):
+    """ Return session age triggering a refresh or ``None`` if disabled
+    """
+    if not config.get('SESSION_REFRESH_ENABLED', True):
+        return None
+    timeout = config.get('SESSION_TIMEOUT', constants.DEFAULT_SESSION_TIMEOUT)
+    margin = config.get(
+        'SESSION_REFRESH_MARGIN', constants.DEFAULT_SESSION_REFRESH_MARGIN)
+    return max(timeout - margin, 0)
+
+
+def refresh_session_periodically(refresh, get_session_age, refresh_after):
+    """ Refresh a session whenever it gets ``refresh_after`` seconds old
+
+    Runs forever and is meant to be spawned as a container managed thread.
+    Sessions renewed by other means in the meantime (e.g. after a request
+    discovered the session has expired) are picked up by checking the
+    session age again after every sleep.
+
+    :param refresh:
+        Callable renewing the session.
+
+    :param get_session_age:
+        Callable returning age of the current session in seconds or ``None``
+        if there is no session yet.
+
+    :param refresh_after:
+        Session age in seconds triggering the refresh.
+
+    """
+    while True:
+        age = get_session_age()
+        if age is None:
+            delay = refresh_after
+        else:
+            delay = refresh_after - age
+        if delay > 0:
+            eventlet.sleep(delay)
+            continue
+        try:
+            refresh()
+        except Exception:
+            logger.exception('Failed to refresh Salesforce session')
+            eventlet.sleep(RETRY_DELAY)
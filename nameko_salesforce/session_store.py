@@ -0,0 +1,129 @@
+import json
+import logging
+
+from nameko.exceptions import ConfigurationError
+import redis
+
+from nameko_salesforce import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_session_store(config):
+    """ Return a :class:`SessionStore` if enabled in Salesforce config
+    """
+    if not config.get('SESSION_STORE_ENABLED', False):
+        return None
+    try:
+        redis_uri = config['SESSION_STORE_REDIS_URI']
+    except KeyError:
+        raise ConfigurationError(
+            '`{}` must have `SESSION_STORE_REDIS_URI` defined if '
+            '`SESSION_STORE_ENABLED` is set to `True`'
+            .format(constants.CONFIG_KEY)
+        )
+    return SessionStore(
+        redis.StrictRedis.from_url(redis_uri),
+        config['USERNAME'],
+        ttl=config.get(
+            'SESSION_STORE_TTL', constants.DEFAULT_SESSION_STORE_TTL),
+        lock_timeout=config.get(
+            'SESSION_STORE_LOCK_TIMEOUT',
+            constants.DEFAULT_SESSION_STORE_LOCK_TIMEOUT),
+    )
+
+
+class SessionStore(object):
+    """ Redis storage of a Salesforce session shared by service instances
+
+    Lets all instances of all services authenticating as the same user
+    reuse a single session instead of logging in one by one. When the
+    stored session is missing or reported as expired, a Redis lock makes
+    sure only one instance logs in while the others wait and then pick
+    up the new session.
+
+    """
+
+    def __init__(
+        self, storage, username,
+        ttl=constants.DEFAULT_SESSION_STORE_TTL,
+        lock_timeout=constants.DEFAULT_SESSION_STORE_LOCK_TIMEOUT
+    ):
+        self.storage = storage
+        """ Redis client instance
+        """
+
+        self.username = username
+        """ Salesforce API username the session belongs to
+        """
+
+        self.ttl = ttl
+        """ Time to live for the stored session
+
+        Must be shorter than the session timeout set in Salesforce.
+
+        """
+
+        self.lock_timeout = lock_timeout
+        """ Maximum time in seconds to wait for and to hold the login lock
+        """
+
+    def _format_session_key(self):
+        return 'salesforce:session:{}'.format(self.username)
+
+    def _format_lock_key(self):
+        return 'salesforce:session_lock:{}'.format(self.username)
+
+    def get(self):
+        """ Return stored ``(session_id, instance)`` or ``None``
+        """
+        session = self.storage.get(self._format_session_key())
+        if session:
+            session = json.loads(session.decode('utf-8'))
+            return session['session_id'], session['instance']
+
+    def set(self, session_id, instance):
+        session = {'session_id': session_id, 'instance': instance}
+        self.storage.set(
+            self._format_session_key(), json.dumps(session), ex=self.ttl)
+
+    def login(self, login, expired_session_id=None):
+        """ Return a valid stored session or log in and store a new one
+
+        :param login:
+            Callable performing the actual login and returning
+            a ``(session_id, instance)`` tuple.
+
+        :param expired_session_id:
+            Session ID the caller knows is no longer valid. A stored session
+            with this ID is replaced by a new login.
+
+        """
+        session = self._get_valid(expired_session_id)
+        if session:
+            return session
+
+        lock = self.storage.lock(
+            self._format_lock_key(),
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_timeout)
+        if not lock.acquire():
+            logger.warning(
+                'Timed out waiting for login lock of %s', self.username)
+            return login()
+        try:
+            # another instance may have logged in while we were waiting
+            session = self._get_valid(expired_session_id)
+            if session:
+                return session
+            session = login()
+            self.set(*session)
+            return session
+        finally:
+            lock.release()
+
+    def _get_valid(self, expired_session_id):
+        session = self.get()
+        if session and session[0] != expired_session_id:
+            return session
@@ -1,5 +1,6 @@
 from functools import partial
 import logging
+import time
 
 from nameko.exceptions import ConfigurationError
 from nameko_bayeux_client.client import BayeuxClient, BayeuxMessageHandler
@@ -8,6 +9,11 @@ from simple_salesforce.login import SalesforceLogin
 
 from nameko_salesforce import constants
 from nameko_salesforce.api import push_topics
+from nameko_salesforce.session_refresh import (
+    get_session_refresh_after,
+    refresh_session_periodically,
+)
+from nameko_salesforce.session_store import get_session_store
 from nameko_salesforce.streaming import channels
 
 
@@ -63,6 +69,18 @@ class StreamingClient(BayeuxClient):
         """ Access token for the session obtained upon login
         """
 
+        self.access_token_obtained_at = None
+        """ Monotonic time of the last login
+        """
+
+        self.session_refresh_after = None
+        """ Access token age in seconds triggering a new login
+
+        Set from ``SESSION_TIMEOUT`` and ``SESSION_REFRESH_MARGIN`` unless
+        ``SESSION_REFRESH_ENABLED`` is set to ``False``.
+
+        """
+
         self.replay_enabled = False
         """ PushTopic Events tracking enabled
 
@@ -88,6 +106,13 @@ class StreamingClient(BayeuxClient):
 
         """
 
+        self.session_store = None
+        """ Storage of the session shared with other service instances
+
+        Initialized only if ``SESSION_STORE_ENABLED`` is set.
+
+        """
+
     def setup(self):
 
         try:
@@ -116,6 +141,14 @@ class StreamingClient(BayeuxClient):
         if self.replay_enabled:
             self._setup_replay_storage(config)
 
+        self.session_store = get_session_store(config)
+        self.session_refresh_after = get_session_refresh_after(config)
+
+    def start(self):
+        super().start()
+        if self.session_refresh_after is not None:
+            self.container.spawn_managed_thread(self.run_session_refresh)
+
     def _setup_replay_storage(self, config):
         try:
             redis_uri = config['PUSHTOPIC_REPLAY_REDIS_URI']
@@ -133,7 +166,21 @@ class StreamingClient(BayeuxClient):
 
         config = self.container.config['SALESFORCE']
 
-        access_token, host = SalesforceLogin(
+        if self.session_store is not None:
+            access_token, host = self.session_store.login(
+                self._login, expired_session_id=self.access_token)
+        else:
+            access_token, host = self._login()
+
+        self.access_token = access_token
+        self.access_token_obtained_at = time.monotonic()
+
+        self.server_uri = 'https://{}/cometd/{}'.format(host, self.api_version)
+
+        logger.info('Logged in to salesforce as %s', config['USERNAME'])
+
+    def _login(self):
+        return SalesforceLogin(
             session=None,
             username=self.username,
             password=self.password,
@@ -142,11 +189,15 @@ class StreamingClient(BayeuxClient):
             sf_version=self.api_version,
         )
 
-        self.access_token = access_token
-
-        self.server_uri = 'https://{}/cometd/{}'.format(host, self.api_version)
+    def get_access_token_age(self):
+        if self.access_token_obtained_at is not None:
+            return time.monotonic() - self.access_token_obtained_at
 
-        logger.info('Logged in to salesforce as %s', config['USERNAME'])
+    def run_session_refresh(self):
+        """ Keep renewing the access token ahead of its timeout
+        """
+        refresh_session_periodically(
+            self.login, self.get_access_token_age, self.session_refresh_after)
 
     def subscribe(self):
         channel = channels.Subscribe(self)
@@ -218,7 +269,8 @@ class NotificationsClient(StreamingClient):
         super().setup()
         self.api_client = push_topics.get_client(
             self.username, self.password, self.security_token,
-            sandbox=self.sandbox, api_version=self.api_version
+            sandbox=self.sandbox, api_version=self.api_version,
+            session_store=self.session_store
         )
 
     def start(self):
@@ -0,0 +1,383 @@
+import io
+import json
+
+from mock import call, Mock, patch
+import pytest
+import requests_mock
+
+from nameko_salesforce.api.bulk import BulkError, write_csv_chunks
+from nameko_salesforce.api.client import get_client
+
+
+BASE_URL = 'https://abc.salesforce.com/services/data/v42.0/jobs/ingest/'
+
+
+@pytest.fixture(autouse=True)
+def mock_salesforce_login():
+    with patch(
+        'nameko_salesforce.api.client.SalesforceLogin'
+    ) as SalesforceLogin:
+        SalesforceLogin.return_value = 'session_id', 'abc.salesforce.com'
+        yield SalesforceLogin
+
+
+@pytest.fixture
+def mock_salesforce_server():
+    with requests_mock.Mocker() as mocked_requests:
+        yield mocked_requests
+
+
+@pytest.fixture(autouse=True)
+def sleep():
+    with patch('nameko_salesforce.api.bulk.sleep') as sleep:
+        yield sleep
+
+
+@pytest.fixture
+def bulk(config):
+    client = get_client(
+        username=config['SALESFORCE']['USERNAME'],
+        password=config['SALESFORCE']['PASSWORD'],
+        security_token=config['SALESFORCE']['SECURITY_TOKEN'],
+        sandbox=config['SALESFORCE']['SANDBOX'],
+        api_version='42.0',
+    )
+    return client.bulk2
+
+
+def read_chunks(chunks):
+    return [chunk.read() for chunk in chunks]
+
+
+def test_write_csv_chunks():
+    records = [
+        {'Name': 'Acme, Inc.', 'Active__c': True, 'Rating': None},
+        {'Name': 'Foo "Bar"', 'Active__c': False, 'Rating': 5},
+    ]
+
+    assert read_chunks(write_csv_chunks(records)) == [
+        b'Name,Active__c,Rating\n'
+        b'"Acme, Inc.",true,\n'
+        b'"Foo ""Bar""",false,5\n'
+    ]
+
+
+def test_write_csv_chunks_fields():
+    records = [{'Name': 'Acme', 'Rating': 5}, {'Name': 'Foo', 'Type': 'X'}]
+
+    assert read_chunks(write_csv_chunks(records, fields=['Name', 'Type'])) == [
+        b'Name,Type\nAcme,\nFoo,X\n'
+    ]
+
+
+def test_write_csv_chunks_no_records():
+    assert read_chunks(write_csv_chunks([])) == []
+
+
+def test_write_csv_chunks_max_records():
+    records = ({'Name': str(index)} for index in range(5))
+
+    assert read_chunks(write_csv_chunks(records, max_records=2)) == [
+        b'Name\n0\n1\n',
+        b'Name\n2\n3\n',
+        b'Name\n4\n',
+    ]
+
+
+def test_write_csv_chunks_max_bytes():
+    records = [{'Name': name} for name in ('aaaa', 'bb', 'cc', 'dddddddddd')]
+
+    # a row over the limit still makes a chunk of its own
+    assert read_chunks(write_csv_chunks(records, max_bytes=12)) == [
+        b'Name\naaaa\n',
+        b'Name\nbb\ncc\n',
+        b'Name\ndddddddddd\n',
+    ]
+
+
+def test_write_csv_chunks_spools_to_files():
+    records = ({'Name': str(index)} for index in range(3))
+
+    chunks = write_csv_chunks(records, max_records=2)
+    first = next(chunks)
+    assert first.read() == b'Name\n0\n1\n'
+    second = next(chunks)
+    assert first.closed
+    chunks.close()
+
+    assert second.closed
+
+
+class TestIngest:
+
+    @pytest.fixture
+    def server(self, mock_salesforce_server):
+        jobs = []
+
+        def create_job(request, context):
+            job = dict(request.json(), id='750{}'.format(len(jobs)))
+            job['state'] = 'Open'
+            jobs.append(job)
+            return job
+
+        def update_job(request, context):
+            return dict(jobs[-1], **request.json())
+
+        self.uploads = []
+        mock_salesforce_server.post(BASE_URL, json=create_job)
+        mock_salesforce_server.put(
+            requests_mock.ANY, status_code=201, text=self.upload)
+        mock_salesforce_server.patch(requests_mock.ANY, json=update_job)
+        return mock_salesforce_server
+
+    def upload(self, request, context):
+        self.uploads.append(request.body.read())
+        return ''
+
+    def test_ingest(self, bulk, server, sleep):
+        for job_id in ('7500', '7501'):
+            server.get(BASE_URL + job_id + '/', [
+                {'json': {'id': job_id, 'state': 'InProgress'}},
+                {'json': {'id': job_id, 'state': 'JobComplete'}},
+            ])
+        records = [{'Name': 'Acme'}, {'Name': 'Foo'}, {'Name': 'Bar'}]
+
+        jobs = bulk.ingest(
+            'Account', 'upsert', records, external_id_field='Ext__c',
+            max_records=2, poll_interval=3)
+
+        assert [job.id for job in jobs] == ['7500', '7501']
+        assert [job.state for job in jobs] == ['JobComplete'] * 2
+        assert sleep.call_args_list == [((3,),)]
+
+        requests = [
+            (request.method, request.url) for request in server.request_history
+        ]
+        assert requests[:6] == [
+            ('POST', BASE_URL),
+            ('PUT', BASE_URL + '7500/batches'),
+            ('PATCH', BASE_URL + '7500/'),
+            ('POST', BASE_URL),
+            ('PUT', BASE_URL + '7501/batches'),
+            ('PATCH', BASE_URL + '7501/'),
+        ]
+        create, upload, close = server.request_history[:3]
+        assert create.json() == {
+            'object': 'Account',
+            'operation': 'upsert',
+            'externalIdFieldName': 'Ext__c',
+            'contentType': 'CSV',
+            'lineEnding': 'LF',
+        }
+        assert upload.headers['Content-Type'] == 'text/csv'
+        assert upload.headers['Content-Length'] == '14'
+        assert close.json() == {'state': 'UploadComplete'}
+        assert self.uploads == [b'Name\nAcme\nFoo\n', b'Name\nBar\n']
+
+    def test_ingest_invalidates_cached_queries(self, bulk, server):
+        server.get(BASE_URL + '7500/', [
+            {'json': {'id': '7500', 'state': 'InProgress'}},
+            {'json': {'id': '7500', 'state': 'JobComplete'}},
+        ])
+        query_cache = bulk.client.pool.query_cache = Mock()
+
+        bulk.ingest('Account', 'insert', [{'Name': 'Acme'}])
+
+        # once uploaded, and once loaded
+        assert query_cache.invalidate.call_args_list == [
+            call('Account'), call('Account')]
+
+    def test_upload_retries_send_the_whole_file(self, bulk, server):
+        server.get(
+            BASE_URL + '7500/', json={'id': '7500', 'state': 'JobComplete'})
+        server.put(requests_mock.ANY, [
+            {'status_code': 503, 'text': self.upload},
+            {'status_code': 201, 'text': self.upload},
+        ])
+
+        with patch('nameko_salesforce.api.client.sleep'):
+            bulk.ingest('Account', 'insert', [{'Name': 'Acme'}])
+
+        assert self.uploads == [b'Name\nAcme\n'] * 2
+
+    def test_failed_job(self, bulk, server):
+        server.get(BASE_URL + '7500/', json={
+            'id': '7500', 'state': 'Failed', 'errorMessage': 'Oops'})
+
+        with pytest.raises(BulkError) as exc_info:
+            bulk.ingest('Account', 'insert', [{'Name': 'Acme'}])
+
+        assert str(exc_info.value) == (
+            '1 of 1 jobs did not complete: 7500 Failed: Oops')
+        assert exc_info.value.jobs[0].state == 'Failed'
+
+    def test_upload_failure_aborts_job(self, bulk, server):
+        server.put(requests_mock.ANY, status_code=400, json=[
+            {'errorCode': 'INVALIDJOB', 'message': 'Nope'}])
+
+        with pytest.raises(Exception):
+            bulk.ingest('Account', 'insert', [{'Name': 'Acme'}])
+
+        abort = server.request_history[-1]
+        assert abort.method == 'PATCH'
+        assert abort.json() == {'state': 'Aborted'}
+
+    def test_timeout(self, bulk, server, sleep):
+        server.get(
+            BASE_URL + '7500/', json={'id': '7500', 'state': 'InProgress'})
+
+        with pytest.raises(BulkError) as exc_info:
+            bulk.ingest(
+                'Account', 'insert', [{'Name': 'Acme'}], poll_interval=5,
+                timeout=4)
+
+        assert str(exc_info.value) == 'Jobs not done after 4 seconds'
+        assert sleep.call_count == 0
+
+    def test_results(self, bulk, server):
+        server.get(
+            BASE_URL + '7500/', json={'id': '7500', 'state': 'JobComplete'})
+        server.get(
+            BASE_URL + '7500/successfulResults/',
+            text='"sf__Id","sf__Created",Name\n"001A","true","Acme"\n')
+        server.get(
+            BASE_URL + '7500/failedResults/',
+            text='"sf__Id","sf__Error",Name\n"","INVALID_FIELD","A\n\nB"\n')
+
+        jobs = bulk.ingest('Account', 'insert', [{'Name': 'Acme'}, {}])
+
+        assert list(bulk.iter_results(jobs)) == [
+            {'sf__Id': '001A', 'sf__Created': 'true', 'Name': 'Acme'}]
+        assert list(bulk.iter_results(jobs, 'failed')) == [
+            {'sf__Id': '', 'sf__Error': 'INVALID_FIELD', 'Name': 'A\n\nB'}]
+        assert server.request_history[-1].stream is True
+
+    def test_unprocessed_records(self, bulk, server):
+        server.get(
+            BASE_URL + '7500/unprocessedrecords/', text='Name\nAcme\n')
+        job = bulk.create_ingest_job('Account', 'insert')
+
+        assert list(bulk.iter_results([job], 'unprocessed')) == [
+            {'Name': 'Acme'}]
+
+    def test_wait_for_done_jobs(self, bulk, server, sleep):
+        job = bulk.create_ingest_job('Account', 'insert')
+        job.info['state'] = 'JobComplete'
+
+        bulk.wait([job])
+
+        assert repr(job) == '<IngestJob 7500 state=JobComplete>'
+        assert server.call_count == 1  # only created
+        assert sleep.call_count == 0
+
+
+class TestQuery:
+
+    QUERY_URL = BASE_URL.replace('ingest', 'query')
+
+    PAGES = {
+        None: ('Id,Name\n001A,Acme\n001B,"Foo\nBar"\n', '2'),
+        '2': ('Id,Name\n001C,Baz\n', '3'),
+        '3': ('Id,Name\n001D,"Qux, Inc."\n', 'null'),
+    }
+
+    @pytest.fixture
+    def server(self, mock_salesforce_server):
+        def get_page(request, context):
+            locator = request.qs.get('locator', [None])[0]
+            body, next_locator = self.PAGES[locator]
+            context.headers['Sforce-Locator'] = next_locator
+            return body
+
+        mock_salesforce_server.post(
+            self.QUERY_URL, json={'id': '750Q', 'state': 'UploadComplete'})
+        mock_salesforce_server.get(self.QUERY_URL + '750Q/', [
+            {'json': {'id': '750Q', 'state': 'InProgress'}},
+            {'json': {
+                'id': '750Q', 'state': 'JobComplete',
+                'numberRecordsProcessed': 4,
+            }},
+        ])
+        mock_salesforce_server.get(
+            self.QUERY_URL + '750Q/results', text=get_page)
+        return mock_salesforce_server
+
+    def get_locators(self, server):
+        return [
+            request.qs.get('locator') for request in server.request_history
+            if request.path.endswith('/results')
+        ]
+
+    def test_query(self, bulk, server):
+        records = bulk.query(
+            'SELECT Id, Name FROM Account', include_deleted=True,
+            max_records=2)
+
+        assert list(records) == [
+            {'Id': '001A', 'Name': 'Acme'},
+            {'Id': '001B', 'Name': 'Foo\nBar'},
+            {'Id': '001C', 'Name': 'Baz'},
+            {'Id': '001D', 'Name': 'Qux, Inc.'},
+        ]
+        create = server.request_history[0]
+        assert create.json() == {
+            'operation': 'queryAll',
+            'query': 'SELECT Id, Name FROM Account',
+            'contentType': 'CSV',
+            'lineEnding': 'LF',
+        }
+        assert self.get_locators(server) == [None, ['2'], ['3']]
+        assert server.request_history[-1].qs['maxrecords'] == ['2']
+
+    def test_export_csv(self, bulk, server, tmpdir):
+        path = str(tmpdir.join('accounts.csv'))
+
+        job = bulk.export('SELECT Id, Name FROM Account', path)
+
+        assert job.info['numberRecordsProcessed'] == 4
+        with open(path, 'rb') as file:
+            assert file.read() == (
+                b'Id,Name\n001A,Acme\n001B,"Foo\nBar"\n001C,Baz\n'
+                b'001D,"Qux, Inc."\n')
+        assert server.request_history[0].json()['operation'] == 'query'
+
+    def test_export_ndjson(self, bulk, server):
+        output = io.BytesIO()
+
+        bulk.export(
+            'SELECT Id, Name FROM Account', output, format='ndjson',
+            concurrency=1)
+
+        assert [
+            json.loads(line) for line in output.getvalue().splitlines()
+        ] == [
+            {'Id': '001A', 'Name': 'Acme'},
+            {'Id': '001B', 'Name': 'Foo\nBar'},
+            {'Id': '001C', 'Name': 'Baz'},
+            {'Id': '001D', 'Name': 'Qux, Inc.'},
+        ]
+
+    def test_export_unknown_format(self, bulk):
+        with pytest.raises(ValueError):
+            bulk.export('SELECT Id FROM Account', io.BytesIO(), format='xml')
+
+    def test_pages_are_requested_ahead(self, bulk, server):
+        job = bulk.run_query('SELECT Id, Name FROM Account')
+
+        pages = job.iter_pages(concurrency=2)
+        next(pages)
+
+        # the second page is downloading while the first one is consumed
+        assert self.get_locators(server) == [None, ['2']]
+        pages.close()
+
+    def test_failed_query(self, bulk, mock_salesforce_server):
+        mock_salesforce_server.post(
+            self.QUERY_URL, json={'id': '750Q', 'state': 'UploadComplete'})
+        mock_salesforce_server.get(self.QUERY_URL + '750Q/', json={
+            'id': '750Q', 'state': 'Failed', 'errorMessage': 'Bad SOQL'})
+
+        with pytest.raises(BulkError) as exc_info:
+            list(bulk.query('SELECT Nope FROM Account'))
+
+        assert 'Bad SOQL' in str(exc_info.value)
@@ -0,0 +1,163 @@
+from mock import patch
+import pytest
+import requests
+from simple_salesforce import (
+    SalesforceGeneralError,
+    SalesforceResourceNotFound,
+)
+
+from nameko_salesforce import constants
+from nameko_salesforce.api.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpen,
+    get_circuit_breakers,
+    is_failure,
+)
+
+
+@pytest.mark.parametrize('exc,expected', [
+    (requests.exceptions.ConnectTimeout(), True),
+    (requests.exceptions.ConnectionError(), True),
+    (SalesforceGeneralError('url', 500, 'Contact', []), True),
+    (SalesforceGeneralError('url', 503, 'Contact', []), True),
+    (SalesforceResourceNotFound('url', 404, 'Contact', []), False),
+    (ValueError(), False),
+])
+def test_is_failure(exc, expected):
+    assert is_failure(exc) is expected
+
+
+class TestGetCircuitBreakers:
+
+    def test_disabled_by_default(self, config):
+        assert get_circuit_breakers(config['SALESFORCE']) is None
+
+    def test_enabled(self, config):
+        config['SALESFORCE'].update({
+            'CIRCUIT_BREAKER_ENABLED': True,
+            'CIRCUIT_BREAKER_FAILURE_THRESHOLD': 3,
+            'CIRCUIT_BREAKER_RESET_TIMEOUT': 10,
+            'CIRCUIT_BREAKER_PER_SOBJECT': True,
+        })
+
+        circuit_breakers = get_circuit_breakers(config['SALESFORCE'])
+
+        assert circuit_breakers.failure_threshold == 3
+        assert circuit_breakers.reset_timeout == 10
+        assert circuit_breakers.per_sobject is True
+
+    def test_enabled_defaults(self, config):
+        config['SALESFORCE']['CIRCUIT_BREAKER_ENABLED'] = True
+
+        circuit_breakers = get_circuit_breakers(config['SALESFORCE'])
+
+        assert (
+            circuit_breakers.failure_threshold ==
+            constants.DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD)
+        assert (
+            circuit_breakers.reset_timeout ==
+            constants.DEFAULT_CIRCUIT_BREAKER_RESET_TIMEOUT)
+        assert circuit_breakers.per_sobject is False
+
+
+class TestCircuitBreaker:
+
+    @pytest.fixture
+    def monotonic(self):
+        with patch('nameko_salesforce.api.circuit_breaker.time') as time:
+            time.monotonic.return_value = 100
+            yield time.monotonic
+
+    @pytest.fixture
+    def breaker(self, monotonic):
+        return CircuitBreaker(
+            'abc.salesforce.com', failure_threshold=2, reset_timeout=30)
+
+    def fail(self, breaker):
+        breaker.record(requests.exceptions.ConnectionError())
+
+    def test_opens_after_consecutive_failures(self, breaker):
+        self.fail(breaker)
+        breaker.record()
+        self.fail(breaker)
+        breaker.allow()
+
+        self.fail(breaker)
+
+        assert not breaker.is_closed
+        with pytest.raises(CircuitOpen) as exc:
+            breaker.allow()
+        assert str(exc.value) == (
+            'Circuit of abc.salesforce.com is open after 2 failures')
+
+    def test_other_errors_are_not_failures(self, breaker):
+        not_found = SalesforceResourceNotFound('url', 404, 'Contact', [])
+        for _ in range(3):
+            breaker.record(not_found)
+            breaker.record(ValueError())
+
+        assert breaker.is_closed
+
+    def test_half_open_probe_succeeds(self, breaker, monotonic):
+        self.fail(breaker)
+        self.fail(breaker)
+
+        monotonic.return_value = 130
+        breaker.allow()  # probe
+        with pytest.raises(CircuitOpen):
+            breaker.allow()
+
+        breaker.record()
+
+        assert breaker.is_closed
+        breaker.allow()
+
+    def test_half_open_probe_fails(self, breaker, monotonic):
+        self.fail(breaker)
+        self.fail(breaker)
+
+        monotonic.return_value = 130
+        breaker.allow()  # probe
+        self.fail(breaker)
+
+        monotonic.return_value = 159
+        with pytest.raises(CircuitOpen):
+            breaker.allow()
+        monotonic.return_value = 160
+        breaker.allow()
+
+    def test_probe_not_reporting_back(self, breaker, monotonic):
+        self.fail(breaker)
+        self.fail(breaker)
+
+        monotonic.return_value = 130
+        breaker.allow()  # probe interrupted
+        breaker.record(ValueError())
+
+        monotonic.return_value = 160
+        breaker.allow()
+
+
+class TestCircuitBreakers:
+
+    def test_per_host(self):
+        circuit_breakers = CircuitBreakers()
+
+        breaker = circuit_breakers.get('abc.salesforce.com', 'Contact')
+
+        assert breaker.name == 'abc.salesforce.com'
+        assert circuit_breakers.get('abc.salesforce.com') is breaker
+        assert circuit_breakers.get('xyz.salesforce.com') is not breaker
+
+    def test_per_sobject(self):
+        circuit_breakers = CircuitBreakers(
+            failure_threshold=1, reset_timeout=10, per_sobject=True)
+
+        breaker = circuit_breakers.get('abc.salesforce.com', 'Contact')
+
+        assert breaker.name == 'abc.salesforce.com/Contact'
+        assert breaker.failure_threshold == 1
+        assert breaker.reset_timeout == 10
+        assert circuit_breakers.get('abc.salesforce.com', 'Contact') is breaker
+        assert circuit_breakers.get('abc.salesforce.com') is not breaker
@@ -1,12 +1,38 @@
+import socket
+import time
+
 import eventlet
 from eventlet.event import Event
-from mock import patch
+from mock import call, Mock, patch
 import pytest
 import requests
 import requests_mock
-from simple_salesforce import SalesforceResourceNotFound
+from simple_salesforce import (
+    SalesforceAuthenticationFailed,
+    SalesforceExpiredSession,
+    SalesforceGeneralError,
+    SalesforceMalformedRequest,
+    SalesforceResourceNotFound,
+)
 
-from nameko_salesforce.api.client import get_client, READ_RETRIES
+from nameko_salesforce import constants
+from nameko_salesforce.api.client import (
+    ClientPoolExhausted,
+    DeadlineExceeded,
+    create_http_adapter,
+    get_client,
+    get_response_size,
+    REDIRECT_RETRIES,
+    Session,
+    SESSION_EXPIRED_RETRIES,
+)
+from nameko_salesforce.api.circuit_breaker import CircuitBreakers, CircuitOpen
+from nameko_salesforce.api.composite import CompositeError, MAX_SUBREQUESTS
+from nameko_salesforce.api.concurrency import ConcurrencyLimiter
+from nameko_salesforce.api.query_cache import QueryCache
+from nameko_salesforce.api.quota import ApiQuota, ApiQuotaExceeded
+from nameko_salesforce.constants import Priority
+from nameko_salesforce.metrics import PrometheusMetrics
 
 
 @pytest.fixture
@@ -28,24 +54,81 @@ def mock_salesforce_server():
 
 @pytest.fixture(autouse=True)
 def mock_salesforce_login():
-    with patch('simple_salesforce.api.SalesforceLogin') as SalesforceLogin:
+    with patch(
+        'nameko_salesforce.api.client.SalesforceLogin'
+    ) as SalesforceLogin:
         SalesforceLogin.return_value = 'session_id', 'abc.salesforce.com'
-        yield
+        yield SalesforceLogin
 
 
 @pytest.fixture(autouse=True)
 def fast_retry():
     def no_sleep(period):
         eventlet.sleep(0)
-    with patch('nameko.utils.retry.sleep', new=no_sleep):
+    with patch('nameko_salesforce.api.client.sleep', new=no_sleep):
         yield
 
 
 def test_retry_adapter(client):
-    # verify retry adapter is applied to session
-    reads = READ_RETRIES
-    assert client.session.get_adapter('http://foo').max_retries.read == reads
-    assert client.session.get_adapter('https://bar').max_retries.read == reads
+    # verify adapter leaving retries to the retry policy is applied
+    for url in ('http://foo', 'https://bar'):
+        max_retries = client.session.get_adapter(url).max_retries
+        assert max_retries.connect == 0
+        assert max_retries.read is False
+        assert max_retries.redirect == REDIRECT_RETRIES
+
+
+def test_clients_share_http_adapter(client):
+    with client.pool.get() as client_1:
+        with client.pool.get() as client_2:
+            assert client_1 is not client_2
+            assert (
+                client_1.session.get_adapter('https://foo') is
+                client_2.session.get_adapter('https://foo') is
+                client.pool.http_adapter)
+
+
+def test_create_http_adapter():
+    adapter = create_http_adapter(
+        pool_connections=2, pool_maxsize=20, pool_block=True)
+
+    assert adapter.max_retries.read is False
+    assert adapter.poolmanager.connection_pool_kw['maxsize'] == 20
+    assert adapter.poolmanager.connection_pool_kw['block'] is True
+    assert 'socket_options' not in adapter.poolmanager.connection_pool_kw
+
+
+def test_create_http_adapter_tcp_keepalive():
+    adapter = create_http_adapter(tcp_keepalive=30)
+
+    socket_options = (
+        adapter.poolmanager.connection_pool_kw['socket_options'])
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in socket_options
+    assert socket_options[-1][2] == 30
+    assert (
+        socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) in socket_options
+
+
+def test_create_http_adapter_tcp_keepalive_unsupported_options():
+    with patch('nameko_salesforce.api.client.socket') as mock_socket:
+        mock_socket.mock_add_spec(['SOL_SOCKET', 'SO_KEEPALIVE'])
+        adapter = create_http_adapter(tcp_keepalive=30)
+
+    socket_options = (
+        adapter.poolmanager.connection_pool_kw['socket_options'])
+    assert socket_options[-1] == (
+        mock_socket.SOL_SOCKET, mock_socket.SO_KEEPALIVE, 1)
+
+
+def test_pool_close(client):
+    with client.pool.get():
+        pass
+
+    with patch.object(client.pool.http_adapter, 'close') as close:
+        client.pool.close()
+
+    assert close.call_count == 1
+    assert len(client.pool.free) == 0
 
 
 def test_proxy(client, mock_salesforce_server):
@@ -64,7 +147,65 @@ def test_proxy(client, mock_salesforce_server):
     assert mock_salesforce_server.request_history[0].json() == requests_data
 
 
-def test_concurrency(client, mock_salesforce_server):
+def test_default_timeout(client, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={})
+
+    client.Contact.create({})
+
+    assert mock_salesforce_server.request_history[0].timeout == (
+        constants.DEFAULT_CONNECT_TIMEOUT, constants.DEFAULT_READ_TIMEOUT)
+
+
+def test_with_timeout(client, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={})
+    mock_salesforce_server.get(requests_mock.ANY, json={})
+
+    client.with_timeout(5).Contact.create({})
+    client.with_timeout((1, 2)).query('SELECT Id FROM Contact')
+    client.Contact.create({})
+
+    timeouts = [
+        request.timeout for request in mock_salesforce_server.request_history]
+    assert timeouts == [
+        5,
+        (1, 2),
+        (constants.DEFAULT_CONNECT_TIMEOUT, constants.DEFAULT_READ_TIMEOUT),
+    ]
+    assert client.timeout is None
+
+
+def test_deadline_passed(client, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={})
+
+    with pytest.raises(DeadlineExceeded):
+        client.with_deadline(time.time() - 1).Contact.create({})
+
+    assert mock_salesforce_server.call_count == 0
+
+
+def test_deadline_interrupts_call(client, mock_salesforce_server):
+
+    def callback(*args, **kwargs):
+        eventlet.sleep(1)
+        return {}  # pragma: no cover
+
+    mock_salesforce_server.post(requests_mock.ANY, json=callback)
+
+    with pytest.raises(DeadlineExceeded):
+        client.with_deadline(time.time() + 0.01).Contact.create({})
+
+    assert len(client.pool.busy) == 0
+
+
+def test_deadline_not_reached(client, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={'id': '1'})
+
+    result = client.with_deadline(time.time() + 10).Contact.create({})
+
+    assert result == {'id': '1'}
+
+
+def test_concurrency(client, mock_salesforce_server, mock_salesforce_login):
 
     requests_data = {'LastName': 'Smith', 'Email': 'example@example.com'}
     response_data = {
@@ -105,6 +246,10 @@ def test_concurrency(client, mock_salesforce_server):
     assert len(client.pool.busy) == 0
     assert len(client.pool.free) == 2
 
+    # sharing a single session
+    assert mock_salesforce_login.call_count == 1
+    assert {c.session_id for c in client.pool.free} == {'session_id'}
+
 
 def test_pool_reuses_clients(client, mock_salesforce_server):
 
@@ -216,6 +361,325 @@ def test_proxy_retries_on_session_expired(client, mock_salesforce_server):
     assert len(client.pool.free) == 1
 
 
+@pytest.mark.usefixtures('fast_retry')
+def test_session_expired_renews_pool_session(
+    client, mock_salesforce_server, mock_salesforce_login
+):
+
+    requests_data = {'LastName': 'Smith', 'Email': 'example@example.com'}
+    response_data = {
+        'errors': [],
+        'id': '003e0000003GuNXAA0',
+        'success': True
+    }
+    mock_salesforce_server.post(
+        requests_mock.ANY,
+        [
+            {'json': response_data},
+            {'status_code': 401, 'text': 'session expired'},
+            {'json': response_data},
+        ]
+    )
+
+    with client.pool.get() as stale_client:
+        assert client.Contact.create(requests_data) == response_data
+
+    # two clients sharing the first session
+    assert len(client.pool.free) == 2
+    assert mock_salesforce_login.call_count == 1
+
+    mock_salesforce_login.return_value = 'new_session', 'abc.salesforce.com'
+
+    assert client.Contact.create(requests_data) == response_data  # retries
+    assert client.Contact.create(requests_data) == response_data
+
+    # logged in once more and the other stale client was dropped
+    assert mock_salesforce_login.call_count == 2
+    assert stale_client not in client.pool.free
+    assert len(client.pool.free) == 1
+    assert list(client.pool.free)[0].session_id == 'new_session'
+
+    request_history = mock_salesforce_server.request_history
+    assert request_history[-1].headers['Authorization'] == (
+        'Bearer new_session')
+
+
+def test_session_renewed_once_for_concurrent_callers(
+    client, mock_salesforce_login
+):
+
+    pool = client.pool
+    pool.get_session()
+    assert pool.session_generation == 1
+
+    def slow_login(**kwargs):
+        eventlet.sleep(0.01)
+        return 'new_session', 'abc.salesforce.com'
+
+    mock_salesforce_login.side_effect = slow_login
+
+    # all callers report the first generation as expired
+    threads = [eventlet.spawn(pool.renew_session, 1) for _ in range(5)]
+    for thread in threads:
+        thread.wait()
+
+    assert mock_salesforce_login.call_count == 2
+    assert pool.session_generation == 2
+    assert pool.session_id == 'new_session'
+
+
+def test_pool_session_store(client, mock_salesforce_login):
+
+    session_store = Mock()
+    session_store.login.return_value = 'stored_session', 'abc.salesforce.com'
+    client.pool.session_store = session_store
+
+    assert client.pool.get_session() == (
+        'stored_session', 'abc.salesforce.com', 1)
+
+    client.pool.renew_session(1)
+
+    assert session_store.login.call_args_list[0][1] == {
+        'expired_session_id': None}
+    assert session_store.login.call_args_list[1][1] == {
+        'expired_session_id': 'stored_session'}
+
+    # login performed through the store is the pool's own
+    login = session_store.login.call_args[0][0]
+    assert login() == ('session_id', 'abc.salesforce.com')
+
+
+def test_pool_prewarm(client, mock_salesforce_login):
+
+    client.pool.min_size = 3
+    client.pool.prewarm()
+
+    assert len(client.pool.free) == 3
+    assert mock_salesforce_login.call_count == 1
+
+    # already warm
+    client.pool.prewarm()
+    assert len(client.pool.free) == 3
+
+
+def test_pool_prewarm_capped_by_max_size(bounded_client):
+
+    bounded_client.pool.min_size = 3
+    bounded_client.pool.prewarm()
+
+    assert len(bounded_client.pool.free) == 1
+
+
+def test_pool_idle_clients_are_replaced_on_checkout(client):
+
+    client.pool.idle_timeout = 60
+
+    with client.pool.get() as idle_client:
+        pass
+    idle_client.returned_at -= 61
+
+    with client.pool.get() as new_client:
+        assert new_client is not idle_client
+
+    assert client.pool.free == {new_client}
+
+
+def test_pool_old_clients_are_replaced_on_checkout(client):
+
+    client.pool.max_lifetime = 3600
+
+    with client.pool.get() as old_client:
+        pass
+    old_client.created_at -= 3601
+
+    with client.pool.get() as new_client:
+        assert new_client is not old_client
+
+    assert client.pool.free == {new_client}
+
+
+def test_pool_reap(client):
+
+    client.pool.idle_timeout = 60
+    client.pool.min_size = 1
+    client.pool.prewarm()
+    with client.pool.get():
+        with client.pool.get():
+            pass
+
+    assert len(client.pool.free) == 2
+    for idle_client in client.pool.free:
+        idle_client.returned_at -= 61
+
+    client.pool.reap()
+
+    # idle clients dropped and replaced up to the minimum size
+    assert len(client.pool.free) == 1
+    fresh_client = list(client.pool.free)[0]
+    assert fresh_client.returned_at > idle_client.returned_at
+
+
+def test_pool_reap_closes_idle_connections(client):
+
+    client.pool.idle_timeout = 60
+    poolmanager = client.pool.http_adapter.poolmanager
+    poolmanager.connection_from_url('http://example.com/')
+
+    client.pool.reap()
+    assert len(poolmanager.pools) == 1
+
+    client.pool.last_used_at -= 61
+    with client.pool.get():
+        client.pool.last_used_at -= 61
+        client.pool.reap()
+        assert len(poolmanager.pools) == 1  # a client is busy
+
+    client.pool.last_used_at -= 61
+    client.pool.reap()
+    assert len(poolmanager.pools) == 0
+
+
+def test_pool_reap_closes_old_connections(client):
+
+    client.pool.max_lifetime = 3600
+    poolmanager = client.pool.http_adapter.poolmanager
+    poolmanager.connection_from_url('http://example.com/')
+
+    client.pool.reap()
+    assert len(poolmanager.pools) == 1
+
+    client.pool.connections_opened_at -= 3601
+    client.pool.reap()
+    assert len(poolmanager.pools) == 0
+
+    # connections opened since are not that old
+    poolmanager.connection_from_url('http://example.com/')
+    client.pool.reap()
+    assert len(poolmanager.pools) == 1
+
+
+def test_pool_reap_without_session(client):
+
+    client.pool.min_size = 1
+    client.pool.reap()
+
+    assert len(client.pool.free) == 0
+
+
+def test_pool_run_reaper(client):
+
+    class StopLoop(Exception):
+        pass
+
+    with patch('nameko_salesforce.api.client.sleep') as sleep:
+        with patch.object(client.pool, 'reap') as reap:
+            reap.side_effect = [None, StopLoop]
+            with pytest.raises(StopLoop):
+                client.pool.run_reaper()
+
+    assert sleep.call_args_list == [
+        call(client.pool.reap_interval), call(client.pool.reap_interval)]
+
+
+def test_pool_session_refresh(client, mock_salesforce_login):
+
+    pool = client.pool
+    assert pool.get_session_age() is None
+
+    pool.get_session()
+    assert 0 <= pool.get_session_age() < 1
+
+    mock_salesforce_login.return_value = 'new_session', 'abc.salesforce.com'
+    pool.refresh_session()
+
+    assert mock_salesforce_login.call_count == 2
+    assert pool.session_generation == 2
+    assert pool.session_id == 'new_session'
+
+
+def test_pool_run_session_refresh(client):
+
+    client.pool.session_refresh_after = 100
+
+    with patch(
+        'nameko_salesforce.api.client.refresh_session_periodically'
+    ) as refresh_session_periodically:
+        client.pool.run_session_refresh()
+
+    assert refresh_session_periodically.call_args == call(
+        client.pool.refresh_session, client.pool.get_session_age, 100)
+
+
+@pytest.mark.usefixtures('fast_retry')
+def test_session_expired_retries_are_bounded(
+    client, mock_salesforce_server
+):
+
+    requests_data = {'LastName': 'Smith', 'Email': 'example@example.com'}
+    mock_salesforce_server.post(
+        requests_mock.ANY, status_code=401, text='session expired')
+
+    with pytest.raises(SalesforceExpiredSession):
+        client.Contact.create(requests_data)
+
+    assert mock_salesforce_server.call_count == SESSION_EXPIRED_RETRIES + 1
+    assert len(client.pool.busy) == 0
+    assert len(client.pool.free) == 0
+
+
+def test_request_limit_exceeded_is_retried(client, mock_salesforce_server):
+
+    response_data = {'id': '003e0000003GuNXAA0', 'success': True}
+    error_data = [
+        {'errorCode': 'REQUEST_LIMIT_EXCEEDED', 'message': 'Slow down'}]
+    mock_salesforce_server.post(
+        requests_mock.ANY,
+        [
+            {'status_code': 403, 'json': error_data},
+            {'status_code': 503, 'text': 'Unavailable',
+             'headers': {'Retry-After': '2'}},
+            {'json': response_data},
+        ]
+    )
+
+    with patch('nameko_salesforce.api.client.sleep') as sleep:
+        assert client.Contact.create({}) == response_data
+
+    assert sleep.call_count == 2
+    assert sleep.call_args_list[1] == call(2)
+    assert len(client.pool.busy) == 0
+    assert len(client.pool.free) == 1
+
+
+def test_retries_are_bounded(client, mock_salesforce_server):
+
+    mock_salesforce_server.post(
+        requests_mock.ANY, status_code=503, text='Unavailable')
+
+    with pytest.raises(SalesforceGeneralError):
+        client.Contact.create({})
+
+    assert (
+        mock_salesforce_server.call_count ==
+        client.pool.retry_policy.max_attempts)
+
+
+def test_idempotent_calls_are_retried_on_connection_error(
+    client, mock_salesforce_server
+):
+    response_data = {'totalSize': 0, 'records': [], 'done': True}
+    mock_salesforce_server.get(
+        requests_mock.ANY,
+        [
+            {'exc': requests.exceptions.ConnectionError},
+            {'json': response_data},
+        ]
+    )
+
+    assert client.query('SELECT Id FROM Contact') == response_data
+    assert mock_salesforce_server.call_count == 2
+
+
 @pytest.mark.usefixtures('fast_retry')
 def test_other_salesforce_errors_are_raised(client, mock_salesforce_server):
 
@@ -235,3 +699,823 @@ def test_other_salesforce_errors_are_raised(client, mock_salesforce_server):
     # client is still put back in the pool
     assert len(client.pool.busy) == 0
     assert len(client.pool.free) == 1
+
+
+@pytest.fixture
+def bounded_client(config):
+    return get_client(
+        username=config['SALESFORCE']['USERNAME'],
+        password=config['SALESFORCE']['PASSWORD'],
+        security_token=config['SALESFORCE']['SECURITY_TOKEN'],
+        sandbox=config['SALESFORCE']['SANDBOX'],
+        api_version=config['SALESFORCE']['SANDBOX'],
+        max_size=1,
+        checkout_timeout=0.01,
+    )
+
+
+def test_bounded_pool_waits_for_free_client(
+    bounded_client, mock_salesforce_server
+):
+
+    requests_data = {'LastName': 'Smith', 'Email': 'example@example.com'}
+    response_data = {
+        'errors': [],
+        'id': '003e0000003GuNXAA0',
+        'success': True
+    }
+    mock_salesforce_server.post(requests_mock.ANY, json=response_data)
+
+    bounded_client.pool.checkout_timeout = None
+
+    def create_contact():
+        return bounded_client.Contact.create(requests_data)
+
+    with bounded_client.pool.get():
+        gt = eventlet.spawn(create_contact)
+        eventlet.sleep(0.01)
+        # call is blocked waiting for the only client to be returned
+        assert not gt.dead
+
+    assert gt.wait() == response_data
+
+    assert len(bounded_client.pool.busy) == 0
+    assert len(bounded_client.pool.free) == 1
+
+
+def test_bounded_pool_checkout_timeout(bounded_client):
+
+    with bounded_client.pool.get():
+        with pytest.raises(ClientPoolExhausted):
+            with bounded_client.pool.get():
+                pass  # pragma: no cover
+
+    # client is available again once returned
+    with bounded_client.pool.get() as client:
+        assert client in bounded_client.pool.busy
+
+
+@pytest.fixture
+def metrics(client):
+    client.pool.metrics = PrometheusMetrics()
+    return client.pool.metrics
+
+
+def test_pool_metrics(client, metrics, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={})
+
+    client.Contact.create({})
+    with client.pool.get():
+        assert metrics.gauges[('salesforce_pool_busy_clients', ())] == 1
+        assert metrics.gauges[('salesforce_pool_free_clients', ())] == 0
+
+    assert metrics.counters[('salesforce_pool_checkouts_total', ())] == 2
+    assert metrics.counters[('salesforce_pool_clients_created_total', ())] == 1
+    assert metrics.counters[('salesforce_pool_logins_total', ())] == 1
+    assert metrics.gauges[('salesforce_pool_busy_clients', ())] == 0
+    assert metrics.gauges[('salesforce_pool_free_clients', ())] == 1
+    histogram = metrics.histograms[
+        ('salesforce_pool_checkout_wait_seconds', ())]
+    assert histogram.count == 2
+
+
+@pytest.mark.usefixtures('fast_retry')
+def test_pool_metrics_discarded_clients(
+    client, metrics, mock_salesforce_server
+):
+    mock_salesforce_server.post(
+        requests_mock.ANY,
+        [
+            {'status_code': 401, 'text': 'session expired'},
+            {'exc': requests.exceptions.ConnectTimeout},
+            {'json': {}},
+        ]
+    )
+
+    client.Contact.create({})
+
+    client.pool.idle_timeout = 0
+    with client.pool.get():
+        pass
+
+    discarded = {
+        labels: value for (name, labels), value in metrics.counters.items()
+        if name == 'salesforce_pool_clients_discarded_total'
+    }
+    assert discarded == {
+        (('reason', 'session_expired'),): 1,
+        (('reason', 'connection_error'),): 1,
+        (('reason', 'idle'),): 1,
+    }
+
+
+def test_pool_metrics_checkout_timeout(bounded_client):
+    metrics = bounded_client.pool.metrics = PrometheusMetrics()
+
+    with bounded_client.pool.get():
+        with pytest.raises(ClientPoolExhausted):
+            with bounded_client.pool.get():
+                pass  # pragma: no cover
+
+    assert metrics.counters[
+        ('salesforce_pool_checkout_timeouts_total', ())] == 1
+
+
+def test_call_metrics(client, metrics, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, text='{"id": "1"}')
+    mock_salesforce_server.get(
+        requests_mock.ANY, json={'records': [], 'done': True})
+
+    client.Contact.create({})
+    client.query('SELECT Id FROM Contact')
+
+    durations = {
+        labels: histogram.count
+        for (name, labels), histogram in metrics.histograms.items()
+        if name == 'salesforce_request_duration_seconds'
+    }
+    assert durations == {
+        (('operation', 'create'), ('sobject', 'Contact'), ('status', '200')):
+            1,
+        (('operation', 'query'), ('sobject', ''), ('status', '200')): 1,
+    }
+    sizes = metrics.histograms[(
+        'salesforce_response_size_bytes',
+        (('operation', 'create'), ('sobject', 'Contact')),
+    )]
+    assert sizes.sum == len('{"id": "1"}')
+    assert sizes.buckets[0] == 256
+
+
+@pytest.mark.parametrize('stream, size', [(False, 11), (True, None)])
+def test_get_response_size(mock_salesforce_server, stream, size):
+    mock_salesforce_server.get(requests_mock.ANY, text='{"id": "1"}')
+    session = Session()
+
+    response = session.get('https://abc.salesforce.com/', stream=stream)
+
+    assert session.last_response_read is not stream
+    assert get_response_size(
+        response, read=session.last_response_read) == size
+    assert response.text == '{"id": "1"}'  # stream left to read
+
+
+def test_get_response_size_from_content_length(mock_salesforce_server):
+    mock_salesforce_server.get(
+        requests_mock.ANY, text='{"id": "1"}',
+        headers={'Content-Length': '11'})
+
+    response = Session().get('https://abc.salesforce.com/', stream=True)
+
+    assert get_response_size(response) == 11
+
+
+@pytest.mark.usefixtures('fast_retry')
+def test_call_metrics_errors(client, metrics, mock_salesforce_server):
+    mock_salesforce_server.get(
+        requests_mock.ANY,
+        [
+            {'exc': requests.exceptions.ConnectTimeout},
+            {'status_code': 404, 'json': [{'errorCode': 'NOT_FOUND'}]},
+        ]
+    )
+
+    with pytest.raises(SalesforceResourceNotFound):
+        client.Contact.get('1')
+
+    errors = {
+        labels: value for (name, labels), value in metrics.counters.items()
+        if name == 'salesforce_request_errors_total'
+    }
+    assert errors == {
+        (
+            ('error', 'ConnectTimeout'), ('operation', 'get'),
+            ('sobject', 'Contact'),
+        ): 1,
+        (
+            ('error', 'SalesforceResourceNotFound'), ('operation', 'get'),
+            ('sobject', 'Contact'),
+        ): 1,
+    }
+    statuses = sorted(
+        dict(labels)['status'] for name, labels in metrics.histograms
+        if name == 'salesforce_request_duration_seconds')
+    assert statuses == ['', '404']
+
+
+def test_api_quota_is_updated(client, metrics, mock_salesforce_server):
+    mock_salesforce_server.post(
+        requests_mock.ANY, json={},
+        headers={'Sforce-Limit-Info': 'api-usage=30/100'})
+
+    client.Contact.create({})
+
+    assert client.pool.api_quota.usage == 0.3
+    assert metrics.gauges[('salesforce_api_requests_used', ())] == 30
+    assert metrics.gauges[('salesforce_api_requests_limit', ())] == 100
+
+
+def test_low_priority_calls_are_held_back(client, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={})
+    api_quota = client.pool.api_quota = ApiQuota(
+        soft_limit=0.5, hard_limit=0.9)
+    api_quota.used, api_quota.limit = 95, 100
+
+    client.Contact.create({})
+    with pytest.raises(ApiQuotaExceeded):
+        client.with_priority('low').Contact.create({})
+    with pytest.raises(ApiQuotaExceeded):
+        client.with_priority(Priority.low).query('SELECT Id FROM Contact')
+
+    assert mock_salesforce_server.call_count == 1
+    assert client.priority is None
+
+
+def test_low_priority_calls_are_slowed_down(client, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={})
+    api_quota = client.pool.api_quota = ApiQuota(
+        soft_limit=0.5, hard_limit=0.9, max_delay=4)
+    api_quota.used, api_quota.limit = 70, 100
+
+    with patch('nameko_salesforce.api.client.sleep') as sleep:
+        client.Contact.create({})
+        client.with_priority('low').Contact.create({})
+
+    assert sleep.call_args_list == [call(pytest.approx(2))]
+
+
+def test_rate_limiter_is_acquired_per_attempt(
+    client, mock_salesforce_server
+):
+    mock_salesforce_server.post(
+        requests_mock.ANY,
+        [{'status_code': 503, 'json': []}, {'json': {}}])
+    client.pool.rate_limiter = Mock()
+
+    client.Contact.create({})
+
+    assert client.pool.rate_limiter.acquire.call_count == 2
+
+
+@pytest.mark.usefixtures('fast_retry')
+def test_concurrency_limiter(client, metrics, mock_salesforce_server):
+    mock_salesforce_server.post(
+        requests_mock.ANY,
+        [{'status_code': 503, 'json': []}, {'json': {}}])
+    limiter = client.pool.concurrency_limiter = ConcurrencyLimiter(
+        initial_limit=4)
+
+    client.Contact.create({})
+
+    assert limiter.limit == 2
+    assert limiter.in_flight == 0
+    assert metrics.gauges[('salesforce_pool_concurrency_limit', ())] == 2
+
+
+def test_concurrency_limiter_checkout_timeout(client):
+    client.pool.concurrency_limiter = ConcurrencyLimiter(initial_limit=1)
+    client.pool.checkout_timeout = 0.01
+
+    with client.pool.get():
+        with pytest.raises(ClientPoolExhausted):
+            with client.pool.get():
+                pass  # pragma: no cover
+
+    assert client.pool.concurrency_limiter.in_flight == 0
+
+
+def test_concurrency_limiter_released_on_pool_checkout_timeout(
+    bounded_client
+):
+    limiter = bounded_client.pool.concurrency_limiter = ConcurrencyLimiter(
+        initial_limit=2)
+
+    with bounded_client.pool.get():
+        with pytest.raises(ClientPoolExhausted):
+            with bounded_client.pool.get():
+                pass  # pragma: no cover
+        assert limiter.in_flight == 1
+
+
+@pytest.mark.usefixtures('fast_retry')
+def test_circuit_breaker(client, metrics, mock_salesforce_server):
+    mock_salesforce_server.get(
+        requests_mock.ANY, exc=requests.exceptions.ConnectTimeout)
+    client.pool.circuit_breakers = CircuitBreakers(
+        failure_threshold=2, per_sobject=True)
+
+    with pytest.raises(CircuitOpen):
+        client.Contact.get('1')
+    with pytest.raises(CircuitOpen):
+        client.Contact.get('1')
+
+    # circuit opened by the second attempt, stopping retries
+    assert mock_salesforce_server.call_count == 2
+    assert metrics.counters[(
+        'salesforce_circuit_breaker_rejections_total',
+        (('circuit', 'abc.salesforce.com/Contact'),),
+    )] == 2
+
+    # other sObjects still go through
+    with pytest.raises(CircuitOpen):
+        client.Account.get('1')
+    assert mock_salesforce_server.call_count == 4
+
+
+def test_open_circuit_fails_before_checkout(bounded_client):
+    bounded_client.pool.circuit_breakers = CircuitBreakers(
+        failure_threshold=1)
+    bounded_client.pool.get_session()
+    breaker = bounded_client.pool.check_circuit()
+    breaker.record(requests.exceptions.ConnectTimeout())
+
+    with bounded_client.pool.get():
+        # raised at once instead of waiting for the busy client
+        with pytest.raises(CircuitOpen):
+            bounded_client.Contact.get('1')
+
+
+class TestLoginCircuit:
+
+    @pytest.fixture(autouse=True)
+    def circuit_breakers(self, client):
+        circuit_breakers = client.pool.circuit_breakers = CircuitBreakers(
+            failure_threshold=2)
+        return circuit_breakers
+
+    def test_circuit_is_checked_without_logging_in(
+        self, client, mock_salesforce_login
+    ):
+        mock_salesforce_login.side_effect = (
+            requests.exceptions.ConnectTimeout)
+
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectTimeout):
+                client.Contact.get('1')
+        with pytest.raises(CircuitOpen) as exc_info:
+            client.Contact.get('1')
+
+        assert mock_salesforce_login.call_count == 2
+        assert str(exc_info.value).startswith(
+            'Circuit of login.salesforce.com is open')
+
+    def test_server_errors_of_logins_are_failures(
+        self, client, circuit_breakers, mock_salesforce_login
+    ):
+        def login(session, **kwargs):
+            session.last_response = Mock(
+                url='https://login.salesforce.com/', status_code=503)
+            raise SalesforceAuthenticationFailed('UNKNOWN', 'Unavailable')
+
+        mock_salesforce_login.side_effect = login
+        client.pool.instance = 'abc.salesforce.com'
+
+        for _ in range(2):
+            with pytest.raises(SalesforceAuthenticationFailed):
+                client.pool.login()
+
+        assert not circuit_breakers.get('abc.salesforce.com').is_closed
+
+    def test_failed_authentication_closes_circuit(
+        self, client, circuit_breakers, mock_salesforce_login
+    ):
+        breaker = circuit_breakers.get('login.salesforce.com')
+        breaker.record(requests.exceptions.ConnectTimeout())
+        mock_salesforce_login.side_effect = SalesforceAuthenticationFailed(
+            'INVALID_LOGIN', 'Invalid username or password')
+
+        with pytest.raises(SalesforceAuthenticationFailed):
+            client.pool.login()
+
+        assert breaker.failures == 0
+
+    def test_login_closes_circuit(self, client, circuit_breakers):
+        breaker = circuit_breakers.get('login.salesforce.com')
+        breaker.record(requests.exceptions.ConnectTimeout())
+
+        client.pool.login()
+
+        assert breaker.failures == 0
+        assert client.pool.check_circuit('Contact') is (
+            circuit_breakers.get('abc.salesforce.com'))
+
+
+class TestSObjectCollections:
+
+    @pytest.fixture
+    def records(self):
+        return [{'LastName': 'Smith {}'.format(i)} for i in range(250)]
+
+    def respond(self, request, context):
+        if request.method == 'DELETE':
+            ids = request.qs['ids'][0].split(',')
+        else:
+            ids = [
+                record.get('Id') or record['LastName']
+                for record in request.json()['records']
+            ]
+        return [{'id': id_, 'success': True, 'errors': []} for id_ in ids]
+
+    def test_create_many(self, client, mock_salesforce_server, records):
+        mock_salesforce_server.post(
+            requests_mock.ANY, json=self.respond)
+
+        results = client.Contact.create_many(records, all_or_none=True)
+
+        assert [result['id'] for result in results] == [
+            record['LastName'] for record in records]
+        history = mock_salesforce_server.request_history
+        assert len(history) == 2
+        assert history[0].path.endswith('/composite/sobjects')
+        body = history[0].json()
+        assert body['allOrNone'] is True
+        assert len(body['records']) == 200
+        assert body['records'][0] == {
+            'attributes': {'type': 'Contact'}, 'LastName': 'Smith 0'}
+        assert len(history[1].json()['records']) == 50
+
+    def test_update_many(self, client, mock_salesforce_server):
+        mock_salesforce_server.patch(requests_mock.ANY, json=self.respond)
+        records = [{'Id': '1', 'Email': 'a@b.c'}, {'Id': '2', 'Email': ''}]
+
+        results = client.Contact.update_many(records)
+
+        assert [result['id'] for result in results] == ['1', '2']
+        request = mock_salesforce_server.request_history[0]
+        assert request.method == 'PATCH'
+        assert request.json()['allOrNone'] is False
+
+    def test_upsert_many(self, client, mock_salesforce_server, records):
+        mock_salesforce_server.patch(requests_mock.ANY, json=self.respond)
+
+        results = client.Contact.upsert_many('External_Id__c', records)
+
+        assert len(results) == 250
+        request = mock_salesforce_server.request_history[0]
+        assert request.path.endswith(
+            '/composite/sobjects/contact/external_id__c')
+
+    def test_delete_many(self, client, mock_salesforce_server):
+        mock_salesforce_server.delete(requests_mock.ANY, json=self.respond)
+        ids = [str(i) for i in range(201)]
+
+        results = client.Contact.delete_many(ids, all_or_none=True)
+
+        assert [result['id'] for result in results] == ids
+        request = mock_salesforce_server.request_history[0]
+        assert request.qs['allornone'] == ['true']
+
+    def test_concurrency(self, client, mock_salesforce_server, records):
+
+        def respond(request, context):
+            eventlet.sleep(0.01)
+            return self.respond(request, context)
+
+        mock_salesforce_server.post(requests_mock.ANY, json=respond)
+
+        results = client.Contact.create_many(records * 2, concurrency=3)
+
+        assert [result['id'] for result in results] == [
+            record['LastName'] for record in records * 2]
+        # chunks were sent on separate clients at the same time
+        assert len(client.pool.free) == 3
+
+    def test_failing_chunk(self, client, mock_salesforce_server, records):
+        mock_salesforce_server.post(
+            requests_mock.ANY,
+            [
+                {'json': self.respond},
+                {'status_code': 400, 'json': [{'errorCode': 'INVALID'}]},
+            ])
+
+        with pytest.raises(SalesforceMalformedRequest):
+            client.Contact.create_many(records)
+
+    def test_fetch_many(self, client, mock_salesforce_server):
+
+        def respond(request, context):
+            return [
+                None if id_.startswith('x') else {'Id': id_, 'Name': 'N'}
+                for id_ in request.json()['ids']
+            ]
+
+        mock_salesforce_server.post(requests_mock.ANY, json=respond)
+        ids = [str(i) for i in range(2500)] + ['1', 'x1']
+
+        records = client.fetch_many(
+            'Contact', ids, ('Id', 'Name'), concurrency=2)
+
+        assert len(records) == 2500
+        assert records['1'] == {'Id': '1', 'Name': 'N'}
+        assert 'x1' not in records
+        history = mock_salesforce_server.request_history
+        assert len(history) == 2
+        assert history[0].path.endswith('/composite/sobjects/contact')
+        assert history[0].json() == {
+            'ids': ids[:2000], 'fields': ['Id', 'Name']}
+        assert history[1].json()['ids'] == ids[2000:2500] + ['x1']
+
+    @pytest.mark.usefixtures('fast_retry')
+    def test_fetch_many_is_retried(self, client, mock_salesforce_server):
+        mock_salesforce_server.post(
+            requests_mock.ANY,
+            [
+                {'exc': requests.exceptions.ConnectionError},
+                {'json': [{'Id': '1'}]},
+            ])
+
+        assert client.Contact.fetch_many(['1'], ['Id']) == {'1': {'Id': '1'}}
+
+
+class TestComposite:
+
+    def respond(self, request, context):
+        return {'compositeResponse': [
+            {
+                'body': {'id': 'ID-{}'.format(subrequest['referenceId'])},
+                'httpHeaders': {},
+                'httpStatusCode': 200,
+                'referenceId': subrequest['referenceId'],
+            }
+            for subrequest in request.json()['compositeRequest']
+        ]}
+
+    def test_composite(self, client, mock_salesforce_server):
+        mock_salesforce_server.post(requests_mock.ANY, json=self.respond)
+
+        composite = client.composite(all_or_none=True)
+        accounts = composite.query(
+            "SELECT Id FROM Account WHERE Name = 'Acme'",
+            reference_id='accounts')
+        contact = composite.Contact.get('003A')
+        created = composite.Contact.create(
+            {'AccountId': accounts.field('records[0].Id')})
+        composite.Contact.update(created.id, {'Email': 'a@b.c'})
+        composite.add(
+            'GET', '/services/data/v37.0/limits/', reference_id='limits')
+        composite.Contact.upsert('Ext__c/1', {})
+        composite.Lead.delete('00QA')
+        assert len(composite) == 7
+
+        references = composite.execute()
+
+        assert references[:3] == [accounts, contact, created]
+        assert created.record_id == 'ID-ref3'
+        assert all(reference.success for reference in references)
+        request = mock_salesforce_server.request_history[0]
+        assert request.path == '/services/data/v37.0/composite'
+        body = request.json()
+        assert body['allOrNone'] is True
+        assert [
+            (sub['method'], sub['url']) for sub in body['compositeRequest']
+        ] == [
+            (
+                'GET',
+                '/services/data/v37.0/query/'
+                '?q=SELECT+Id+FROM+Account+WHERE+Name+%3D+%27Acme%27',
+            ),
+            ('GET', '/services/data/v37.0/sobjects/Contact/003A'),
+            ('POST', '/services/data/v37.0/sobjects/Contact/'),
+            ('PATCH', '/services/data/v37.0/sobjects/Contact/@{ref3.id}'),
+            ('GET', '/services/data/v37.0/limits/'),
+            ('PATCH', '/services/data/v37.0/sobjects/Contact/Ext__c/1'),
+            ('DELETE', '/services/data/v37.0/sobjects/Lead/00QA'),
+        ]
+        assert body['compositeRequest'][2]['body'] == {
+            'AccountId': '@{accounts.records[0].Id}'}
+
+    def test_query_all(self, client, mock_salesforce_server):
+        mock_salesforce_server.post(requests_mock.ANY, json=self.respond)
+
+        composite = client.with_timeout(5).composite()
+        composite.query_all('SELECT Id FROM Contact')
+        composite.execute()
+
+        request = mock_salesforce_server.request_history[0]
+        assert request.json() == {
+            'allOrNone': False,
+            'compositeRequest': [{
+                'method': 'GET',
+                'url': '/services/data/v37.0/queryAll/'
+                       '?q=SELECT+Id+FROM+Contact',
+                'referenceId': 'ref1',
+            }],
+        }
+        assert request.timeout == 5
+
+    def test_chunks_after_a_failure_are_not_sent(
+        self, client, mock_salesforce_server
+    ):
+
+        def respond(request, context):
+            response = self.respond(request, context)
+            response['compositeResponse'][0]['httpStatusCode'] = 400
+            return response
+
+        mock_salesforce_server.post(requests_mock.ANY, json=respond)
+
+        composite = client.composite()
+        account = composite.Account.create({})
+        for _ in range(MAX_SUBREQUESTS):
+            composite.Account.update(account.id, {})
+
+        with pytest.raises(CompositeError) as exc_info:
+            composite.execute()
+
+        assert mock_salesforce_server.call_count == 1
+        assert len(exc_info.value.failed) == 2
+        assert not exc_info.value.failed[1].sent
+
+    def test_later_chunks_resolve_query_references(
+        self, client, mock_salesforce_server
+    ):
+
+        def respond(request, context):
+            response = self.respond(request, context)
+            first = response['compositeResponse'][0]
+            if first['referenceId'] == 'accounts':
+                first['body'] = {'records': [{'Id': '001A'}]}
+            return response
+
+        mock_salesforce_server.post(requests_mock.ANY, json=respond)
+
+        composite = client.composite()
+        accounts = composite.query(
+            "SELECT Id FROM Account WHERE Name = 'Acme' LIMIT 1",
+            reference_id='accounts')
+        for _ in range(MAX_SUBREQUESTS):
+            composite.Contact.create(
+                {'AccountId': accounts.field('records[0].Id')})
+
+        composite.execute()
+
+        first, second = [
+            request.json()['compositeRequest']
+            for request in mock_salesforce_server.request_history
+        ]
+        assert first[1]['body'] == {
+            'AccountId': '@{accounts.records[0].Id}'}
+        assert second == [{
+            'method': 'POST',
+            'url': '/services/data/v37.0/sobjects/Contact/',
+            'referenceId': 'ref26',
+            'body': {'AccountId': '001A'},
+        }]
+
+    def test_all_or_none_is_limited_to_a_single_request(self, client):
+        composite = client.composite(all_or_none=True)
+        for _ in range(MAX_SUBREQUESTS):
+            composite.Account.create({})
+
+        with pytest.raises(ValueError):
+            composite.Account.create({})
+
+        assert len(composite) == MAX_SUBREQUESTS
+
+
+class TestIterQuery:
+
+    @pytest.fixture
+    def pages(self, mock_salesforce_server):
+        url = 'https://abc.salesforce.com/services/data/v37.0/query/'
+        mock_salesforce_server.get(url, json={
+            'done': False,
+            'nextRecordsUrl': '/services/data/v37.0/query/01g-2',
+            'records': [{'Id': '1'}, {'Id': '2'}],
+        })
+        mock_salesforce_server.get(url + '01g-2', json={
+            'done': False,
+            'nextRecordsUrl': '/services/data/v37.0/query/01g-3',
+            'records': [{'Id': '3'}],
+        })
+        mock_salesforce_server.get(url + '01g-3', json={
+            'done': True,
+            'records': [{'Id': '4'}],
+        })
+        return mock_salesforce_server
+
+    def get_paths(self, server):
+        return [request.path for request in server.request_history]
+
+    @pytest.mark.parametrize('prefetch', [0, 1, 3])
+    def test_iter_query(self, client, pages, prefetch):
+        records = client.iter_query(
+            'SELECT Id FROM Contact', prefetch=prefetch)
+
+        assert [record['Id'] for record in records] == ['1', '2', '3', '4']
+        assert self.get_paths(pages) == [
+            '/services/data/v37.0/query/',
+            '/services/data/v37.0/query/01g-2',
+            '/services/data/v37.0/query/01g-3',
+        ]
+        assert pages.request_history[0].qs == {
+            'q': ['select id from contact']}
+
+    def test_include_deleted(self, client, pages):
+        pages.get(
+            'https://abc.salesforce.com/services/data/v37.0/queryAll/',
+            json={'done': True, 'records': []})
+
+        records = client.iter_query(
+            'SELECT Id FROM Contact', include_deleted=True)
+
+        assert list(records) == []
+        assert self.get_paths(pages) == ['/services/data/v37.0/queryall/']
+
+    def test_next_page_is_prefetched(self, client, pages):
+        records = client.iter_query('SELECT Id FROM Contact')
+        assert pages.call_count == 0
+
+        next(records)
+        eventlet.sleep(0)
+
+        # the second page is fetched while the first one is consumed
+        assert pages.call_count == 2
+        next(records)
+        eventlet.sleep(0)
+        assert pages.call_count == 2
+
+        records.close()
+
+    def test_no_prefetch(self, client, pages):
+        records = client.iter_query('SELECT Id FROM Contact', prefetch=0)
+
+        next(records)
+        next(records)
+        eventlet.sleep(0)
+        assert pages.call_count == 1
+
+        next(records)
+        assert pages.call_count == 2
+
+    @pytest.mark.usefixtures('fast_retry')
+    def test_error_is_raised_after_earlier_records(self, client, pages):
+        pages.get(
+            'https://abc.salesforce.com/services/data/v37.0/query/01g-2',
+            status_code=400,
+            json=[{'errorCode': 'INVALID_QUERY_LOCATOR', 'message': ''}])
+
+        records = client.iter_query('SELECT Id FROM Contact')
+
+        assert next(records) == {'Id': '1'}
+        assert next(records) == {'Id': '2'}
+        with pytest.raises(SalesforceMalformedRequest):
+            next(records)
+
+
+class TestQueryCache:
+
+    @pytest.fixture(autouse=True)
+    def query_cache(self, client):
+        client.pool.query_cache = QueryCache()
+        return client.pool.query_cache
+
+    @pytest.fixture
+    def server(self, mock_salesforce_server):
+        mock_salesforce_server.get(
+            requests_mock.ANY,
+            json={'done': True, 'totalSize': 1, 'records': [{'Id': '1'}]})
+        mock_salesforce_server.post(requests_mock.ANY, json={'id': '2'})
+        return mock_salesforce_server
+
+    def test_queries_are_cached(self, client, server):
+        soql = 'SELECT Id FROM Contact'
+        assert client.query(soql) == client.query(soql)
+        client.query_all(soql)
+        client.query_all(soql)
+        client.query(soql, include_deleted=True)
+
+        assert server.call_count == 3
+
+    def test_calls_with_request_options_are_not_cached(self, client, server):
+        client.query('SELECT Id FROM Contact', timeout=5)
+        client.query('SELECT Id FROM Contact', timeout=5)
+
+        assert server.call_count == 2
+
+    def test_writes_invalidate_cached_queries(self, client, server):
+        client.query('SELECT Id FROM Contact')
+        client.query('SELECT Id FROM Account')
+        client.Contact.create({})
+        client.query('SELECT Id FROM Contact')
+        client.query('SELECT Id FROM Account')
+
+        assert server.call_count == 4
+
+    def test_composite_writes_invalidate_cached_queries(
+        self, client, server, query_cache
+    ):
+        server.post(requests_mock.ANY, json={'compositeResponse': [
+            {'referenceId': 'ref1', 'httpStatusCode': 200, 'body': {}},
+            {'referenceId': 'ref2', 'httpStatusCode': 204, 'body': None},
+        ]})
+        for soql in ('SELECT Id FROM Contact', 'SELECT Id FROM Account'):
+            client.query(soql)
+
+        composite = client.composite()
+        composite.Account.get('1')
+        composite.Contact.update('2', {'LastName': 'Smith'})
+        composite.execute()
+
+        assert set(query_cache.results) == {
+            ('query', 'SELECT Id FROM Account', False)}
@@ -0,0 +1,206 @@
+from mock import Mock
+import pytest
+
+from nameko_salesforce.api.composite import (
+    Composite,
+    CompositeError,
+    CompositeRequest,
+    MAX_SUBREQUESTS,
+)
+
+
+@pytest.fixture
+def request_():
+    return CompositeRequest('42.0')
+
+
+def test_add(request_):
+    account = request_.add(
+        'POST', request_.sobject_url('Account'), body={'Name': 'Acme'})
+    contact = request_.add(
+        'POST', request_.sobject_url('Contact'),
+        body={'LastName': 'Smith', 'AccountId': account.id},
+        reference_id='contact')
+    request_.add('DELETE', request_.sobject_url('Lead', '00Q1'))
+
+    assert account.reference_id == 'ref1'
+    assert account.id == '@{ref1.id}'
+    assert contact.field('Name') == '@{contact.Name}'
+    assert len(request_) == 3
+    assert request_.make_body(request_.subrequests) == {
+        'allOrNone': False,
+        'compositeRequest': [
+            {
+                'method': 'POST',
+                'url': '/services/data/v42.0/sobjects/Account/',
+                'referenceId': 'ref1',
+                'body': {'Name': 'Acme'},
+            },
+            {
+                'method': 'POST',
+                'url': '/services/data/v42.0/sobjects/Contact/',
+                'referenceId': 'contact',
+                'body': {'LastName': 'Smith', 'AccountId': '@{ref1.id}'},
+            },
+            {
+                'method': 'DELETE',
+                'url': '/services/data/v42.0/sobjects/Lead/00Q1',
+                'referenceId': 'ref3',
+            },
+        ],
+    }
+
+
+def test_duplicate_reference_id(request_):
+    request_.add('GET', '/foo', reference_id='foo')
+    with pytest.raises(ValueError):
+        request_.add('GET', '/bar', reference_id='foo')
+
+
+def test_chunks_resolve_references_to_earlier_chunks(request_):
+    references = [
+        request_.add('POST', request_.sobject_url('Account'), body={})
+        for _ in range(MAX_SUBREQUESTS)
+    ]
+    request_.add(
+        'PATCH', request_.sobject_url('Account', references[0].id),
+        body={'ParentId': references[1].id, 'Names': [references[2].id]})
+
+    first, second = request_.chunks()
+    assert len(first) == MAX_SUBREQUESTS
+    request_.set_results({'compositeResponse': [
+        {
+            'body': {'id': '001{}'.format(index), 'success': True},
+            'httpHeaders': {},
+            'httpStatusCode': 201,
+            'referenceId': reference.reference_id,
+        }
+        for index, reference in enumerate(references)
+    ]})
+
+    body = request_.make_body(second, all_or_none=True)
+
+    assert body == {
+        'allOrNone': True,
+        'compositeRequest': [{
+            'method': 'PATCH',
+            'url': '/services/data/v42.0/sobjects/Account/0010',
+            'referenceId': 'ref26',
+            'body': {'ParentId': '0011', 'Names': ['0012']},
+        }],
+    }
+    assert references[0].record_id == '0010'
+
+
+def test_chunks_resolve_query_references(request_):
+    accounts = request_.add(
+        'GET', request_.url('query/?q=SELECT+Id+FROM+Account'))
+    contacts = [
+        request_.add('POST', request_.sobject_url('Contact'), body={
+            'AccountId': accounts.field('records[{}].Id'.format(index)),
+            'Description': accounts.field('records[0].Owner.Name'),
+        })
+        for index in range(MAX_SUBREQUESTS)
+    ]
+
+    first, second = request_.chunks()
+    request_.set_results({'compositeResponse': [{
+        'body': {'done': True, 'records': [
+            {'Id': '0010', 'Owner': {'Name': 'Smith'}},
+            {'Id': '0011', 'Owner': None},
+        ]},
+        'httpHeaders': {},
+        'httpStatusCode': 200,
+        'referenceId': accounts.reference_id,
+    }]})
+
+    body = request_.make_body(second)
+
+    assert [sub['referenceId'] for sub in second] == [
+        contacts[-1].reference_id]
+    # the query has fewer records than referred to
+    assert body['compositeRequest'][0]['body'] == {
+        'AccountId': '@{ref1.records[24].Id}',
+        'Description': 'Smith',
+    }
+    request_.subrequests[-1]['body']['AccountId'] = (
+        accounts.field('records[1].Id'))
+    request_.subrequests[-1]['body']['Description'] = (
+        accounts.field('records[1].Owner.Name'))
+    assert request_.make_body(second)['compositeRequest'][0]['body'] == {
+        'AccountId': '0011',
+        'Description': '@{ref1.records[1].Owner.Name}',
+    }
+
+
+def test_get_references(request_):
+    account = request_.add('POST', request_.sobject_url('Account'), body={})
+    request_.set_results({'compositeResponse': [{
+        'body': {'id': '0011', 'success': True, 'errors': []},
+        'httpHeaders': {},
+        'httpStatusCode': 201,
+        'referenceId': 'ref1',
+    }]})
+
+    assert request_.get_references() == [account]
+    assert account.success
+    assert account.record_id == '0011'
+
+
+def test_get_references_failed(request_):
+    account = request_.add('POST', request_.sobject_url('Account'), body={})
+    contact = request_.add('POST', request_.sobject_url('Contact'), body={})
+    request_.set_results({'compositeResponse': [{
+        'body': [{'errorCode': 'REQUIRED_FIELD_MISSING', 'message': 'Name'}],
+        'httpHeaders': {},
+        'httpStatusCode': 400,
+        'referenceId': 'ref1',
+    }]})
+
+    with pytest.raises(CompositeError) as exc:
+        request_.get_references()
+
+    assert exc.value.references == [account, contact]
+    assert exc.value.failed == [account, contact]
+    assert not contact.sent
+    assert account.record_id is None
+    assert str(exc.value).startswith('2 of 2 subrequests failed: ref1: ')
+
+
+def test_reference_repr(request_):
+    reference = request_.add('GET', '/foo', reference_id='foo')
+
+    assert repr(reference) == '<Reference foo status=None>'
+
+
+def test_make_body_keeps_other_values(request_):
+    request_.add(
+        'PATCH', request_.sobject_url('Account', '0011'),
+        body={'NumberOfEmployees': 5, 'IsActive__c': True, 'Site': None})
+
+    body = request_.make_body(request_.subrequests)
+
+    assert body['compositeRequest'][0]['body'] == {
+        'NumberOfEmployees': 5, 'IsActive__c': True, 'Site': None}
+
+
+def test_get_written_sobject_types(request_):
+    request_.add('GET', request_.sobject_url('Account', '0011'))
+    request_.add('PATCH', request_.sobject_url('Contact', '0031'), body={})
+    request_.add('DELETE', request_.sobject_url('Lead', '00Q1'))
+    request_.add('GET', request_.url('query/?q=SELECT+Id+FROM+Case'))
+
+    assert request_.get_written_sobject_types(request_.subrequests) == {
+        'Contact', 'Lead'}
+
+
+def test_execute_without_query_cache():
+    send = Mock(return_value={'compositeResponse': [
+        {'referenceId': 'ref1', 'httpStatusCode': 201, 'body': {'id': '1'}},
+    ]})
+    composite = Composite(send, '42.0')
+    composite.Account.create({'Name': 'Acme'})
+
+    [account] = composite.execute()
+
+    assert account.record_id == '1'
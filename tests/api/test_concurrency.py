@@ -0,0 +1,172 @@
+import eventlet
+import pytest
+import requests
+from simple_salesforce import (
+    SalesforceGeneralError,
+    SalesforceMalformedRequest,
+)
+
+from nameko_salesforce import constants
+from nameko_salesforce.api.concurrency import (
+    ConcurrencyLimiter,
+    get_concurrency_limiter,
+    is_overload,
+)
+
+
+@pytest.mark.parametrize('exc,expected', [
+    (None, False),
+    (requests.exceptions.ReadTimeout(), True),
+    (requests.exceptions.ConnectionError(), True),
+    (SalesforceGeneralError('url', 503, 'Contact', []), True),
+    (
+        SalesforceMalformedRequest(
+            'url', 403, 'Contact', [{'errorCode': 'REQUEST_LIMIT_EXCEEDED'}]),
+        True,
+    ),
+    (
+        SalesforceMalformedRequest(
+            'url', 400, 'Contact', [{'errorCode': 'INVALID_FIELD'}]),
+        False,
+    ),
+    (ValueError(), False),
+])
+def test_is_overload(exc, expected):
+    assert is_overload(exc) is expected
+
+
+class TestGetConcurrencyLimiter:
+
+    def test_disabled_by_default(self, config):
+        assert get_concurrency_limiter(config['SALESFORCE']) is None
+
+    def test_enabled(self, config):
+        config['SALESFORCE'].update({
+            'CONCURRENCY_LIMIT_ENABLED': True,
+            'CONCURRENCY_LIMIT_INITIAL': 5,
+            'CONCURRENCY_LIMIT_MIN': 2,
+            'CONCURRENCY_LIMIT_MAX': 50,
+            'CONCURRENCY_LIMIT_LATENCY_TOLERANCE': 3,
+        })
+
+        limiter = get_concurrency_limiter(config['SALESFORCE'])
+
+        assert limiter.limit == 5
+        assert limiter.min_limit == 2
+        assert limiter.max_limit == 50
+        assert limiter.latency_tolerance == 3
+
+    def test_enabled_defaults(self, config):
+        config['SALESFORCE']['CONCURRENCY_LIMIT_ENABLED'] = True
+
+        limiter = get_concurrency_limiter(config['SALESFORCE'])
+
+        assert limiter.limit == constants.DEFAULT_CONCURRENCY_LIMIT_INITIAL
+        assert limiter.min_limit == 1
+        assert limiter.max_limit == constants.DEFAULT_CONCURRENCY_LIMIT_MAX
+
+    def test_max_limit_follows_pool_max_size(self, config):
+        config['SALESFORCE'].update({
+            'CONCURRENCY_LIMIT_ENABLED': True,
+            'POOL_MAX_SIZE': 20,
+        })
+
+        limiter = get_concurrency_limiter(config['SALESFORCE'])
+
+        assert limiter.max_limit == 20
+
+
+class TestConcurrencyLimiter:
+
+    @pytest.fixture
+    def limiter(self):
+        return ConcurrencyLimiter(initial_limit=2, min_limit=1, max_limit=4)
+
+    def test_acquire_up_to_limit(self, limiter):
+        assert limiter.acquire(timeout=0.01)
+        assert limiter.acquire(timeout=0.01)
+        assert not limiter.acquire(timeout=0.01)
+        assert limiter.in_flight == 2
+        assert not limiter.waiters
+
+    def test_release_hands_over_slot(self, limiter):
+        limiter.acquire()
+        limiter.acquire()
+
+        gt = eventlet.spawn(limiter.acquire)
+        eventlet.sleep(0)
+        assert not gt.dead
+
+        limiter.release()
+
+        assert gt.wait() is True
+        assert limiter.in_flight == 2
+
+    def test_overload_decreases_limit(self, limiter):
+        limiter.limit = 4
+
+        limiter.observe(1, overload=True)
+        assert limiter.limit == 2
+        limiter.observe(1, overload=True)
+        limiter.observe(1, overload=True)
+        assert limiter.limit == 1
+
+    def test_limit_increases_while_in_use(self, limiter):
+        limiter.acquire()
+        limiter.observe(1)
+        assert limiter.limit == 2
+
+        limiter.acquire()
+        limiter.observe(1)
+        limiter.observe(1)
+        assert limiter.limit == 3
+
+    def test_limit_is_capped(self, limiter):
+        limiter.limit = 4
+        limiter.in_flight = 4
+
+        limiter.observe(1)
+
+        assert limiter.limit == 4
+
+    def test_rising_latency_decreases_limit(self, limiter):
+        limiter.limit = 4
+        limiter.observe(1)
+        limiter.observe(1.1)
+        assert limiter.limit == 4
+
+        for _ in range(10):
+            limiter.observe(10)
+
+        assert limiter.limit < 4
+        assert limiter.baseline_latency[None] < 2
+
+    def test_baseline_follows_lower_latency(self, limiter):
+        limiter.observe(1)
+        limiter.observe(0.5)
+
+        assert limiter.baseline_latency[None] == 0.5
+        assert limiter.latency[None] == 0.9
+
+    def test_latency_is_compared_per_operation(self, limiter):
+        limiter.limit = 20
+        for index in range(200):
+            if index % 10:
+                limiter.observe(0.1, operation='get')
+            else:
+                limiter.observe(3, operation='query_all')
+
+        assert limiter.limit == 20
+
+    def test_increase_wakes_waiters(self, limiter):
+        limiter.acquire()
+        limiter.acquire()
+        gt = eventlet.spawn(limiter.acquire)
+        eventlet.sleep(0)
+
+        limiter.observe(1)
+        limiter.observe(1)
+
+        assert limiter.limit == 3
+        assert gt.wait() is True
+        assert limiter.in_flight == 3
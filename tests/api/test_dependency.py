@@ -1,4 +1,4 @@
-from mock import Mock, patch
+from mock import call, Mock, patch
 from nameko.containers import ServiceContainer
 from nameko.exceptions import ConfigurationError
 from nameko.testing.services import dummy, entrypoint_hook
@@ -7,6 +7,10 @@ import requests_mock
 
 from nameko_salesforce import constants
 from nameko_salesforce.api import SalesforceAPI
+from nameko_salesforce.api.composite import Composite
+from nameko_salesforce.api.memo import Memo
+from nameko_salesforce.api.unit_of_work import UnitOfWork
+from nameko_salesforce.metrics import Metrics
 
 
 class TestSalesforceAPIUnit:
@@ -24,7 +28,7 @@ class TestSalesforceAPIUnit:
     @pytest.fixture
     def salesforce_api(self, dependency_provider):
         dependency_provider.setup()
-        return dependency_provider.get_dependency({})
+        return dependency_provider.get_dependency(Mock(data={}))
 
     def test_setup(self, config, salesforce_api):
 
@@ -55,6 +59,95 @@ class TestSalesforceAPIUnit:
             salesforce_api.client.pool.api_version ==
             constants.DEFAULT_API_VERSION)
 
+    def test_setup_pool_options(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'POOL_MAX_SIZE': 5,
+            'POOL_CHECKOUT_TIMEOUT': 2,
+        })
+
+        dependency_provider.setup()
+        pool = dependency_provider.client.pool
+
+        assert pool.min_size == 0
+        assert pool.max_size == 5
+        assert pool.checkout_timeout == 2
+        assert pool.idle_timeout is None
+        assert pool.max_lifetime is None
+        assert pool.reap_interval == constants.DEFAULT_POOL_REAP_INTERVAL
+
+    def test_setup_pool_recycling_options(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'POOL_IDLE_TIMEOUT': 300,
+            'POOL_MAX_LIFETIME': 3600,
+            'POOL_REAP_INTERVAL': 30,
+        })
+
+        dependency_provider.setup()
+        pool = dependency_provider.client.pool
+
+        assert pool.idle_timeout == 300
+        assert pool.max_lifetime == 3600
+        assert pool.reap_interval == 30
+
+    def test_setup_http_options(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'HTTP_POOL_CONNECTIONS': 2,
+            'HTTP_POOL_MAXSIZE': 20,
+            'HTTP_POOL_BLOCK': True,
+            'HTTP_TCP_KEEPALIVE': 30,
+        })
+
+        dependency_provider.setup()
+        http_adapter = dependency_provider.client.pool.http_adapter
+
+        assert http_adapter._pool_connections == 2
+        assert http_adapter._pool_maxsize == 20
+        assert http_adapter._pool_block is True
+        assert http_adapter.tcp_keepalive == 30
+
+    def test_setup_http_pool_maxsize_follows_pool_max_size(
+        self, config, dependency_provider
+    ):
+        config[constants.CONFIG_KEY]['POOL_MAX_SIZE'] = 50
+
+        dependency_provider.setup()
+        http_adapter = dependency_provider.client.pool.http_adapter
+
+        assert http_adapter._pool_maxsize == 50
+
+    def test_stop(self, dependency_provider):
+        dependency_provider.setup()
+        pool = dependency_provider.client.pool
+
+        with patch.object(pool, 'close') as close:
+            dependency_provider.stop()
+
+        assert close.call_count == 1
+
+    def test_setup_default_pool_options(self, config, salesforce_api):
+        pool = salesforce_api.pool
+
+        assert pool.max_size is None
+        assert pool.semaphore is None
+        assert pool.http_adapter._pool_maxsize == 10
+        assert pool.timeout == (
+            constants.DEFAULT_CONNECT_TIMEOUT, constants.DEFAULT_READ_TIMEOUT)
+        assert pool.http_adapter.tcp_keepalive is None
+        assert (
+            pool.checkout_timeout == constants.DEFAULT_POOL_CHECKOUT_TIMEOUT)
+
+    def test_setup_session_store(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'SESSION_STORE_ENABLED': True,
+            'SESSION_STORE_REDIS_URI': 'redis://localhost:6379/11',
+        })
+
+        dependency_provider.setup()
+        session_store = dependency_provider.client.pool.session_store
+
+        assert (
+            session_store.username == config[constants.CONFIG_KEY]['USERNAME'])
+
     def test_setup_main_config_key_missing(
         self, config, dependency_provider
     ):
@@ -83,13 +176,299 @@ class TestSalesforceAPIUnit:
             .format(constants.CONFIG_KEY, key))
         assert str(exc.value) == expected_error
 
+    def test_setup_session_refresh(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'SESSION_TIMEOUT': 900,
+            'SESSION_REFRESH_MARGIN': 60,
+        })
+
+        dependency_provider.setup()
+
+        assert dependency_provider.client.pool.session_refresh_after == 840
+
+    def test_start_spawns_session_refresh(
+        self, container, dependency_provider
+    ):
+        dependency_provider.setup()
+        dependency_provider.start()
+
+        pool = dependency_provider.client.pool
+        assert container.spawn_managed_thread.call_args == call(
+            pool.run_session_refresh)
+
+    def test_start_session_refresh_disabled(
+        self, config, container, dependency_provider
+    ):
+        config[constants.CONFIG_KEY]['SESSION_REFRESH_ENABLED'] = False
+
+        dependency_provider.setup()
+        dependency_provider.start()
+
+        assert dependency_provider.client.pool.session_refresh_after is None
+        assert container.spawn_managed_thread.call_count == 0
+
+    @pytest.mark.parametrize(
+        'key', ('POOL_IDLE_TIMEOUT', 'POOL_MAX_LIFETIME')
+    )
+    def test_start_spawns_reaper(
+        self, config, container, dependency_provider, key
+    ):
+        config[constants.CONFIG_KEY]['SESSION_REFRESH_ENABLED'] = False
+        config[constants.CONFIG_KEY][key] = 300
+
+        dependency_provider.setup()
+        dependency_provider.start()
+
+        pool = dependency_provider.client.pool
+        assert container.spawn_managed_thread.call_args_list == [
+            call(pool.run_reaper)]
+
+    @pytest.mark.parametrize(
+        ('min_size', 'lazy', 'prewarmed'),
+        (
+            (None, None, False),
+            (5, None, True),
+            (5, False, True),
+            (5, True, False),
+        ),
+    )
+    def test_start_prewarm(
+        self, config, dependency_provider, min_size, lazy, prewarmed
+    ):
+        if min_size is not None:
+            config[constants.CONFIG_KEY]['POOL_MIN_SIZE'] = min_size
+        if lazy is not None:
+            config[constants.CONFIG_KEY]['POOL_LAZY'] = lazy
+
+        dependency_provider.setup()
+        pool = dependency_provider.client.pool
+        with patch.object(pool, 'prewarm') as prewarm:
+            dependency_provider.start()
+
+        assert prewarm.called == prewarmed
+
     def test_get_dependency(self, config, dependency_provider):
         dependency_provider.setup()
-        worker_ctx = Mock()
+        worker_ctx = Mock(data={})
         assert (
             dependency_provider.get_dependency(worker_ctx) ==
             dependency_provider.client)
 
+    def test_get_dependency_with_deadline(self, config, dependency_provider):
+        dependency_provider.setup()
+        worker_ctx = Mock(data={constants.DEADLINE_CONTEXT_KEY: 1234.5})
+
+        salesforce_api = dependency_provider.get_dependency(worker_ctx)
+
+        assert salesforce_api.deadline == 1234.5
+        assert salesforce_api.pool is dependency_provider.client.pool
+        assert dependency_provider.client.deadline is None
+
+    def test_get_dependency_with_priority(self, config, dependency_provider):
+        dependency_provider.setup()
+        worker_ctx = Mock(data={constants.PRIORITY_CONTEXT_KEY: 'low'})
+
+        salesforce_api = dependency_provider.get_dependency(worker_ctx)
+
+        assert salesforce_api.priority == constants.Priority.low
+        assert salesforce_api.deadline is None
+        assert dependency_provider.client.priority is None
+
+    def test_setup_api_quota(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'API_QUOTA_SOFT_LIMIT': 0.7,
+            'API_QUOTA_HARD_LIMIT': 0.9,
+            'API_QUOTA_MAX_DELAY': 10,
+        })
+
+        dependency_provider.setup()
+        api_quota = dependency_provider.client.pool.api_quota
+
+        assert api_quota.soft_limit == 0.7
+        assert api_quota.hard_limit == 0.9
+        assert api_quota.max_delay == 10
+
+    def test_setup_retry_policy(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'RETRY_MAX_ATTEMPTS': 5,
+            'RETRY_BACKOFF': 2,
+            'RETRY_MAX_BACKOFF': 60,
+            'RETRY_ERROR_CODES': ['UNABLE_TO_LOCK_ROW'],
+            'RETRY_STATUSES': [503],
+            'RETRY_IDEMPOTENT_STATUSES': [504],
+        })
+
+        dependency_provider.setup()
+        retry_policy = dependency_provider.client.pool.retry_policy
+
+        assert retry_policy.max_attempts == 5
+        assert retry_policy.backoff == 2
+        assert retry_policy.max_backoff == 60
+        assert retry_policy.error_codes == {'UNABLE_TO_LOCK_ROW'}
+        assert retry_policy.statuses == {503}
+        assert retry_policy.idempotent_statuses == {504}
+
+    def test_setup_timeouts(self, config, dependency_provider):
+        config[constants.CONFIG_KEY].update({
+            'CONNECT_TIMEOUT': 2,
+            'READ_TIMEOUT': 30,
+        })
+
+        dependency_provider.setup()
+
+        assert dependency_provider.client.pool.timeout == (2, 30)
+
+    def test_setup_rate_limiter(self, config, dependency_provider):
+        dependency_provider.setup()
+        assert dependency_provider.client.pool.rate_limiter is None
+
+        config[constants.CONFIG_KEY].update({
+            'RATE_LIMIT_ENABLED': True,
+            'RATE_LIMIT_REDIS_URI': 'redis://localhost:6379/11',
+            'RATE_LIMIT_RATE': 10,
+        })
+        dependency_provider.setup()
+        rate_limiter = dependency_provider.client.pool.rate_limiter
+
+        assert rate_limiter.service_name == 'exampleservice'
+        assert rate_limiter.rate == 10
+
+    def test_setup_concurrency_limiter(self, config, dependency_provider):
+        dependency_provider.setup()
+        assert dependency_provider.client.pool.concurrency_limiter is None
+
+        config[constants.CONFIG_KEY].update({
+            'CONCURRENCY_LIMIT_ENABLED': True,
+            'CONCURRENCY_LIMIT_INITIAL': 5,
+        })
+        dependency_provider.setup()
+        limiter = dependency_provider.client.pool.concurrency_limiter
+
+        assert limiter.limit == 5
+
+    def test_setup_circuit_breakers(self, config, dependency_provider):
+        dependency_provider.setup()
+        assert dependency_provider.client.pool.circuit_breakers is None
+
+        config[constants.CONFIG_KEY].update({
+            'CIRCUIT_BREAKER_ENABLED': True,
+            'CIRCUIT_BREAKER_FAILURE_THRESHOLD': 3,
+        })
+        dependency_provider.setup()
+        circuit_breakers = dependency_provider.client.pool.circuit_breakers
+
+        assert circuit_breakers.failure_threshold == 3
+
+    def test_setup_query_cache(self, config, dependency_provider):
+        dependency_provider.setup()
+        assert dependency_provider.client.pool.query_cache is None
+
+        config[constants.CONFIG_KEY].update({
+            'QUERY_CACHE_ENABLED': True,
+            'QUERY_CACHE_MAX_SIZE': 10,
+        })
+        dependency_provider.setup()
+        query_cache = dependency_provider.client.pool.query_cache
+
+        assert query_cache.results.maxsize == 10
+
+    def test_sobject_notifications_invalidate_query_cache(
+        self, dependency_provider
+    ):
+        dependency_provider.setup()
+        pool = dependency_provider.client.pool
+        pool.query_cache = Mock()
+
+        dependency_provider.worker_setup(
+            Mock(entrypoint=Mock(sobject_type='Contact')))
+        dependency_provider.worker_setup(Mock(entrypoint=Mock(spec=[])))
+
+        assert pool.query_cache.invalidate.call_args_list == [call('Contact')]
+
+    def test_memoize(self, container):
+        dependency_provider = SalesforceAPI(memoize=True).bind(
+            container, 'salesforce_api')
+        dependency_provider.setup()
+        worker_ctx = Mock(data={})
+
+        memo = dependency_provider.get_dependency(worker_ctx)
+        assert isinstance(memo, Memo)
+        assert memo is not dependency_provider.get_dependency(Mock(data={}))
+
+    def test_memoize_with_unit_of_work(self, container):
+        dependency_provider = SalesforceAPI(
+            memoize=True, unit_of_work=True
+        ).bind(container, 'salesforce_api')
+        dependency_provider.setup()
+
+        unit_of_work = dependency_provider.get_dependency(Mock(data={}))
+
+        assert isinstance(unit_of_work.client, Memo)
+
+    def test_unit_of_work(self, container):
+        dependency_provider = SalesforceAPI(unit_of_work=True).bind(
+            container, 'salesforce_api')
+        dependency_provider.setup()
+        worker_ctx = Mock(data={})
+
+        unit_of_work = dependency_provider.get_dependency(worker_ctx)
+        assert isinstance(unit_of_work, UnitOfWork)
+        assert unit_of_work.all_or_none is True
+
+        with patch.object(unit_of_work, 'flush') as flush:
+            dependency_provider.worker_result(worker_ctx, result='ok')
+            dependency_provider.worker_teardown(worker_ctx)
+
+        assert flush.call_count == 1
+        assert dependency_provider.units_of_work == {}
+
+    def test_unit_of_work_discarded_on_error(self, container):
+        dependency_provider = SalesforceAPI(unit_of_work=True).bind(
+            container, 'salesforce_api')
+        dependency_provider.setup()
+        worker_ctx = Mock(data={})
+        unit_of_work = dependency_provider.get_dependency(worker_ctx)
+        unit_of_work.Contact.create({})
+
+        dependency_provider.worker_result(
+            worker_ctx, exc_info=(ValueError, ValueError(), None))
+        with patch.object(Composite, 'execute') as execute:
+            dependency_provider.worker_teardown(worker_ctx)
+
+        assert execute.call_count == 0
+
+    def test_unit_of_work_flush_failure_is_logged(self, container):
+        dependency_provider = SalesforceAPI(
+            unit_of_work=True, all_or_none=False
+        ).bind(container, 'salesforce_api')
+        dependency_provider.setup()
+        worker_ctx = Mock(data={})
+        unit_of_work = dependency_provider.get_dependency(worker_ctx)
+        assert unit_of_work.all_or_none is False
+
+        with patch.object(unit_of_work, 'flush', side_effect=ValueError):
+            with patch('nameko_salesforce.api.dependency.logger') as logger:
+                dependency_provider.worker_teardown(worker_ctx)
+
+        assert logger.exception.call_count == 1
+
+    def test_teardown_without_unit_of_work(self, dependency_provider):
+        dependency_provider.setup()
+        worker_ctx = Mock(data={})
+        dependency_provider.get_dependency(worker_ctx)
+
+        dependency_provider.worker_result(worker_ctx)
+        dependency_provider.worker_teardown(worker_ctx)
+
+    def test_setup_metrics(self, container):
+        metrics = Metrics()
+        dependency_provider = SalesforceAPI(metrics=metrics).bind(
+            container, 'salesforce_api')
+
+        dependency_provider.setup()
+
+        assert dependency_provider.client.pool.metrics is metrics
+
 
 class TestSalesforceAPIEndToEnd:
 
@@ -100,7 +479,9 @@ class TestSalesforceAPIEndToEnd:
 
     @pytest.fixture(autouse=True)
     def mock_salesforce_login(self):
-        with patch('simple_salesforce.api.SalesforceLogin') as SalesforceLogin:
+        with patch(
+            'nameko_salesforce.api.client.SalesforceLogin'
+        ) as SalesforceLogin:
             SalesforceLogin.return_value = 'session_id', 'abc.salesforce.com'
             yield
 
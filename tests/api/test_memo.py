@@ -0,0 +1,152 @@
+from mock import Mock, patch
+import pytest
+import requests_mock
+
+from nameko_salesforce.api.client import get_client
+from nameko_salesforce.api.memo import freeze, Memo
+
+
+@pytest.fixture(autouse=True)
+def mock_salesforce_login():
+    with patch(
+        'nameko_salesforce.api.client.SalesforceLogin'
+    ) as SalesforceLogin:
+        SalesforceLogin.return_value = 'session_id', 'abc.salesforce.com'
+        yield SalesforceLogin
+
+
+@pytest.fixture
+def server():
+    with requests_mock.Mocker() as mocked_requests:
+        mocked_requests.get(
+            requests_mock.ANY, json={'done': True, 'records': [], 'Id': '1'})
+        mocked_requests.patch(requests_mock.ANY, status_code=204)
+        mocked_requests.post(requests_mock.ANY, json=[{'Id': '1'}])
+        yield mocked_requests
+
+
+@pytest.fixture
+def memo(config):
+    client = get_client(
+        username=config['SALESFORCE']['USERNAME'],
+        password=config['SALESFORCE']['PASSWORD'],
+        security_token=config['SALESFORCE']['SECURITY_TOKEN'],
+        sandbox=config['SALESFORCE']['SANDBOX'],
+        api_version='42.0',
+    )
+    return Memo(client)
+
+
+def test_freeze():
+    assert freeze({'b': [1, {2}], 'a': {'c': None}}) == (
+        ('a', (('c', None),)), ('b', (1, frozenset({2}))))
+    assert hash(freeze(((), {'ids': ['1', '2']})))
+
+
+def test_identical_reads_are_memoized(memo, server):
+    first = memo.query('SELECT Id FROM Account')
+    first['records'].append({'Id': '2'})
+
+    assert memo.query('SELECT Id FROM Account') == {
+        'done': True, 'records': [], 'Id': '1'}
+    memo.query('SELECT Id FROM Contact')
+    memo.Account.get('1')
+    memo.Account.get('1')
+    memo.Account.get('2')
+    memo.Contact.get('1')
+
+    assert server.call_count == 5
+
+
+def test_reads_with_unhashable_arguments(memo, server):
+    memo.fetch_many('Account', ['1'], ['Id'])
+    memo.fetch_many('Account', ['1'], ['Id'])
+
+    assert server.call_count == 1
+
+
+def test_reads_with_unhashable_arguments_are_not_memoized():
+    client = Mock()
+    memo = Memo(client)
+
+    memo.query(bytearray(b'SELECT Id FROM Account'))
+    memo.query(bytearray(b'SELECT Id FROM Account'))
+
+    assert client.query.call_count == 2
+
+
+def test_writes_drop_memoized_results(memo, server):
+    memo.Account.get('1')
+    memo.Account.update('1', {'Name': 'Acme'})
+    memo.Account.get('1')
+
+    assert server.call_count == 3
+
+
+@pytest.mark.parametrize('replace', [
+    lambda memo: memo.with_timeout(5),
+    lambda memo: memo.with_deadline(None),
+    lambda memo: memo.with_priority('low'),
+])
+def test_copies_share_memoized_results(memo, server, replace):
+    memo.Account.get('1')
+    copy = replace(memo)
+    assert isinstance(copy, Memo)
+
+    copy.Account.get('1')
+    assert server.call_count == 1
+
+    copy.Account.update('1', {'Name': 'Acme'})
+    memo.Account.get('1')
+    assert server.call_count == 3
+
+
+def test_other_calls_are_not_memoized(memo, server):
+    memo.limits()
+    memo.limits()
+
+    assert server.call_count == 2
+    assert memo.pool is memo.client.pool
+
+
+@pytest.mark.parametrize('call, drops', [
+    (lambda memo: memo.restful('sobjects/Account/1'), False),
+    (lambda memo: memo.restful('sobjects/Account/1', None, 'GET'), False),
+    (lambda memo: memo.restful('sobjects/', method='POST', json={}), True),
+    (lambda memo: memo.restful('sobjects/', None, 'post', json={}), True),
+    (lambda memo: memo.apexecute('Orders', 'POST', data={}), True),
+])
+def test_requests_of_other_methods_drop_memoized_results(
+    memo, server, call, drops
+):
+    memo.Account.get('1')
+    call(memo)
+    memo.Account.get('1')
+
+    assert server.call_count == (3 if drops else 2)
+
+
+def test_composite_writes_drop_memoized_results(memo, server):
+    server.post(requests_mock.ANY, json={'compositeResponse': [
+        {'referenceId': 'ref1', 'httpStatusCode': 204, 'body': None},
+    ]})
+    memo.Account.get('1')
+
+    composite = memo.composite()
+    composite.Account.update('1', {'Name': 'Acme'})
+    composite.execute()
+    memo.Account.get('1')
+
+    assert server.call_count == 3
+
+
+def test_bulk_ingest_drops_memoized_results(memo, server):
+    server.post(requests_mock.ANY, json={'id': '750A', 'state': 'Open'})
+    server.put(requests_mock.ANY, status_code=201)
+    server.patch(requests_mock.ANY, json={'id': '750A', 'state': 'Open'})
+    memo.Account.get('1')
+
+    memo.bulk2.create_ingest_job('Account', 'insert').close()
+    memo.Account.get('1')
+
+    assert server.call_count == 4
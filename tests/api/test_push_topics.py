@@ -31,7 +31,9 @@ def mock_salesforce_server():
 
 @pytest.fixture(autouse=True)
 def mock_salesforce_login():
-    with patch('simple_salesforce.api.SalesforceLogin') as SalesforceLogin:
+    with patch(
+        'nameko_salesforce.api.client.SalesforceLogin'
+    ) as SalesforceLogin:
         SalesforceLogin.return_value = 'session_id', 'abc.salesforce.com'
         yield
 
@@ -40,6 +42,15 @@ def test_implements_client_proxy(client):
     assert isinstance(client, ClientProxy)
 
 
+def test_with_timeout(client):
+    client_with_timeout = client.with_timeout(5)
+
+    assert isinstance(client_with_timeout, PushTopicsAPIClient)
+    assert client_with_timeout.timeout == 5
+    assert client_with_timeout.pool is client.pool
+    assert client_with_timeout.cache is client.cache
+
+
 def test_get_push_topic_by_name_not_found(
     api_version, client, mock_salesforce_server
 ):
@@ -0,0 +1,102 @@
+from mock import Mock
+import pytest
+
+from nameko_salesforce import constants
+from nameko_salesforce.api.query_cache import (
+    get_query_cache,
+    get_tags,
+    QueryCache,
+)
+
+
+SOQL = 'SELECT Id, (SELECT Id FROM Contacts) FROM Account'
+
+
+def test_get_tags():
+    assert get_tags(SOQL) == {'contacts', 'account'}
+    assert get_tags('select Id from RecordType') == {'recordtype'}
+
+
+class TestGetQueryCache:
+
+    def test_disabled_by_default(self, config):
+        assert get_query_cache(config['SALESFORCE']) is None
+
+    def test_enabled(self, config):
+        config['SALESFORCE'].update({
+            'QUERY_CACHE_ENABLED': True,
+            'QUERY_CACHE_TTL': 10,
+        })
+
+        cache = get_query_cache(config['SALESFORCE'])
+
+        assert cache.results.ttl == 10
+        assert cache.results.maxsize == constants.DEFAULT_QUERY_CACHE_MAX_SIZE
+
+
+class TestQueryCache:
+
+    @pytest.fixture
+    def now(self):
+        return [0]
+
+    @pytest.fixture
+    def cache(self, now):
+        return QueryCache(max_size=2, ttl=60, timer=lambda: now[0])
+
+    @pytest.fixture
+    def call(self):
+        return Mock(return_value={'done': True, 'records': [{'Id': '1'}]})
+
+    def test_read_through(self, cache, call):
+        result = cache.get_or_call('key', SOQL, call)
+        result['records'].append({'Id': '2'})
+
+        assert cache.get_or_call('key', SOQL, call) == {
+            'done': True, 'records': [{'Id': '1'}]}
+        assert call.call_count == 1
+
+    def test_ttl(self, cache, call, now):
+        cache.get_or_call('key', SOQL, call)
+        now[0] = 61
+        cache.get_or_call('key', SOQL, call)
+
+        assert call.call_count == 2
+
+    def test_max_size(self, cache, call):
+        for key in ('a', 'b', 'a', 'c', 'a', 'b'):
+            cache.get_or_call(key, SOQL, call)
+
+        # b was evicted as least recently used
+        assert call.call_count == 4
+
+    def test_invalidate(self, cache, call):
+        cache.get_or_call('account', SOQL, call)
+        cache.get_or_call('user', 'SELECT Id FROM User', call)
+
+        cache.invalidate('Account')
+        cache.get_or_call('account', SOQL, call)
+        cache.get_or_call('user', 'SELECT Id FROM User', call)
+
+        assert call.call_count == 3
+
+    def test_invalidated_while_in_flight(self, cache):
+
+        def call():
+            cache.invalidate('Account')
+            return {'done': True, 'records': []}
+
+        cache.get_or_call('key', SOQL, call)
+
+        assert 'key' not in cache.results
+
+    def test_unfinished_results_are_not_cached(self, cache):
+        cache.get_or_call('key', SOQL, lambda: {'done': False})
+
+        assert 'key' not in cache.results
+
+    def test_tags_of_evicted_results_are_pruned(self, cache, call):
+        for key in range(10):
+            cache.get_or_call(key, SOQL, call)
+
+        assert len(cache.tags['account']) <= 3
@@ -0,0 +1,92 @@
+from mock import Mock
+import pytest
+
+from nameko_salesforce.api.quota import (
+    ApiQuota,
+    ApiQuotaExceeded,
+    get_api_usage,
+)
+from nameko_salesforce.constants import Priority
+
+
+def make_response(headers):
+    return Mock(headers=headers)
+
+
+@pytest.mark.parametrize('headers,expected', [
+    ({'Sforce-Limit-Info': 'api-usage=25/5000'}, (25, 5000)),
+    ({'Sforce-Limit-Info': 'per-app-api-usage=1/10, api-usage=3/50'}, (3, 50)),
+    ({'Sforce-Limit-Info': 'garbage'}, None),
+    ({}, None),
+])
+def test_get_api_usage(headers, expected):
+    assert get_api_usage(make_response(headers)) == expected
+
+
+def test_get_api_usage_without_response():
+    assert get_api_usage(None) is None
+
+
+def test_update():
+    quota = ApiQuota()
+    assert quota.usage is None
+
+    quota.update(make_response({'Sforce-Limit-Info': 'api-usage=10/40'}))
+    quota.update(make_response({}))
+    quota.update(None)
+
+    assert quota.used == 10
+    assert quota.limit == 40
+    assert quota.usage == 0.25
+
+
+@pytest.fixture
+def quota():
+    return ApiQuota(soft_limit=0.5, hard_limit=0.9, max_delay=4)
+
+
+def set_usage(quota, used):
+    quota.update(
+        make_response({'Sforce-Limit-Info': 'api-usage={}/100'.format(used)}))
+
+
+def test_unknown_usage_is_not_held_back(quota):
+    assert quota.get_delay(Priority.low) == 0
+
+
+@pytest.mark.parametrize('used,delay', [
+    (10, 0),
+    (50, 0),
+    (70, 2),
+    (89, 3.9),
+])
+def test_low_priority_is_slowed_down(quota, used, delay):
+    set_usage(quota, used)
+    assert quota.get_delay(Priority.low) == pytest.approx(delay)
+
+
+def test_low_priority_is_rejected(quota):
+    set_usage(quota, 90)
+    with pytest.raises(ApiQuotaExceeded):
+        quota.get_delay('low')
+
+
+def test_normal_priority_always_goes_through(quota):
+    set_usage(quota, 99)
+    assert quota.get_delay() == 0
+    assert quota.get_delay(Priority.normal) == 0
+
+
+def test_soft_limit_only():
+    quota = ApiQuota(soft_limit=0.5, max_delay=4)
+    set_usage(quota, 99)
+    assert quota.get_delay(Priority.low) == 4
+
+
+def test_hard_limit_only():
+    quota = ApiQuota(hard_limit=0.5)
+    set_usage(quota, 49)
+    assert quota.get_delay(Priority.low) == 0
+    set_usage(quota, 50)
+    with pytest.raises(ApiQuotaExceeded):
+        quota.get_delay(Priority.low)
@@ -0,0 +1,179 @@
+from email.utils import formatdate
+import time
+
+from mock import Mock, patch
+import pytest
+import requests
+from simple_salesforce import (
+    SalesforceExpiredSession,
+    SalesforceGeneralError,
+    SalesforceMalformedRequest,
+    SalesforceRefusedRequest,
+)
+from urllib3.exceptions import (
+    MaxRetryError,
+    NewConnectionError,
+    ProtocolError,
+)
+
+from nameko_salesforce.api.retries import (
+    get_error_codes,
+    get_retry_after,
+    RetryPolicy,
+)
+
+
+def salesforce_error(exc_cls, status, error_code):
+    content = [{'errorCode': error_code, 'message': 'Oops'}]
+    return exc_cls('https://abc.salesforce.com', status, 'Contact', content)
+
+
+@pytest.fixture
+def retry_policy():
+    return RetryPolicy(max_attempts=3, backoff=1, max_backoff=10)
+
+
+def response(headers):
+    return Mock(headers=headers)
+
+
+class TestGetErrorCodes:
+
+    def test_error_codes(self):
+        exc = salesforce_error(
+            SalesforceRefusedRequest, 403, 'REQUEST_LIMIT_EXCEEDED')
+        assert get_error_codes(exc) == {'REQUEST_LIMIT_EXCEEDED'}
+
+    @pytest.mark.parametrize('content', ('Not found', None, ['Oops']))
+    def test_no_error_codes(self, content):
+        exc = SalesforceGeneralError('url', 500, 'Contact', content)
+        assert get_error_codes(exc) == set()
+
+
+class TestGetRetryAfter:
+
+    def test_no_response(self):
+        assert get_retry_after(None) is None
+
+    def test_no_header(self):
+        assert get_retry_after(response({})) is None
+
+    def test_seconds(self):
+        assert get_retry_after(response({'Retry-After': '5'})) == 5
+
+    def test_date(self):
+        date = formatdate(time.time() + 60, usegmt=True)
+        retry_after = get_retry_after(response({'Retry-After': date}))
+        assert 55 < retry_after <= 60
+
+    def test_date_in_past(self):
+        date = formatdate(time.time() - 60, usegmt=True)
+        assert get_retry_after(response({'Retry-After': date})) == 0
+
+    def test_invalid(self):
+        assert get_retry_after(response({'Retry-After': 'soon'})) is None
+
+
+class TestRetryPolicy:
+
+    @pytest.mark.parametrize(
+        ('exc', 'operation'),
+        (
+            (salesforce_error(
+                SalesforceRefusedRequest, 403, 'REQUEST_LIMIT_EXCEEDED'),
+             'create'),
+            (salesforce_error(
+                SalesforceGeneralError, 503, 'SERVER_UNAVAILABLE'),
+             'create'),
+            (salesforce_error(
+                SalesforceMalformedRequest, 400, 'UNABLE_TO_LOCK_ROW'),
+             'update'),
+            (SalesforceGeneralError('url', 503, 'Contact', 'Unavailable'),
+             'create'),
+            (SalesforceGeneralError('url', 502, 'Contact', 'Bad Gateway'),
+             'get'),
+            (SalesforceGeneralError('url', 504, 'Contact', 'Timeout'),
+             'update'),
+            (requests.exceptions.ConnectTimeout(), 'create'),
+            (
+                requests.exceptions.ConnectionError(MaxRetryError(
+                    None, 'url', NewConnectionError(None, 'refused'))),
+                'create',
+            ),
+            (requests.exceptions.ConnectionError(), 'query'),
+            (requests.exceptions.ReadTimeout(), 'get'),
+        ),
+    )
+    def test_retriable(self, retry_policy, exc, operation):
+        assert retry_policy.is_retriable(exc, operation)
+
+    @pytest.mark.parametrize(
+        ('exc', 'operation'),
+        (
+            (salesforce_error(
+                SalesforceMalformedRequest, 400, 'INVALID_FIELD'),
+             'query'),
+            (salesforce_error(
+                SalesforceExpiredSession, 401, 'INVALID_SESSION_ID'),
+             'query'),
+            (SalesforceGeneralError('url', 500, 'Contact', 'Oops'), 'query'),
+            (SalesforceGeneralError('url', 502, 'Contact', 'Bad Gateway'),
+             'create'),
+            (SalesforceGeneralError('url', 504, 'Contact', 'Timeout'),
+             'composite'),
+            (SalesforceGeneralError('url', 504, 'Contact', 'Timeout'),
+             'bulk2_create_job'),
+            (requests.exceptions.ConnectionError(), 'create'),
+            (
+                requests.exceptions.ConnectionError(MaxRetryError(
+                    None, 'url', ProtocolError('reset'))),
+                'create',
+            ),
+            (requests.exceptions.ReadTimeout(), 'create'),
+            (ValueError(), 'query'),
+        ),
+    )
+    def test_not_retriable(self, retry_policy, exc, operation):
+        assert not retry_policy.is_retriable(exc, operation)
+
+    def test_custom_error_codes(self):
+        retry_policy = RetryPolicy(error_codes=['INVALID_FIELD'])
+        exc = salesforce_error(
+            SalesforceMalformedRequest, 400, 'INVALID_FIELD')
+        assert retry_policy.is_retriable(exc, 'query')
+
+    @pytest.mark.parametrize(
+        ('attempt', 'max_delay'), ((1, 1), (2, 2), (3, 4), (5, 10))
+    )
+    def test_backoff_with_jitter(self, attempt, max_delay):
+        retry_policy = RetryPolicy(max_attempts=10, backoff=1, max_backoff=10)
+        exc = requests.exceptions.ConnectTimeout()
+
+        with patch('nameko_salesforce.api.retries.random.uniform') as uniform:
+            uniform.return_value = 0.5
+            assert retry_policy.get_delay(attempt, exc, 'create') == 0.5
+
+        assert uniform.call_args[0] == (0, max_delay)
+
+    def test_retry_after(self, retry_policy):
+        exc = SalesforceGeneralError('url', 503, 'Contact', 'Unavailable')
+
+        assert retry_policy.get_delay(
+            1, exc, 'create', response=response({'Retry-After': '3'})) == 3
+        assert retry_policy.get_delay(
+            1, exc, 'create', response=response({'Retry-After': '10'})) == 10
+
+    def test_retry_after_longer_than_max_backoff(self, retry_policy):
+        exc = SalesforceGeneralError('url', 503, 'Contact', 'Unavailable')
+
+        assert retry_policy.get_delay(
+            1, exc, 'create', response=response({'Retry-After': '60'})) is None
+
+    def test_max_attempts(self, retry_policy):
+        exc = requests.exceptions.ConnectTimeout()
+
+        assert retry_policy.get_delay(2, exc, 'create') is not None
+        assert retry_policy.get_delay(3, exc, 'create') is None
+
+    def test_not_retriable_delay(self, retry_policy):
+        assert retry_policy.get_delay(1, ValueError(), 'create') is None
@@ -0,0 +1,44 @@
+from nameko_salesforce.api.sobject_collections import (
+    chunk,
+    make_body,
+    make_delete_params,
+    make_retrieve_body,
+    MAX_RECORDS,
+)
+
+
+def test_chunk():
+    assert chunk(iter(range(5)), size=2) == [[0, 1], [2, 3], [4]]
+    assert chunk([]) == []
+    assert len(chunk(range(401))) == 3
+    assert len(chunk(range(400))[1]) == MAX_RECORDS
+
+
+def test_make_body():
+    records = [
+        {'LastName': 'Smith'},
+        {'attributes': {'type': 'Lead'}, 'LastName': 'Jones'},
+    ]
+
+    body = make_body('Contact', records, all_or_none=True)
+
+    assert body == {
+        'allOrNone': True,
+        'records': [
+            {'attributes': {'type': 'Contact'}, 'LastName': 'Smith'},
+            {'attributes': {'type': 'Lead'}, 'LastName': 'Jones'},
+        ],
+    }
+    assert 'attributes' not in records[0]
+
+
+def test_make_delete_params():
+    assert make_delete_params(['1', '2'], all_or_none=False) == {
+        'ids': '1,2', 'allOrNone': 'false'}
+    assert make_delete_params(['1'], all_or_none=True) == {
+        'ids': '1', 'allOrNone': 'true'}
+
+
+def test_make_retrieve_body():
+    assert make_retrieve_body(['1', '2'], ('Id', 'Name')) == {
+        'ids': ['1', '2'], 'fields': ['Id', 'Name']}
@@ -0,0 +1,179 @@
+from mock import patch
+import pytest
+import requests_mock
+
+from nameko_salesforce.api.client import get_client
+from nameko_salesforce.api.composite import CompositeError, MAX_SUBREQUESTS
+from nameko_salesforce.api.unit_of_work import UnitOfWork
+
+
+@pytest.fixture(autouse=True)
+def mock_salesforce_login():
+    with patch(
+        'nameko_salesforce.api.client.SalesforceLogin'
+    ) as SalesforceLogin:
+        SalesforceLogin.return_value = 'session_id', 'abc.salesforce.com'
+        yield SalesforceLogin
+
+
+@pytest.fixture
+def mock_salesforce_server():
+    with requests_mock.Mocker() as mocked_requests:
+        yield mocked_requests
+
+
+@pytest.fixture
+def unit_of_work(config):
+    client = get_client(
+        username=config['SALESFORCE']['USERNAME'],
+        password=config['SALESFORCE']['PASSWORD'],
+        security_token=config['SALESFORCE']['SECURITY_TOKEN'],
+        sandbox=config['SALESFORCE']['SANDBOX'],
+        api_version='42.0',
+    )
+    return UnitOfWork(client)
+
+
+def respond(request, context):
+    return {'compositeResponse': [
+        {
+            'body': {'id': 'ID-{}'.format(subrequest['referenceId'])},
+            'httpHeaders': {},
+            'httpStatusCode': 201,
+            'referenceId': subrequest['referenceId'],
+        }
+        for subrequest in request.json()['compositeRequest']
+    ]}
+
+
+def test_writes_are_buffered(unit_of_work, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json=respond)
+
+    account = unit_of_work.Account.create({'Name': 'Acme'})
+    contact = unit_of_work.Contact.create(
+        {'LastName': 'Smith', 'AccountId': account.id})
+    unit_of_work.Contact.update('003A', {'Email': 'a@b.c'})
+    unit_of_work.Contact.upsert('Ext__c/1', {'LastName': 'Jones'})
+    unit_of_work.Lead.delete('00QA')
+
+    assert mock_salesforce_server.call_count == 0
+
+    references = unit_of_work.flush()
+
+    assert references[:2] == [account, contact]
+    assert contact.record_id == 'ID-ref2'
+    assert mock_salesforce_server.call_count == 1
+    request = mock_salesforce_server.request_history[0]
+    assert request.path == '/services/data/v42.0/composite'
+    body = request.json()
+    assert body['allOrNone'] is True
+    assert [
+        (subrequest['method'], subrequest['url'])
+        for subrequest in body['compositeRequest']
+    ] == [
+        ('POST', '/services/data/v42.0/sobjects/Account/'),
+        ('POST', '/services/data/v42.0/sobjects/Contact/'),
+        ('PATCH', '/services/data/v42.0/sobjects/Contact/003A'),
+        ('PATCH', '/services/data/v42.0/sobjects/Contact/Ext__c/1'),
+        ('DELETE', '/services/data/v42.0/sobjects/Lead/00QA'),
+    ]
+    assert body['compositeRequest'][1]['body'] == {
+        'LastName': 'Smith', 'AccountId': '@{ref1.id}'}
+
+    # nothing left to flush
+    assert unit_of_work.flush() == []
+    assert mock_salesforce_server.call_count == 1
+
+
+def test_reads_go_through(unit_of_work, mock_salesforce_server):
+    mock_salesforce_server.get(
+        requests_mock.ANY, json={'Id': '003A', 'totalSize': 0})
+
+    assert unit_of_work.Contact.get('003A')['Id'] == '003A'
+    assert unit_of_work.query('SELECT Id FROM Contact')['totalSize'] == 0
+    assert mock_salesforce_server.call_count == 2
+
+
+def test_flush_failure(unit_of_work, mock_salesforce_server):
+    mock_salesforce_server.post(requests_mock.ANY, json={
+        'compositeResponse': [{
+            'body': [{'errorCode': 'REQUIRED_FIELD_MISSING'}],
+            'httpHeaders': {},
+            'httpStatusCode': 400,
+            'referenceId': 'ref1',
+        }]
+    })
+
+    unit_of_work.Account.create({})
+
+    with pytest.raises(CompositeError) as exc:
+        unit_of_work.flush()
+
+    assert exc.value.failed[0].status == 400
+
+
+def test_discard(unit_of_work, mock_salesforce_server):
+    unit_of_work.Account.create({})
+
+    unit_of_work.discard()
+
+    assert unit_of_work.flush() == []
+    assert mock_salesforce_server.call_count == 0
+
+
+@pytest.mark.parametrize('replace', [
+    lambda unit_of_work: unit_of_work.with_timeout(5),
+    lambda unit_of_work: unit_of_work.with_deadline(None),
+    lambda unit_of_work: unit_of_work.with_priority('low').with_timeout(5),
+])
+def test_copies_share_buffered_writes(
+    unit_of_work, mock_salesforce_server, replace
+):
+    mock_salesforce_server.post(requests_mock.ANY, json=respond)
+    mock_salesforce_server.get(requests_mock.ANY, json={'Id': '003A'})
+    copy = replace(unit_of_work)
+
+    account = unit_of_work.Account.create({'Name': 'Acme'})
+    contact = copy.Contact.create({'AccountId': account.id})
+    assert copy.all_or_none is True
+    assert copy.Contact.get('003A') == {'Id': '003A'}
+    assert mock_salesforce_server.call_count == 1  # only the read
+
+    assert copy.flush() == [account, contact]
+    assert mock_salesforce_server.call_count == 2
+    assert unit_of_work.flush() == []
+
+    copy.Account.create({})
+    copy.discard()
+    assert unit_of_work.flush() == []
+
+
+def test_all_or_none_limits_buffered_writes(
+    unit_of_work, mock_salesforce_server
+):
+    mock_salesforce_server.post(requests_mock.ANY, json=respond)
+    for _ in range(MAX_SUBREQUESTS):
+        unit_of_work.Account.create({})
+
+    with pytest.raises(ValueError):
+        unit_of_work.Account.create({})
+
+    assert len(unit_of_work.flush()) == MAX_SUBREQUESTS
+    assert mock_salesforce_server.call_count == 1
+
+    # writes can be buffered again after a flush
+    unit_of_work.Account.create({})
+
+
+def test_writes_beyond_a_request_without_all_or_none(
+    unit_of_work, mock_salesforce_server
+):
+    mock_salesforce_server.post(requests_mock.ANY, json=respond)
+    unit_of_work = UnitOfWork(unit_of_work.client, all_or_none=False)
+    for _ in range(MAX_SUBREQUESTS + 1):
+        unit_of_work.Account.create({})
+
+    assert len(unit_of_work.flush()) == MAX_SUBREQUESTS + 1
+    assert mock_salesforce_server.call_count == 2
+    body = mock_salesforce_server.request_history[0].json()
+    assert body['allOrNone'] is False
@@ -1,4 +1,5 @@
 import pytest
+import redis
 
 
 @pytest.fixture
@@ -12,3 +13,15 @@ def config():
         'API_VERSION': '37.0',
     }
     return config
+
+
+@pytest.fixture
+def redis_uri():
+    return 'redis://localhost:6379/11'
+
+
+@pytest.yield_fixture
+def redis_client(redis_uri):
+    client = redis.StrictRedis.from_url(redis_uri)
+    yield client
+    client.flushdb()
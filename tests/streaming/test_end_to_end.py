@@ -274,7 +274,9 @@ def salesforce_api_server(salesforce_server_uri):
     PushTopic declaration scenario.
 
     """
-    with patch('simple_salesforce.api.SalesforceLogin') as SalesforceLogin:
+    with patch(
+        'nameko_salesforce.api.client.SalesforceLogin'
+    ) as SalesforceLogin:
         SalesforceLogin.return_value = 'session', 'abc.salesforce.com'
         with requests_mock.Mocker() as mocked_requests:
             yield mocked_requests
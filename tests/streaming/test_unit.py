@@ -163,6 +163,63 @@ class TestStreamingClientAuthentication:
             )
         )
 
+    def test_access_token_age(self, client, login):
+
+        assert client.get_access_token_age() is None
+
+        client.login()
+
+        assert 0 <= client.get_access_token_age() < 1
+
+    def test_run_session_refresh(self, client, container):
+        container.spawn_managed_thread = Mock()
+
+        with patch(
+            'nameko_salesforce.streaming.client.BayeuxClient.start'
+        ):
+            client.start()
+
+        assert container.spawn_managed_thread.call_args == call(
+            client.run_session_refresh)
+
+        with patch(
+            'nameko_salesforce.streaming.client.refresh_session_periodically'
+        ) as refresh_session_periodically:
+            client.run_session_refresh()
+
+        assert refresh_session_periodically.call_args == call(
+            client.login, client.get_access_token_age,
+            client.session_refresh_after)
+
+    def test_run_session_refresh_disabled(self, client, container, config):
+        config['SALESFORCE']['SESSION_REFRESH_ENABLED'] = False
+        client.setup()
+        container.spawn_managed_thread = Mock()
+
+        with patch(
+            'nameko_salesforce.streaming.client.BayeuxClient.start'
+        ):
+            client.start()
+
+        assert container.spawn_managed_thread.call_count == 0
+
+    def test_login_session_store(self, access_token, client, login):
+        client.session_store = Mock()
+        client.session_store.login.return_value = (
+            'stored_token', 'other.salesforce.server')
+        client.access_token = 'expired_token'
+
+        client.login()
+
+        assert client.access_token == 'stored_token'
+        assert (
+            client.server_uri ==
+            'https://other.salesforce.server/cometd/37.0'
+        )
+        assert client.session_store.login.call_args == call(
+            client._login, expired_session_id='expired_token')
+        assert login.call_count == 0
+
     def test_get_authorisation(self, client, access_token):
         client.access_token = access_token
         assert client.get_authorisation() == ('Bearer', access_token)
@@ -0,0 +1,64 @@
+from nameko_salesforce.metrics import Metrics, PrometheusMetrics
+
+
+def test_metrics_hook_does_nothing():
+    metrics = Metrics()
+
+    metrics.increment('foo')
+    metrics.set_gauge('bar', 1)
+    metrics.observe('baz', 0.1, label='value')
+
+
+def test_prometheus_counters_and_gauges():
+    metrics = PrometheusMetrics()
+
+    metrics.increment('requests_total', operation='get')
+    metrics.increment('requests_total', 2, operation='get')
+    metrics.increment('requests_total', operation='create')
+    metrics.set_gauge('busy_clients', 3)
+    metrics.set_gauge('busy_clients', 1)
+
+    assert metrics.export() == (
+        '# TYPE requests_total counter\n'
+        'requests_total{operation="create"} 1\n'
+        'requests_total{operation="get"} 3\n'
+        '# TYPE busy_clients gauge\n'
+        'busy_clients 1\n'
+    )
+
+
+def test_prometheus_histogram():
+    metrics = PrometheusMetrics(buckets=(1.0, 0.5))
+
+    metrics.observe('wait_seconds', 0.2)
+    metrics.observe('wait_seconds', 0.7)
+    metrics.observe('wait_seconds', 2)
+
+    assert metrics.export() == (
+        '# TYPE wait_seconds histogram\n'
+        'wait_seconds_bucket{le="0.5"} 1\n'
+        'wait_seconds_bucket{le="1"} 2\n'
+        'wait_seconds_bucket{le="+Inf"} 3\n'
+        'wait_seconds_sum 2.9\n'
+        'wait_seconds_count 3\n'
+    )
+
+
+def test_prometheus_label_values_are_escaped():
+    metrics = PrometheusMetrics()
+
+    metrics.increment('errors_total', message='say "hi"\\\n')
+
+    assert metrics.export().splitlines()[1] == (
+        'errors_total{message="say \\"hi\\"\\\\\\n"} 1')
+
+
+def test_prometheus_histogram_buckets_per_metric():
+    metrics = PrometheusMetrics(
+        buckets=(1,), histogram_buckets={'size_bytes': (100, 10)})
+
+    metrics.observe('size_bytes', 50)
+    metrics.observe('wait_seconds', 0.5)
+
+    assert metrics.histograms[('size_bytes', ())].buckets == (10, 100)
+    assert metrics.histograms[('wait_seconds', ())].buckets == (1,)
@@ -0,0 +1,121 @@
+from mock import Mock, patch
+from nameko.exceptions import ConfigurationError
+import pytest
+import redis
+
+from nameko_salesforce import constants
+from nameko_salesforce.rate_limit import get_rate_limiter, RateLimiter
+
+
+class TestGetRateLimiter:
+
+    def test_disabled_by_default(self, config):
+        assert get_rate_limiter(config['SALESFORCE'], 'service') is None
+
+    def test_enabled(self, config, redis_uri):
+        config['SALESFORCE'].update({
+            'RATE_LIMIT_ENABLED': True,
+            'RATE_LIMIT_REDIS_URI': redis_uri,
+            'RATE_LIMIT_RATE': 10,
+            'RATE_LIMIT_BURST': 20,
+            'RATE_LIMIT_WEIGHT': 3,
+        })
+
+        rate_limiter = get_rate_limiter(config['SALESFORCE'], 'service')
+
+        assert rate_limiter.username == config['SALESFORCE']['USERNAME']
+        assert rate_limiter.service_name == 'service'
+        assert rate_limiter.rate == 10
+        assert rate_limiter.burst == 20
+        assert rate_limiter.weight == 3
+
+    def test_enabled_defaults(self, config, redis_uri):
+        config['SALESFORCE'].update({
+            'RATE_LIMIT_ENABLED': True,
+            'RATE_LIMIT_REDIS_URI': redis_uri,
+            'RATE_LIMIT_RATE': 10,
+        })
+
+        rate_limiter = get_rate_limiter(config['SALESFORCE'], 'service')
+
+        assert rate_limiter.burst == 10
+        assert rate_limiter.weight == 1
+        assert (
+            rate_limiter.member_ttl ==
+            constants.DEFAULT_RATE_LIMIT_MEMBER_TTL)
+
+    @pytest.mark.parametrize(
+        'key', ['RATE_LIMIT_REDIS_URI', 'RATE_LIMIT_RATE'])
+    def test_config_missing(self, config, redis_uri, key):
+        config['SALESFORCE'].update({
+            'RATE_LIMIT_ENABLED': True,
+            'RATE_LIMIT_REDIS_URI': redis_uri,
+            'RATE_LIMIT_RATE': 10,
+        })
+        del config['SALESFORCE'][key]
+
+        with pytest.raises(ConfigurationError) as exc:
+            get_rate_limiter(config['SALESFORCE'], 'service')
+
+        assert str(exc.value) == (
+            '`SALESFORCE` must have `{}` defined if `RATE_LIMIT_ENABLED` '
+            'is set to `True`'.format(key))
+
+
+class TestRateLimiterUnit:
+
+    @pytest.fixture
+    def rate_limiter(self):
+        return RateLimiter(Mock(), 'Rocky', 'service', rate=10)
+
+    def test_acquire_waits_for_token(self, rate_limiter):
+        rate_limiter.script.side_effect = ['0.5', '0.1', '0']
+
+        with patch('nameko_salesforce.rate_limit.sleep') as sleep:
+            rate_limiter.acquire()
+
+        assert [call[0][0] for call in sleep.call_args_list] == [0.5, 0.1]
+
+    def test_redis_errors_let_calls_through(self, rate_limiter):
+        rate_limiter.script.side_effect = redis.ConnectionError
+
+        assert rate_limiter.take() == 0
+
+
+class TestRateLimiter:
+
+    def make_rate_limiter(self, redis_client, service_name, **kwargs):
+        return RateLimiter(redis_client, 'Rocky', service_name, **kwargs)
+
+    def test_burst(self, redis_client):
+        rate_limiter = self.make_rate_limiter(
+            redis_client, 'service', rate=1, burst=3)
+
+        waits = [rate_limiter.take() for _ in range(4)]
+
+        assert waits[:3] == [0, 0, 0]
+        assert 0 < waits[3] <= 1
+
+    def test_rate_is_split_by_weight(self, redis_client):
+        heavy = self.make_rate_limiter(
+            redis_client, 'heavy', rate=1, burst=4, weight=3)
+        light = self.make_rate_limiter(
+            redis_client, 'light', rate=1, burst=4, weight=1)
+
+        # registers heavy alone, taking one of its full burst of 4
+        assert heavy.take() == 0
+        # light gets a quarter of the burst and of the rate
+        assert light.take() == 0
+        assert 3 < light.take() <= 4
+        # heavy is now limited to 3 of the 4 tokens of the burst
+        assert [heavy.take() for _ in range(3)] == [0, 0, 0]
+        assert 0 < heavy.take() <= 4 / 3
+
+    def test_instances_of_a_service_share_its_bucket(self, redis_client):
+        instance_1 = self.make_rate_limiter(
+            redis_client, 'service', rate=1, burst=1)
+        instance_2 = self.make_rate_limiter(
+            redis_client, 'service', rate=1, burst=1)
+
+        assert instance_1.take() == 0
+        assert instance_2.take() > 0
@@ -0,0 +1,78 @@
+from mock import call, Mock, patch
+import pytest
+
+from nameko_salesforce import constants
+from nameko_salesforce.session_refresh import (
+    get_session_refresh_after,
+    refresh_session_periodically,
+    RETRY_DELAY,
+)
+
+
+class StopLoop(Exception):
+    pass
+
+
+@pytest.fixture
+def sleep():
+    with patch('nameko_salesforce.session_refresh.eventlet.sleep') as sleep:
+        yield sleep
+
+
+class TestGetSessionRefreshAfter:
+
+    def test_default(self, config):
+        assert get_session_refresh_after(config['SALESFORCE']) == (
+            constants.DEFAULT_SESSION_TIMEOUT -
+            constants.DEFAULT_SESSION_REFRESH_MARGIN)
+
+    def test_configured(self, config):
+        config['SALESFORCE'].update({
+            'SESSION_TIMEOUT': 900,
+            'SESSION_REFRESH_MARGIN': 60,
+        })
+        assert get_session_refresh_after(config['SALESFORCE']) == 840
+
+    def test_margin_exceeding_timeout(self, config):
+        config['SALESFORCE'].update({
+            'SESSION_TIMEOUT': 60,
+            'SESSION_REFRESH_MARGIN': 120,
+        })
+        assert get_session_refresh_after(config['SALESFORCE']) == 0
+
+    def test_disabled(self, config):
+        config['SALESFORCE']['SESSION_REFRESH_ENABLED'] = False
+        assert get_session_refresh_after(config['SALESFORCE']) is None
+
+
+class TestRefreshSessionPeriodically:
+
+    def test_waits_for_first_session(self, sleep):
+        refresh = Mock()
+        get_session_age = Mock(side_effect=[None, StopLoop])
+
+        with pytest.raises(StopLoop):
+            refresh_session_periodically(refresh, get_session_age, 100)
+
+        assert sleep.call_args_list == [call(100)]
+        assert refresh.call_count == 0
+
+    def test_refreshes_ahead_of_timeout(self, sleep):
+        refresh = Mock()
+        get_session_age = Mock(side_effect=[40, 100, 0, StopLoop])
+
+        with pytest.raises(StopLoop):
+            refresh_session_periodically(refresh, get_session_age, 100)
+
+        assert sleep.call_args_list == [call(60), call(100)]
+        assert refresh.call_count == 1
+
+    def test_refresh_failure_is_retried(self, sleep):
+        refresh = Mock(side_effect=[Exception('boom'), None])
+        get_session_age = Mock(side_effect=[100, 100, 0, StopLoop])
+
+        with pytest.raises(StopLoop):
+            refresh_session_periodically(refresh, get_session_age, 100)
+
+        assert sleep.call_args_list == [call(RETRY_DELAY), call(100)]
+        assert refresh.call_count == 2
@@ -0,0 +1,124 @@
+from mock import Mock, patch
+from nameko.exceptions import ConfigurationError
+import pytest
+
+from nameko_salesforce import constants
+from nameko_salesforce.session_store import get_session_store, SessionStore
+
+
+class TestGetSessionStore:
+
+    def test_disabled_by_default(self, config):
+        assert get_session_store(config['SALESFORCE']) is None
+
+    def test_enabled(self, config, redis_uri):
+        config['SALESFORCE'].update({
+            'SESSION_STORE_ENABLED': True,
+            'SESSION_STORE_REDIS_URI': redis_uri,
+            'SESSION_STORE_TTL': 600,
+            'SESSION_STORE_LOCK_TIMEOUT': 5,
+        })
+
+        session_store = get_session_store(config['SALESFORCE'])
+
+        assert session_store.username == config['SALESFORCE']['USERNAME']
+        assert session_store.ttl == 600
+        assert session_store.lock_timeout == 5
+
+    def test_enabled_defaults(self, config, redis_uri):
+        config['SALESFORCE'].update({
+            'SESSION_STORE_ENABLED': True,
+            'SESSION_STORE_REDIS_URI': redis_uri,
+        })
+
+        session_store = get_session_store(config['SALESFORCE'])
+
+        assert session_store.ttl == constants.DEFAULT_SESSION_STORE_TTL
+        assert (
+            session_store.lock_timeout ==
+            constants.DEFAULT_SESSION_STORE_LOCK_TIMEOUT)
+
+    def test_redis_uri_missing(self, config):
+        config['SALESFORCE']['SESSION_STORE_ENABLED'] = True
+
+        with pytest.raises(ConfigurationError) as exc:
+            get_session_store(config['SALESFORCE'])
+
+        assert str(exc.value) == (
+            '`SALESFORCE` must have `SESSION_STORE_REDIS_URI` defined if '
+            '`SESSION_STORE_ENABLED` is set to `True`')
+
+
+class TestSessionStore:
+
+    @pytest.fixture
+    def session_store(self, redis_client):
+        return SessionStore(redis_client, 'Rocky', ttl=600, lock_timeout=1)
+
+    @pytest.fixture
+    def login(self):
+        return Mock(return_value=('session_id', 'abc.salesforce.com'))
+
+    def test_get_empty(self, session_store):
+        assert session_store.get() is None
+
+    def test_set_and_get(self, redis_client, session_store):
+
+        session_store.set('session_id', 'abc.salesforce.com')
+
+        assert session_store.get() == ('session_id', 'abc.salesforce.com')
+        assert 0 < redis_client.ttl('salesforce:session:Rocky') <= 600
+
+    def test_login_stores_new_session(self, session_store, login):
+
+        session = session_store.login(login)
+
+        assert session == ('session_id', 'abc.salesforce.com')
+        assert session_store.get() == session
+        assert login.call_count == 1
+
+    def test_login_reuses_stored_session(self, session_store, login):
+        session_store.set('stored_session_id', 'abc.salesforce.com')
+
+        session = session_store.login(login)
+
+        assert session == ('stored_session_id', 'abc.salesforce.com')
+        assert login.call_count == 0
+
+    def test_login_replaces_expired_session(self, session_store, login):
+        session_store.set('expired_session_id', 'abc.salesforce.com')
+
+        session = session_store.login(
+            login, expired_session_id='expired_session_id')
+
+        assert session == ('session_id', 'abc.salesforce.com')
+        assert session_store.get() == session
+        assert login.call_count == 1
+
+    def test_login_reuses_session_stored_while_waiting(
+        self, session_store, login
+    ):
+        # another instance stores a new session while we wait for the lock
+        stored = [
+            ('expired_session_id', 'abc.salesforce.com'),
+            ('new_session_id', 'abc.salesforce.com'),
+        ]
+        with patch.object(session_store, 'get', side_effect=stored):
+            session = session_store.login(
+                login, expired_session_id='expired_session_id')
+
+        assert session == ('new_session_id', 'abc.salesforce.com')
+        assert login.call_count == 0
+
+    def test_login_without_lock(self, redis_client, session_store, login):
+        lock = redis_client.lock('salesforce:session_lock:Rocky', timeout=5)
+        assert lock.acquire()
+
+        session = session_store.login(login)
+
+        assert session == ('session_id', 'abc.salesforce.com')
+        assert login.call_count == 1
+        # session obtained without holding the lock is not stored
+        assert session_store.get() is None
+
+        lock.release()